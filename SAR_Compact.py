@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import time
+
+from SAR_Index_lib import IndexFormatError
+from SAR_lib import SAR_Indexer
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Merge the segments of an index and purge the deleted articles.')
+
+    parser.add_argument('index', metavar='index', type=str,
+                        help='name of the index.')
+
+    parser.add_argument('-F', '--full', dest='full', action='store_true', default=False,
+                    help='merge all the segments into one and drop the records of the deleted articles from the document store '
+                         '(without it, their records stay in the store).')
+
+    parser.add_argument('--fanin', dest='fanin', type=int, default=4,
+                    help='minimum number of segments of the same level that are merged.')
+
+    parser.add_argument('--factor', dest='factor', type=int, default=4,
+                    help='size ratio between consecutive segment levels.')
+
+    parser.add_argument('--purge', dest='purge', type=float, default=0.2,
+                    help='fraction of deleted articles that makes a segment be rewritten.')
+
+    args = parser.parse_args()
+
+    indexer = SAR_Indexer()
+    try:
+        indexer.load_info(args.index, lazy=True)
+    except IndexFormatError as ex:
+        print('ERROR: cannot open the index %s: %s.' % (args.index, ex), file=sys.stderr)
+        sys.exit(-1)
+    segments, deleted, unused = len(indexer.index.segments), len(indexer.deleted), indexer.index.unused
+    size = os.path.getsize(args.index)
+    store = args.index + '.store'
+    store_size = os.path.getsize(store) if os.path.exists(store) else None
+    t0 = time.time()
+    if args.full:
+        merges = indexer.compact(args.index, full=True)
+    else:
+        merges = indexer.compact(args.index, fanin=args.fanin, factor=args.factor, purge=args.purge)
+    t1 = time.time()
+    new_store_size = os.path.getsize(store) if store_size is not None else None
+    if merges == 0 and not unused and new_store_size == store_size:
+        print("Nothing to compact.")
+        sys.exit(0)
+    print("Segments: %d -> %d." % (segments, len(indexer.index.segments)))
+    print("Deleted articles: %d -> %d." % (deleted, len(indexer.deleted)))
+    print("Index size: %2.2fMB -> %2.2fMB." % (size / 2**20, os.path.getsize(args.index) / 2**20))
+    if store_size is not None:
+        print("Store size: %2.2fMB -> %2.2fMB." % (store_size / 2**20, new_store_size / 2**20))
+    print("Time compacting: %2.2fs." % (t1 - t0))
@@ -39,6 +39,20 @@ if __name__ == "__main__":
         "--max-depth-level", type=int, default=4,
         help="Profundidad máxima de captura"
     )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help=(
+            "Número máximo de peticiones simultáneas, sobre conexiones "
+            "persistentes compartidas"
+        )
+    )
+    parser.add_argument(
+        "--mirror", help=(
+            "URL base de un servidor con copias de las páginas de la "
+            "Wikipedia (p.e. http://localhost:8000). Las urls de los "
+            "documentos siguen siendo las de la Wikipedia"
+        )
+    )
 
     args = parser.parse_args()
 
@@ -51,7 +65,10 @@ if __name__ == "__main__":
     if not args.out_base_filename.endswith(".json"):
         raise ValueError("Debe de ser un fichero con extensión .json")
 
-    crawler = SAR_Wiki_Crawler()
+    if args.workers < 1:
+        raise ValueError("El número de peticiones simultáneas (--workers) debe ser al menos 1")
+
+    crawler = SAR_Wiki_Crawler(workers=args.workers, mirror=args.mirror)
 
     if args.initial_url is not None:
         crawler.wikipedia_crawling_from_url(
@@ -10,17 +10,46 @@ import heapq as hq
 from typing import Tuple, List, Optional, Dict, Union
 
 import requests
+from requests.adapters import HTTPAdapter
 import bs4
 import re
-from urllib.parse import urljoin
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
 import json
 import math
 import os
 
+# Segundos máximos de espera de cada petición
+TIMEOUT = 30
+
 
 class SAR_Wiki_Crawler:
 
-    def __init__(self):
+    def __init__(
+        self, workers: int = 1, mirror: Optional[str] = None, timeout: float = TIMEOUT
+    ):
+        """
+        Args:
+            workers (int): Número máximo de peticiones simultáneas (1 por defecto,
+                captura secuencial)
+            mirror (Optional[str]): URL base de un servidor que sirve copias de
+                las páginas de la Wikipedia (p.e. http://localhost:8000). Las
+                páginas se piden a este servidor, pero las urls de los
+                documentos y de los enlaces siguen siendo las de la Wikipedia.
+            timeout (float): Segundos máximos de espera de cada petición
+        """
+        self.workers = max(1, workers)
+        self.mirror = mirror.rstrip("/") if mirror else None
+        self.timeout = timeout
+
+        # Sesión compartida por todos los hilos: reutiliza las conexiones
+        # (keep-alive), con tantas conexiones en el pool como peticiones simultáneas
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
         # Expresión regular para detectar si es un enlace de la Wikipedia
         self.wiki_re = re.compile(
             r"(http(s)?:\/\/(es)\.wikipedia\.org)?\/wiki\/[\w\/_\(\)\%]+"
@@ -54,6 +83,19 @@ class SAR_Wiki_Crawler:
         """
         return self.wiki_re.fullmatch(url) is not None
 
+    def fetch_url(self, url: str) -> str:
+        """Dirección a la que se pide un artículo: la del espejo, si lo hay
+
+        Args:
+            url (str): Enlace a un artículo de la Wikipedia
+
+        Returns:
+            str: url del artículo en el espejo o la propia url
+        """
+        if self.mirror is None:
+            return url
+        return self.mirror + urlsplit(url).path
+
     def get_wikipedia_entry_content(self, url: str) -> Optional[Tuple[str, List[str]]]:
         """Devuelve el texto en crudo y los enlaces de un artículo de la wikipedia
 
@@ -75,7 +117,7 @@ class SAR_Wiki_Crawler:
             )
 
         try:
-            req = requests.get(url)
+            req = self.session.get(self.fetch_url(url), timeout=self.timeout)
         except Exception as ex:
             print(f"ERROR: - {url} - {ex}")
             return None
@@ -262,6 +304,9 @@ class SAR_Wiki_Crawler:
         """Comienza la captura de entradas de la Wikipedia a partir de una lista de urls válidas,
             termina cuando no hay urls en la cola o llega al máximo de documentos a capturar.
 
+            Se hacen hasta self.workers peticiones simultáneas. Las páginas se
+            procesan en el orden en que salen de la cola (por profundidad).
+
         Args:
             initial_urls: Direcciones a artículos de la Wikipedia
             document_limit (int): Máximo número de documentos a capturar
@@ -294,48 +339,76 @@ class SAR_Wiki_Crawler:
             # de guardado
             total_files = math.ceil(document_limit / batch_size)
 
-        while total_documents_captured < document_limit and len(queue) > 0:
-            # Obtenemos el nivel de profundidad de la URL actual
-            depth, parent_url, current_url = hq.heappop(queue)
-            # Si la URL ya ha sido visitada, pasamos a la siguiente
-            if current_url in visited:
-                continue
-
-            visited.add(current_url)
-
-            # Capturamos el contenido de la URL
-            content = self.get_wikipedia_entry_content(current_url)
+        # Peticiones en vuelo, en el orden en que se han sacado de la cola:
+        # (profundidad, url, futuro con el resultado de get_wikipedia_entry_content)
+        in_flight = deque()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while total_documents_captured < document_limit and (queue or in_flight):
+                # Lanzamos peticiones mientras haya hueco. No se piden más páginas
+                # de las que faltan para el límite de documentos, ni páginas con
+                # más profundidad que los enlaces de las páginas en vuelo
+                # (profundidad + 1), así se mantiene el orden por profundidad
+                while (
+                    queue
+                    and len(in_flight) < self.workers
+                    and total_documents_captured + len(in_flight) < document_limit
+                    and (not in_flight or queue[0][0] <= in_flight[0][0] + 1)
+                ):
+                    # Obtenemos el nivel de profundidad de la URL actual
+                    depth, parent_url, current_url = hq.heappop(queue)
+                    # Si la URL ya ha sido visitada, pasamos a la siguiente
+                    if current_url in visited:
+                        continue
+
+                    visited.add(current_url)
+
+                    # Capturamos el contenido de la URL
+                    in_flight.append(
+                        (
+                            depth,
+                            current_url,
+                            executor.submit(self.get_wikipedia_entry_content, current_url),
+                        )
+                    )
 
-            # Si no se ha podido capturar, pasamos a la siguiente URL
-            if content is None:
-                continue
+                if not in_flight:
+                    break
 
-            text, urls = content
+                # Procesamos las páginas en el orden en que se sacaron de la cola
+                depth, current_url, future = in_flight.popleft()
+                content = future.result()
 
-            # Parseamos el contenido capturado
-            document = self.parse_wikipedia_textual_content(text, current_url)
+                # Si no se ha podido capturar, pasamos a la siguiente URL
+                if content is None:
+                    continue
 
-            # Si no se ha podido parsear, pasamos a la siguiente URL
-            if document is None:
-                continue
+                text, urls = content
 
-            documents.append(document)
-            total_documents_captured += 1
-            print(f"Capturado documento {total_documents_captured} - {current_url}")
+                # Parseamos el contenido capturado
+                document = self.parse_wikipedia_textual_content(text, current_url)
 
-            # Guardamos los documentos capturados
-            if batch_size is not None and len(documents) == batch_size:
-                files_count += 1
-                print(f"Guardando {len(documents)} documentos en {base_filename}")
-                self.save_documents(documents, base_filename, files_count, total_files)
-                documents.clear()
+                # Si no se ha podido parsear, pasamos a la siguiente URL
+                if document is None:
+                    continue
 
-            # Añadimos las URLs a la cola
-            for url in urls:
-                if url not in visited and self.is_valid_url(url):
-                    if max_depth_level > 0 and depth <= max_depth_level:
-                        print(f"Anadiendo {url} a la cola")
-                        hq.heappush(queue, (depth + 1, current_url, url))
+                documents.append(document)
+                total_documents_captured += 1
+                print(f"Capturado documento {total_documents_captured} - {current_url}")
+
+                # Guardamos los documentos capturados
+                if batch_size is not None and len(documents) == batch_size:
+                    files_count += 1
+                    print(f"Guardando {len(documents)} documentos en {base_filename}")
+                    self.save_documents(documents, base_filename, files_count, total_files)
+                    documents.clear()
+
+                # Añadimos las URLs a la cola
+                for url in urls:
+                    if url not in visited and self.is_valid_url(url):
+                        if max_depth_level > 0 and depth <= max_depth_level:
+                            print(f"Anadiendo {url} a la cola")
+                            hq.heappush(queue, (depth + 1, current_url, url))
 
         # Guardamos los documentos restantes
         if documents:
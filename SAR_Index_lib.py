@@ -0,0 +1,1160 @@
+#! -*- encoding: utf8 -*-
+"""
+Formato binario en disco del índice invertido.
+
+Estructura del fichero (version 6):
+
+    +-----------+-------------+-----+-------------+-----------+
+    | cabecera  | segmento 1  | ... | segmento n  | metadatos |
+    +-----------+-------------+-----+-------------+-----------+
+
+    - cabecera: magic, version y posición/longitud de los metadatos.
+    - segmento: bloque de postings seguido de su diccionario, alineado a 8 bytes.
+    - postings: para cada termino, en orden, su posting list comprimida con
+      diferencias (delta-gap): artids y frecuencias con codificación de bytes
+      variables (VByte), posiciones de cada artículo con un ancho fijo de 1, 2
+      o 4 bytes (ver encode_postings). Todos los campos comparten las mismas
+      posting lists (posiciones en 'all'), cada posting guarda junto a su
+      frecuencia la máscara de los campos (FIELD_CODES) en los que aparece el
+      término.
+    - diccionario: los términos ordenados y comprimidos con front coding
+      (TermDictionary), seguidos de la posición de la posting list de cada
+      término dentro del bloque de postings, su df, su frecuencia máxima y
+      la longitud mínima de sus artículos (para acotar su puntuación BM25).
+    - metadatos: el resto de atributos del indexador (urls, articles, docs...)
+      y la tabla de segmentos, serializados con pickle y comprimidos con zlib.
+      Cada entrada de la tabla guarda la posición y la longitud de las
+      postings y del diccionario del segmento, su número de términos, su
+      rango de artids [lo, hi) y su desplazamiento ("shift"). "unused"
+      cuenta los bytes de metadatos anteriores que append_index deja sin uso.
+
+Un índice puede tener varios segmentos (indexación incremental), con
+artids crecientes de un segmento al siguiente. Cada segmento guarda el
+rango de artids que contiene y un desplazamiento ("shift") que se suma a
+sus artids al decodificarlos: al compactar el índice (compact_segments)
+los segmentos que no se fusionan se renumeran sin reescribirse.
+"""
+
+import heapq
+import math
+import mmap
+import os
+import pickle
+import re
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
+from itertools import accumulate, groupby, islice
+from operator import itemgetter, sub
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"SARIDX\x00\x00"
+VERSION = 6
+# magic, version, posición de los metadatos, longitud de los metadatos
+HEADER = struct.Struct("<8sH6xQQ")
+
+# código de cada campo en las máscaras de las postings y en los tramos de
+# campos de los artículos, 'all' marca el texto que solo está en 'all'
+FIELD_CODES = {"all": 0, "title": 1, "summary": 2, "section-name": 3}
+# bits de la máscara de campos, se guardan en los bits bajos de la frecuencia
+MASK_BITS = len(FIELD_CODES)
+# máscara de las postings de un índice sin multifield
+ALL_MASK = 1 << FIELD_CODES["all"]
+# tabla de bytes.translate que activa el bit alto (VByte de los enteros < 128)
+HIGH_BIT = bytes(range(128, 256)) * 2
+# tabla de bytes.translate: último byte de un código de frecuencia de un byte --> tf
+TF_OF_BYTE = bytes((b & 127) >> MASK_BITS for b in range(256))
+# bytes de VByte sin el bit alto: los de un entero de más de un byte
+VBYTE_LOW = re.compile(rb"[\x00-\x7f]")
+# tabla de bytes.translate: 1 en los bytes con los que termina un entero VByte
+VBYTE_LAST = bytes(b >> 7 for b in range(256))
+# tipo de array de las posiciones de un artículo según su ancho en bytes
+POSITION_TYPES = {1: "B", 2: "H", 4: "I"}
+# artículos cuyos tramos de campos decodificados se mantienen en caché
+SPANS_CACHE = 1 << 17
+
+
+class IndexFormatError(Exception):
+    """El fichero no es un índice válido o su versión no está soportada."""
+
+
+###############################
+###                         ###
+###    CODIFICACION VBYTE   ###
+###                         ###
+###############################
+
+
+def vbyte_encode(numbers: Iterable[int], out: bytearray):
+    """Añade a "out" los enteros no negativos de "numbers" codificados en VByte
+
+    Cada entero se guarda en grupos de 7 bits, de menos a más significativo.
+    El último byte de cada entero lleva activado el bit alto. Si todos los
+    enteros son menores de 128 (un byte cada uno) se codifican de una vez.
+
+    Args:
+        numbers (Iterable[int]): enteros a codificar
+        out (bytearray): buffer donde se añaden los bytes
+    """
+    if not isinstance(numbers, (list, tuple, array)):
+        numbers = list(numbers)
+    if not numbers:
+        return
+    if max(numbers) < 128:
+        out += bytes(numbers).translate(HIGH_BIT)
+        return
+    for n in numbers:
+        while n >= 128:
+            out.append(n & 127)
+            n >>= 7
+        out.append(n | 128)
+
+
+def vbyte_decode(buf, start: int, count: int) -> Tuple[array, int]:
+    """Decodifica "count" enteros VByte de "buf" a partir de "start"
+
+    Returns:
+        Tuple[array, int]: los enteros decodificados y la posición siguiente al último byte leído
+    """
+    out = array("I")
+    n = shift = 0
+    pos = start
+    while len(out) < count:
+        b = buf[pos]
+        pos += 1
+        if b & 128:
+            out.append(n | ((b & 127) << shift))
+            n = shift = 0
+        else:
+            n |= b << shift
+            shift += 7
+    return out, pos
+
+
+def vbyte_decode_gaps(buf, start: int, count: int, base: int = 0) -> Tuple[array, int]:
+    """Como vbyte_decode pero deshaciendo las diferencias (delta-gap) a partir de "base" """
+    out = array("I")
+    n = shift = 0
+    prev = base
+    pos = start
+    while len(out) < count:
+        b = buf[pos]
+        pos += 1
+        if b & 128:
+            prev += n | ((b & 127) << shift)
+            out.append(prev)
+            n = shift = 0
+        else:
+            n |= b << shift
+            shift += 7
+    return out, pos
+
+
+###############################
+###                         ###
+###      POSTING LISTS      ###
+###                         ###
+###############################
+
+
+def encode_spans(runs: Iterable[Tuple[int, int]]) -> bytes:
+    """Codifica los tramos de campos de un artículo
+
+    Args:
+        runs (Iterable[Tuple[int, int]]): (código del campo, número de tokens), en el orden de 'all'
+
+    Returns:
+        bytes: pares (código, longitud) en VByte, uniendo los tramos consecutivos del mismo campo
+    """
+    merged = []
+    for code, length in runs:
+        if not length:
+            continue
+        if merged and merged[-1][0] == code:
+            merged[-1][1] += length
+        else:
+            merged.append([code, length])
+    out = bytearray()
+    for run in merged:
+        vbyte_encode(run, out)
+    return bytes(out)
+
+
+@lru_cache(maxsize=SPANS_CACHE)
+def decode_spans(spans: bytes) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+    """Decodifica los tramos de campos de un artículo
+
+    Se guardan en caché: al escribir el índice se consultan una vez por
+    cada posting del artículo.
+
+    Returns:
+        Tuple[Tuple[int, ...], Tuple[int, ...]]: posición final (excluida) y código de cada tramo
+    """
+    # cada entero termina en un byte con el bit alto activado
+    values = vbyte_decode(spans, 0, sum(b >> 7 for b in spans))[0]
+    return tuple(accumulate(values[1::2])), tuple(values[::2])
+
+
+def field_mask(positions: Iterable[int], spans: Optional[bytes]) -> int:
+    """Máscara de bits (1 << código) de los campos en los que están unas posiciones
+
+    Sin tramos de campos (índice sin multifield) todas las posiciones son de 'all'.
+    """
+    if not spans:
+        return ALL_MASK
+    ends, codes = decode_spans(spans)
+    mask = i = 0
+    for pos in positions:
+        while ends[i] <= pos:
+            i += 1
+        mask |= 1 << codes[i]
+    return mask
+
+
+def field_positions(positions: List[int], spans: Optional[bytes], code: Optional[int]) -> List[int]:
+    """
+    Filtra las posiciones que están en un campo
+
+    Args:
+        positions (List[int]): posiciones ordenadas en 'all'
+        spans (bytes): tramos de campos del artículo (encode_spans)
+        code (int): código del campo, None para no filtrar
+
+    Returns:
+        List[int]: las posiciones de "positions" dentro de ese campo
+    """
+    if code is None or not spans:
+        return positions
+    ends, codes = decode_spans(spans)
+    res = []
+    i = 0
+    for pos in positions:
+        while ends[i] <= pos:
+            i += 1
+        if codes[i] == code:
+            res.append(pos)
+    return res
+
+
+def position_width(gaps: List[int]) -> int:
+    """Bytes por posición (1, 2 o 4) con los que caben las diferencias "gaps" """
+    top = max(gaps)
+    return 1 if top < 1 << 8 else 2 if top < 1 << 16 else 4
+
+
+def encode_positions(lists: List[List[int]], out: bytearray):
+    """
+    Añade a out el ancho en bytes de las posiciones de cada artículo (1, 2 o 4)
+    y las diferencias de sus posiciones con ese ancho (ver decode_postings)
+
+    Args:
+        lists (List[List[int]]): posiciones ordenadas de cada artículo
+        out (bytearray): donde se escriben
+    """
+    widths = bytearray()
+    blocks = []
+    for positions in lists:
+        # la primera posición y la diferencia de cada una con la anterior
+        gaps = [positions[0], *map(sub, islice(positions, 1, None), positions)]
+        width = position_width(gaps)
+        widths.append(width)
+        blocks.append(array(POSITION_TYPES[width], gaps).tobytes())
+    out += widths
+    out += b"".join(blocks)
+
+
+def encode_postings(postings: Dict[int, List[int]], mask: Callable = None) -> bytearray:
+    """Codifica la posting list posicional de un termino
+
+    Formato: df, artids (delta-gap), frecuencias (tf << MASK_BITS | máscara
+    de campos), el ancho en bytes de las posiciones de cada artículo (un
+    byte por artículo) y, para cada artículo, sus posiciones (delta-gap desde
+    el inicio del artículo) con ese ancho fijo (POSITION_TYPES). Con
+    frecuencias menores de 8 la máscara no ocupa ningún byte más.
+
+    Las posiciones de un artículo empiezan en la suma de tf · ancho de los
+    anteriores, así se pueden decodificar solo las de algunos artículos
+    (ver decode_postings) y cada bloque se decodifica con memoryview.cast.
+
+    Args:
+        postings (Dict[int, List[int]]): clave: artid, valor: lista ordenada de posiciones
+        mask (Callable): mask(artid, posiciones) devuelve la máscara de campos de
+            una posting, por defecto todas son de 'all'
+
+    Returns:
+        bytearray: la posting list codificada
+    """
+    artids = sorted(postings)
+    lists = [postings[artid] for artid in artids]
+    out = bytearray()
+    vbyte_encode((len(artids),), out)
+    vbyte_encode(list(map(sub, artids, [0] + artids)), out)
+    if mask is None:
+        vbyte_encode([len(positions) << MASK_BITS | ALL_MASK for positions in lists], out)
+    else:
+        vbyte_encode(
+            [len(positions) << MASK_BITS | mask(artid, positions) for artid, positions in zip(artids, lists)],
+            out,
+        )
+    encode_positions(lists, out)
+    return out
+
+
+def decode_docids(buf, start: int, code: Optional[int] = None, shift: int = 0) -> array:
+    """Decodifica solo los artids de una posting list, sin tocar las posiciones
+
+    Si "code" no es None solo se devuelven los artids con alguna aparición en
+    ese campo, según la máscara de campos de cada posting. "shift" se suma a
+    todos los artids (ver SegmentReader).
+    """
+    df, pos = vbyte_decode(buf, start, 1)
+    artids, pos = vbyte_decode_gaps(buf, pos, df[0], shift)
+    if code is None:
+        return artids
+    tfs = vbyte_decode(buf, pos, df[0])[0]
+    return array("I", (artid for artid, tf in zip(artids, tfs) if tf >> code & 1))
+
+
+class LazyFrequencies(Sequence):
+    """
+    Frecuencias de una posting list que se decodifican al consultar cada una.
+
+    Para los términos con muchos códigos de varios bytes (los más frecuentes),
+    que al ordenar con MaxScore casi nunca son esenciales y solo se consultan
+    para algunos artículos. Al crearla solo se cuentan (con bytes.translate y
+    accumulate, sin bucles en Python) los códigos que terminan en cada byte.
+    Si se consultan muchas (un término esencial) se decodifican todas de una vez.
+    """
+
+    __slots__ = ("buf", "start", "count", "ends", "reads", "tfs")
+
+    def __init__(self, buf, start: int, count: int):
+        self.buf = buf
+        self.start = start
+        self.count = count
+        self.reads = 0
+        self.tfs = None
+        size = 2 * count
+        while True:
+            # ends[i]: códigos que terminan en los bytes start..start+i
+            self.ends = list(accumulate(bytes(buf[start : start + size]).translate(VBYTE_LAST)))
+            if self.ends[-1] >= count or start + size >= len(buf):
+                break
+            size *= 2
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, j: int) -> int:
+        if self.tfs is not None:
+            return self.tfs[j]
+        self.reads += 1
+        if self.reads * 8 > self.count:
+            self.tfs = array("I", self)
+            return self.tfs[j]
+        if j < 0:
+            j += self.count
+        if not 0 <= j < self.count:
+            raise IndexError("LazyFrequencies index out of range")
+        ends, buf, start = self.ends, self.buf, self.start
+        # último byte del código j y primero (el siguiente al último del código j - 1)
+        last = bisect_left(ends, j + 1)
+        first = bisect_left(ends, j) + 1 if j else 0
+        code = buf[start + last] & 127
+        for pos in range(start + last - 1, start + first - 1, -1):
+            code = code << 7 | buf[pos]
+        return code >> MASK_BITS
+
+    def __iter__(self):
+        if self.tfs is not None:
+            return iter(self.tfs)
+        return (code >> MASK_BITS for code in vbyte_decode(self.buf, self.start, self.count)[0])
+
+
+def decode_tfs(buf, start: int, count: int) -> Sequence[int]:
+    """Decodifica las frecuencias (sin la máscara de campos) de una posting list
+
+    Los códigos de un byte (tf < 8) se traducen de golpe con TF_OF_BYTE y solo
+    los de varios bytes se decodifican uno a uno; si abundan (términos muy
+    frecuentes) se devuelve una LazyFrequencies, que decodifica cada
+    frecuencia al consultarla.
+    """
+    end = start + count
+    # bytes sin el bit alto entre los "count" primeros (HIGH_BIT[:128] son los que lo tienen)
+    low = len(bytes(buf[start:end]).translate(None, HIGH_BIT[:128]))
+    if low * 8 > count:
+        return LazyFrequencies(buf, start, count)
+    tfs = array("I")
+    pos = start
+    match = VBYTE_LOW.search(buf, pos, end)
+    while match is not None:
+        tfs.extend(bytes(buf[pos : match.start()]).translate(TF_OF_BYTE))
+        code, pos = vbyte_decode(buf, match.start(), 1)
+        tfs.append(code[0] >> MASK_BITS)
+        # el resto de códigos, si son de un byte, ocupan un byte cada uno
+        end = pos + count - len(tfs)
+        match = VBYTE_LOW.search(buf, pos, end)
+    tfs.extend(bytes(buf[pos:end]).translate(TF_OF_BYTE))
+    return tfs
+
+
+def decode_frequencies(buf, start: int, shift: int = 0) -> Tuple[array, Sequence[int]]:
+    """Decodifica los artids y las frecuencias de una posting list, sin tocar las posiciones"""
+    df, pos = vbyte_decode(buf, start, 1)
+    artids, pos = vbyte_decode_gaps(buf, pos, df[0], shift)
+    return artids, decode_tfs(buf, pos, df[0])
+
+
+def decode_postings(buf, start: int, shift: int = 0, only=None) -> Dict[int, List[int]]:
+    """Decodifica una posting list posicional codificada con encode_postings
+
+    Args:
+        buf: contenido del fichero de índice
+        start (int): posición de la posting list en "buf"
+        shift (int): se suma a todos los artids (ver SegmentReader)
+        only: conjunto de artids (ya desplazados) cuyas posiciones se decodifican,
+            las del resto de artículos se saltan; None para decodificarlas todas
+
+    Returns:
+        Dict[int, List[int]]: clave: artid (más "shift"), valor: lista de posiciones
+    """
+    buf = memoryview(buf)
+    df, pos = vbyte_decode(buf, start, 1)
+    artids, pos = vbyte_decode_gaps(buf, pos, df[0], shift)
+    tfs, pos = vbyte_decode(buf, pos, df[0])
+    widths = bytes(buf[pos : pos + df[0]])
+    pos += df[0]
+    postings = {}
+    for artid, tf, width in zip(artids, tfs, widths):
+        # se quita la máscara de campos
+        end = pos + (tf >> MASK_BITS) * width
+        if only is None or artid in only:
+            view = buf[pos:end]
+            if width > 1:
+                view = view.cast(POSITION_TYPES[width])
+            postings[artid] = list(accumulate(view))
+        pos = end
+    return postings
+
+
+###############################
+###                         ###
+###        SEGMENTOS        ###
+###                         ###
+###############################
+
+
+class TermDictionaryBuilder:
+    """
+    Construye un TermDictionary añadiendo los términos en orden creciente.
+    """
+
+    def __init__(self):
+        self.blob = bytearray()
+        self.block_offsets = array("Q")
+        self.nterms = 0
+        self.prev = b""
+
+    def add(self, term: str):
+        tb = term.encode("utf-8")
+        if self.nterms % TermDictionary.BLOCK == 0:
+            # primer termino del bloque: completo
+            self.block_offsets.append(len(self.blob))
+            vbyte_encode((len(tb),), self.blob)
+            self.blob += tb
+        else:
+            # resto: longitud del prefijo comun con el anterior y sufijo
+            prefix = len(os.path.commonprefix((self.prev, tb)))
+            vbyte_encode((prefix, len(tb) - prefix), self.blob)
+            self.blob += tb[prefix:]
+        self.prev = tb
+        self.nterms += 1
+
+    def finish(self) -> "TermDictionary":
+        return TermDictionary(self.nterms, self.block_offsets, memoryview(bytes(self.blob)))
+
+
+class TermDictionary:
+    """
+    Diccionario de términos ordenado y compacto (front coding).
+
+    Los términos se agrupan en bloques de BLOCK términos: el primero se guarda
+    completo y los siguientes como (longitud del prefijo común con el
+    anterior, sufijo). Un array con la posición de cada bloque permite la
+    búsqueda binaria sobre el primer término de cada bloque. El id de un
+    término es su posición en el orden del diccionario.
+
+    Se comporta como una secuencia ordenada de términos (len, dict[id],
+    iteración), por lo que admite bisect para búsquedas por prefijo o rango.
+    """
+
+    BLOCK = 16
+    HEADER = struct.Struct("<QQQ")  # terminos, bloques, bytes de los bloques
+
+    def __init__(self, nterms: int, block_offsets, blob):
+        self.nterms = nterms
+        self.block_offsets = block_offsets
+        self.blob = blob
+
+    @classmethod
+    def build(cls, terms: Iterable[str]) -> "TermDictionary":
+        """Construye el diccionario a partir de términos ordenados"""
+        builder = TermDictionaryBuilder()
+        for term in terms:
+            builder.add(term)
+        return builder.finish()
+
+    @classmethod
+    def from_buffer(cls, buf: memoryview, pos: int = 0) -> Tuple["TermDictionary", int]:
+        """
+        Lee un diccionario serializado con to_bytes, sin copiar los datos
+
+        Returns:
+            Tuple[TermDictionary, int]: el diccionario y la posición siguiente a sus datos
+        """
+        nterms, nblocks, size = cls.HEADER.unpack_from(buf, pos)
+        pos += cls.HEADER.size
+        block_offsets = buf[pos : pos + 8 * nblocks].cast("Q")
+        pos += 8 * nblocks
+        blob = buf[pos : pos + size]
+        return cls(nterms, block_offsets, blob), align(pos + size)
+
+    def to_bytes(self) -> bytes:
+        """Serializa el diccionario, alineado a 8 bytes"""
+        data = (
+            self.HEADER.pack(self.nterms, len(self.block_offsets), len(self.blob))
+            + bytes(self.block_offsets)
+            + bytes(self.blob)
+        )
+        return data + bytes(align(len(data)) - len(data))
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        other, _ = TermDictionary.from_buffer(memoryview(state))
+        self.__dict__.update(other.__dict__)
+
+    def decode_block(self, b: int) -> List[bytes]:
+        """Devuelve los términos (en bytes utf-8) del bloque "b" """
+        blob = self.blob
+        (length,), pos = vbyte_decode(blob, self.block_offsets[b], 1)
+        term = bytes(blob[pos : pos + length])
+        pos += length
+        terms = [term]
+        for _ in range(min(self.BLOCK, self.nterms - b * self.BLOCK) - 1):
+            prefix, length = blob[pos], blob[pos + 1]
+            if prefix & length & 128:
+                # prefijo y sufijo de menos de 128 bytes: un byte cada uno
+                prefix, length, pos = prefix & 127, length & 127, pos + 2
+            else:
+                (prefix, length), pos = vbyte_decode(blob, pos, 2)
+            term = term[:prefix] + bytes(blob[pos : pos + length])
+            pos += length
+            terms.append(term)
+        return terms
+
+    def lookup(self, term: str) -> Optional[int]:
+        """Devuelve el id de "term" o None si no está en el diccionario"""
+        key = term.encode("utf-8")
+        # ultimo bloque cuyo primer termino es <= key (el orden de utf-8 es el de str)
+        lo, hi = 0, len(self.block_offsets)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.first_term(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        for i, t in enumerate(self.decode_block(lo - 1)):
+            if t == key:
+                return (lo - 1) * self.BLOCK + i
+            if t > key:
+                break
+        return None
+
+    def first_term(self, b: int) -> bytes:
+        pos = self.block_offsets[b]
+        length = self.blob[pos]
+        if length & 128:
+            length, pos = length & 127, pos + 1
+        else:
+            (length,), pos = vbyte_decode(self.blob, pos, 1)
+        return bytes(self.blob[pos : pos + length])
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Devuelve el rango [lo, hi) de ids de los términos que empiezan por "prefix" """
+        lo = bisect_left(self, prefix)
+        return lo, bisect_left(self, prefix + "\U0010ffff", lo)
+
+    def __contains__(self, term) -> bool:
+        return self.lookup(term) is not None
+
+    def __getitem__(self, termid: int) -> str:
+        if not 0 <= termid < self.nterms:
+            raise IndexError(termid)
+        return self.decode_block(termid // self.BLOCK)[termid % self.BLOCK].decode("utf-8")
+
+    def __iter__(self):
+        for b in range(len(self.block_offsets)):
+            for term in self.decode_block(b):
+                yield term.decode("utf-8")
+
+    def __len__(self) -> int:
+        return self.nterms
+
+
+def align(pos: int) -> int:
+    """Redondea "pos" al siguiente múltiplo de 8"""
+    return (pos + 7) & ~7
+
+
+def write_padding(fh):
+    """Rellena con ceros hasta alinear a 8 bytes la posición del fichero"""
+    pos = fh.tell()
+    fh.write(bytes(align(pos) - pos))
+
+
+class SegmentWriter:
+    """
+    Escribe un segmento (postings + diccionario) en un fichero binario abierto.
+
+    Los términos deben añadirse en orden creciente. El diccionario del
+    segmento es un TermDictionary seguido de la posición de la posting list
+    de cada término (array "Q"), su df, su frecuencia máxima y la longitud
+    mínima de sus artículos (arrays "I").
+    """
+
+    def __init__(self, fh, mask: Callable = None, doclens=None):
+        self.fh = fh
+        self.mask = mask
+        self.doclens = doclens
+        self.start = fh.tell()
+        self.size = 0
+        self.terms = TermDictionaryBuilder()
+        self.offsets = array("Q")
+        self.dfs = array("I")
+        self.maxtfs = array("I")
+        self.mindls = array("I")
+        self.last = None
+        # rango de artids del segmento
+        self.lo = self.hi = None
+
+    def add(self, term: str, postings: Dict[int, List[int]]):
+        """Escribe la posting list de "term" y lo añade al diccionario"""
+        assert self.last is None or self.last < term, "terminos desordenados"
+        data = encode_postings(postings, self.mask)
+        self.fh.write(data)
+        self.terms.add(term)
+        self.offsets.append(self.size)
+        self.dfs.append(len(postings))
+        self.maxtfs.append(max(map(len, postings.values())))
+        # sin longitudes de los articulos la cota es la de un articulo vacio
+        self.mindls.append(min(map(self.doclens.__getitem__, postings)) if self.doclens else 0)
+        self.size += len(data)
+        self.last = term
+        lo, hi = min(postings), max(postings) + 1
+        self.lo = lo if self.lo is None else min(self.lo, lo)
+        self.hi = hi if self.hi is None else max(self.hi, hi)
+
+    def finish(self) -> Dict:
+        """
+        Escribe el diccionario tras las postings.
+
+        Returns:
+            Dict: descripcion del segmento para la tabla de segmentos de los metadatos
+        """
+        write_padding(self.fh)
+        dict_start = self.fh.tell()
+        self.offsets.append(self.size)
+        self.fh.write(self.terms.finish().to_bytes())
+        self.fh.write(bytes(self.offsets))
+        self.fh.write(bytes(self.dfs))
+        self.fh.write(bytes(self.maxtfs))
+        self.fh.write(bytes(self.mindls))
+        return {
+            "postings": (self.start, self.size),
+            "dict": (dict_start, self.fh.tell() - dict_start),
+            "nterms": self.terms.nterms,
+            "artids": (self.lo or 0, self.hi or 0),
+            "shift": 0,
+        }
+
+
+class SegmentReader:
+    """
+    Lee un segmento a partir del contenido del fichero de índice.
+    """
+
+    def __init__(self, buf: memoryview, info: Dict):
+        self.buf = buf
+        self.info = info
+        self.shift = info["shift"]
+        # rango de artids [lo, hi) ya desplazado
+        self.lo, self.hi = (a + self.shift for a in info["artids"])
+        self.postings_start, self.postings_size = info["postings"]
+        self.nterms = info["nterms"]
+        self.dict_start, self.dict_size = info["dict"]
+        self.terms, pos = TermDictionary.from_buffer(buf, self.dict_start)
+        self.offsets = buf[pos : pos + 8 * (self.nterms + 1)].cast("Q")
+        pos += 8 * (self.nterms + 1)
+        self.dfs = buf[pos : pos + 4 * self.nterms].cast("I")
+        pos += 4 * self.nterms
+        self.maxtfs = buf[pos : pos + 4 * self.nterms].cast("I")
+        pos += 4 * self.nterms
+        self.mindls = buf[pos : pos + 4 * self.nterms].cast("I")
+
+    def release(self):
+        """Libera las vistas sobre el fichero (necesario para cerrar el mmap)"""
+        for view in (
+            self.offsets,
+            self.dfs,
+            self.maxtfs,
+            self.mindls,
+            self.terms.block_offsets,
+            self.terms.blob,
+        ):
+            view.release()
+
+    def offset(self, term: str) -> Optional[int]:
+        """Posición de la posting list de "term" en el fichero, o None si no está en el segmento"""
+        termid = self.terms.lookup(term)
+        if termid is None:
+            return None
+        return self.postings_start + self.offsets[termid]
+
+    def bounds(self, term: str) -> Optional[Tuple[int, int]]:
+        """Frecuencia máxima de "term" y longitud mínima de sus artículos, o None si no está"""
+        termid = self.terms.lookup(term)
+        if termid is None:
+            return None
+        return self.maxtfs[termid], self.mindls[termid]
+
+    def entries(self):
+        """Recorre el diccionario en orden: (termino, df, posicion, longitud)"""
+        offsets = self.offsets
+        for termid, term in enumerate(self.terms):
+            yield (
+                term,
+                self.dfs[termid],
+                self.postings_start + offsets[termid],
+                offsets[termid + 1] - offsets[termid],
+            )
+
+    def items(self):
+        """Recorre el segmento en orden: (termino, posting list posicional)"""
+        for term, _, offset, _ in self.entries():
+            yield term, decode_postings(self.buf, offset, self.shift)
+
+
+class IndexReader(Mapping):
+    """
+    Índice invertido de solo lectura sobre un fichero de índice.
+
+    Al abrirlo solo se cargan los metadatos y los diccionarios de términos
+    (TermDictionary, sin copiar), las posting lists se decodifican bajo
+    demanda. Con "lazy" el fichero se proyecta en memoria (mmap), si no se
+    lee completo. Se comporta como el diccionario self.index: index[term]
+    devuelve un diccionario artid --> lista de posiciones.
+    """
+
+    def __init__(self, filename: str, lazy: bool = True):
+        self.filename = filename
+        with open(filename, "rb") as fh:
+            if lazy:
+                self.mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                self.buf = memoryview(self.mm)
+            else:
+                self.mm = None
+                self.buf = memoryview(fh.read())
+        self.meta = read_meta(self.buf)
+        self.segments = [SegmentReader(self.buf, info) for info in self.meta["segments"]]
+        # bytes de metadatos anteriores sin uso, los recupera la compactación
+        self.unused = self.meta.get("unused", 0)
+        self.nterms = None
+
+    def __contains__(self, term) -> bool:
+        return any(segment.offset(term) is not None for segment in self.segments)
+
+    def __getitem__(self, term: str) -> Dict[int, List[int]]:
+        postings = None
+        for segment in self.segments:
+            offset = segment.offset(term)
+            if offset is not None:
+                part = decode_postings(segment.buf, offset, segment.shift)
+                postings = part if postings is None else {**postings, **part}
+        if postings is None:
+            raise KeyError(term)
+        return postings
+
+    def __iter__(self):
+        if len(self.segments) == 1:
+            return iter(self.segments[0].terms)
+        merged = heapq.merge(*(segment.terms for segment in self.segments))
+        return (term for term, _ in groupby(merged))
+
+    def __len__(self) -> int:
+        if self.nterms is None:
+            if len(self.segments) == 1:
+                self.nterms = self.segments[0].nterms
+            else:
+                self.nterms = sum(1 for _ in self)
+        return self.nterms
+
+    def docids(self, term: str, code: Optional[int] = None) -> array:
+        """Devuelve los artids de la posting list de "term" sin decodificar las posiciones
+
+        Con "code" solo los de los artículos en los que aparece en ese campo (FIELD_CODES).
+        """
+        res = array("I")
+        for segment in self.segments:
+            offset = segment.offset(term)
+            if offset is not None:
+                res.extend(decode_docids(segment.buf, offset, code, segment.shift))
+        return res
+
+    def positions(self, term: str, artids) -> Dict[int, List[int]]:
+        """Devuelve las posiciones de "term" solo en los artículos de "artids" (un conjunto)
+
+        Las posiciones del resto de artículos de la posting list se saltan sin decodificarlas.
+        """
+        res = {}
+        for segment in self.segments:
+            offset = segment.offset(term)
+            if offset is not None:
+                res.update(decode_postings(segment.buf, offset, segment.shift, artids))
+        return res
+
+    def frequencies(self, term: str) -> Tuple[array, Sequence[int]]:
+        """
+        Devuelve los artids y las frecuencias de "term" sin decodificar las posiciones
+
+        Si el término solo está en un segmento sus frecuencias se devuelven tal
+        cual las da decode_tfs (quizás una LazyFrequencies), si no se juntan.
+        """
+        parts = []
+        for segment in self.segments:
+            offset = segment.offset(term)
+            if offset is not None:
+                parts.append(decode_frequencies(segment.buf, offset, segment.shift))
+        if len(parts) == 1:
+            return parts[0]
+        artids, tfs = array("I"), array("I")
+        for part, part_tfs in parts:
+            artids.extend(part)
+            tfs.extend(part_tfs)
+        return artids, tfs
+
+    def bounds(self, term: str) -> Tuple[int, int]:
+        """Frecuencia máxima de "term" y longitud mínima de sus artículos en todos los segmentos"""
+        maxtf, mindl = 0, None
+        for segment in self.segments:
+            bounds = segment.bounds(term)
+            if bounds is not None:
+                maxtf = max(maxtf, bounds[0])
+                mindl = bounds[1] if mindl is None else min(mindl, bounds[1])
+        return maxtf, mindl or 0
+
+    def close(self):
+        """Libera el fichero"""
+        for segment in self.segments:
+            segment.release()
+        self.segments = []
+        self.buf.release()
+        if self.mm is not None:
+            self.mm.close()
+
+
+###############################
+###                         ###
+###    LECTURA/ESCRITURA    ###
+###                         ###
+###############################
+
+
+def write_meta(fh, meta: Dict):
+    """Añade los metadatos al final del fichero y actualiza la cabecera"""
+    data = zlib.compress(pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL))
+    offset = fh.tell()
+    fh.write(data)
+    fh.seek(0)
+    fh.write(HEADER.pack(MAGIC, VERSION, offset, len(data)))
+    fh.seek(0, 2)
+
+
+def copy_segment(fh, segment: "SegmentReader", shift: Optional[int] = None) -> Dict:
+    """
+    Copia los bytes de un segmento ya codificado al final de "fh"
+
+    Las posiciones del diccionario son relativas al bloque de postings, por lo
+    que el segmento no necesita recodificarse. Con "shift" se cambia el
+    desplazamiento que se suma a sus artids.
+
+    Returns:
+        Dict: descripcion del segmento copiado para la tabla de segmentos
+    """
+    buf = segment.buf
+    start = fh.tell()
+    postings_start, postings_size = segment.postings_start, segment.postings_size
+    fh.write(buf[postings_start : postings_start + postings_size])
+    write_padding(fh)
+    dict_start = fh.tell()
+    fh.write(buf[segment.dict_start : segment.dict_start + segment.dict_size])
+    return {
+        "postings": (start, postings_size),
+        "dict": (dict_start, segment.dict_size),
+        "nterms": segment.nterms,
+        "artids": segment.info["artids"],
+        "shift": segment.shift if shift is None else shift,
+    }
+
+
+def write_index(
+    filename: str, index: Mapping, meta: Dict, mask: Callable = None, doclens=None
+):
+    """
+    Guarda un índice invertido posicional y sus metadatos en "filename"
+
+    Args:
+        filename (str): fichero de salida
+        index (Mapping): indice invertido posicional (Dict[str, Dict[int, List[int]]])
+            o un IndexReader, cuyos segmentos se copian sin recodificar
+        meta (Dict): atributos del indexador a guardar junto al índice
+        mask (Callable): máscara de campos de cada posting (ver encode_postings)
+        doclens: longitud (en tokens) de cada artículo, indexada por artid
+    """
+    with open(filename, "wb") as fh:
+        fh.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        segments = write_segments(fh, index, mask, doclens)
+        meta = dict(meta, segments=segments)
+        write_meta(fh, meta)
+
+
+def write_segments(fh, index: Mapping, mask: Callable = None, doclens=None) -> List[Dict]:
+    """
+    Escribe un índice al final de "fh" como uno o varios segmentos
+
+    Returns:
+        List[Dict]: descripcion de los segmentos escritos (ver write_index)
+    """
+    if isinstance(index, IndexReader):
+        return [copy_segment(fh, segment) for segment in index.segments]
+    writer = SegmentWriter(fh, mask, doclens)
+    for term in sorted(index):
+        writer.add(term, index[term])
+    return [writer.finish()]
+
+
+def append_index(
+    filename: str, index: Mapping, meta: Dict, mask: Callable = None, doclens=None
+):
+    """
+    Añade un índice con artids posteriores a los ya guardados como segmentos nuevos de "filename"
+
+    Los segmentos existentes no se modifican: los nuevos y los metadatos
+    actualizados se escriben al final del fichero y solo al terminar se
+    reescribe la cabecera, de forma que un fallo a mitad deja el índice
+    anterior intacto. Los metadatos anteriores quedan sin uso hasta la
+    siguiente compactación, que reescribe el fichero si "unused" (bytes sin
+    uso, en los metadatos) no es 0.
+
+    Args:
+        filename (str): fichero de índice existente
+        index (Mapping): ver write_index
+        meta (Dict): atributos del indexador, sustituyen a los guardados
+        mask (Callable): máscara de campos de cada posting (ver encode_postings)
+        doclens: longitud (en tokens) de cada artículo, indexada por artid
+    """
+    with open(filename, "r+b") as fh:
+        offset, length = read_header(fh.read(HEADER.size))
+        fh.seek(offset)
+        old = pickle.loads(zlib.decompress(fh.read(length)))
+        fh.seek(0, 2)
+        segments = old["segments"] + write_segments(fh, index, mask, doclens)
+        unused = old.get("unused", 0) + length
+        write_meta(fh, dict(meta, segments=segments, unused=unused))
+
+
+def merge_runs(runs: List[str], filename: str, mask: Callable = None, doclens=None):
+    """
+    Fusiona (k-way merge) varios indices parciales con artids crecientes en un unico indice
+
+    Los ficheros se recorren en paralelo en orden de termino, solo se mantiene
+    en memoria la posting list del termino que se esta fusionando.
+
+    Args:
+        runs (List[str]): indices parciales, en orden de artid
+        filename (str): fichero de salida
+        mask (Callable): máscara de campos de cada posting (ver encode_postings)
+        doclens: longitud (en tokens) de cada artículo, indexada por artid
+    """
+    readers = [IndexReader(run) for run in runs]
+    streams = [segment.items() for reader in readers for segment in reader.segments]
+    with open(filename, "wb") as fh:
+        fh.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        writer = SegmentWriter(fh, mask, doclens)
+        # heapq.merge es estable: a igual termino se respeta el orden de los bloques
+        merged = heapq.merge(*streams, key=itemgetter(0))
+        for term, group in groupby(merged, key=itemgetter(0)):
+            postings = {}
+            for _, part in group:
+                postings.update(part)
+            writer.add(term, postings)
+        write_meta(fh, {"segments": [writer.finish()]})
+    del merged, streams
+    for reader in readers:
+        reader.close()
+
+
+###############################
+###                         ###
+###       COMPACTACION      ###
+###                         ###
+###############################
+
+
+def plan_merges(
+    sizes: List[int],
+    deleted: List[float],
+    fanin: int = 4,
+    factor: int = 4,
+    purge: float = 0.2,
+) -> List[Tuple[int, int]]:
+    """
+    Política de fusión por niveles (tiered) de los segmentos de un índice
+
+    Cada segmento tiene un nivel según su tamaño (log en base "factor"). Los
+    grupos de al menos "fanin" segmentos consecutivos del mismo nivel se
+    fusionan en uno del nivel siguiente, así cada artículo se reescribe un
+    número logarítmico de veces. Un segmento con más de una fracción "purge"
+    de artículos borrados se reescribe solo, para liberar el espacio.
+
+    Args:
+        sizes (List[int]): tamaño en bytes de las postings de cada segmento, en orden
+        deleted (List[float]): fracción de artículos borrados de cada segmento
+        fanin (int): número mínimo de segmentos de un nivel que se fusionan
+        factor (int): proporción de tamaño entre un nivel y el siguiente
+        purge (float): fracción de borrados a partir de la que se reescribe un segmento
+
+    Returns:
+        List[Tuple[int, int]]: rangos [i, j) de segmentos consecutivos a fusionar
+    """
+    levels = [int(math.log(max(size, 1), factor)) for size in sizes]
+    groups = []
+    i = 0
+    while i < len(sizes):
+        j = i
+        while j < len(sizes) and levels[j] == levels[i]:
+            j += 1
+        if j - i >= fanin:
+            groups.append((i, j))
+        else:
+            groups.extend((k, k + 1) for k in range(i, j) if deleted[k] > purge)
+        i = j
+    return groups
+
+
+def compact_segments(
+    reader: "IndexReader",
+    filename: str,
+    groups: List[Tuple[int, int]],
+    remap: Callable,
+    meta: Dict,
+    mask: Callable = None,
+    doclens=None,
+):
+    """
+    Reescribe un índice fusionando grupos de segmentos consecutivos
+
+    Las posting lists de cada grupo se fusionan término a término (k-way
+    merge) con los artids renumerados y sin los artículos eliminados. El
+    resto de segmentos se copian sin recodificar, cambiando solo su
+    desplazamiento. El índice se escribe en un fichero temporal que
+    sustituye a "filename" con os.replace: quien tenga abierto el índice
+    anterior (p.e. un buscador con mmap) lo sigue usando hasta que lo cierre.
+
+    Args:
+        reader (IndexReader): índice a compactar
+        filename (str): fichero de salida (normalmente el de "reader")
+        groups (List[Tuple[int, int]]): rangos de segmentos a fusionar (ver plan_merges)
+        remap (Callable): artid --> artid nuevo, o None si el artículo se elimina;
+            debe conservar el orden y desplazar por igual los artids de cada
+            segmento que no se fusiona
+        meta (Dict): atributos del indexador con las tablas ya renumeradas
+        mask (Callable): máscara de campos de cada posting, con los artids nuevos
+        doclens: longitud de cada artículo, indexada por los artids nuevos
+    """
+    starts = {i: j for i, j in groups}
+    tmp = filename + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        segments = []
+        i = 0
+        while i < len(reader.segments):
+            if i in starts:
+                group = reader.segments[i : starts[i]]
+                writer = SegmentWriter(fh, mask, doclens)
+                streams = [segment.items() for segment in group]
+                merged = heapq.merge(*streams, key=itemgetter(0))
+                for term, parts in groupby(merged, key=itemgetter(0)):
+                    postings = {}
+                    for _, part in parts:
+                        for artid, positions in part.items():
+                            new = remap(artid)
+                            if new is not None:
+                                postings[new] = positions
+                    if postings:
+                        writer.add(term, postings)
+                if writer.terms.nterms:
+                    segments.append(writer.finish())
+                i = starts[i]
+            else:
+                segment = reader.segments[i]
+                if segment.nterms:
+                    new = remap(segment.lo)
+                    segments.append(copy_segment(fh, segment, segment.shift + new - segment.lo))
+                i += 1
+        write_meta(fh, dict(meta, segments=segments))
+    os.replace(tmp, filename)
+
+
+def read_header(buf) -> Tuple[int, int]:
+    """Comprueba la cabecera y devuelve la posición y la longitud de los metadatos"""
+    if len(buf) < HEADER.size:
+        raise IndexFormatError("fichero de indice truncado")
+    magic, version, offset, length = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise IndexFormatError("no es un fichero de indice")
+    if version != VERSION:
+        raise IndexFormatError(f"version de indice no soportada: {version}")
+    return offset, length
+
+
+def read_meta(buf) -> Dict:
+    """Comprueba la cabecera y devuelve los metadatos del índice"""
+    offset, length = read_header(buf)
+    return pickle.loads(zlib.decompress(buf[offset : offset + length]))
+
+
+def read_index(filename: str) -> Tuple[Dict[str, Dict[int, List[int]]], Dict]:
+    """
+    Carga completamente un índice guardado con write_index
+
+    Returns:
+        Tuple[Dict, Dict]: el índice invertido posicional y los metadatos
+    """
+    with open(filename, "rb") as fh:
+        buf = memoryview(fh.read())
+    meta = read_meta(buf)
+    index = {}
+    for info in meta["segments"]:
+        for term, postings in SegmentReader(buf, info).items():
+            if term in index:
+                index[term].update(postings)
+            else:
+                index[term] = postings
+    return index, meta
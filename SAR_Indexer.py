@@ -1,8 +1,12 @@
 import argparse
+import json
+import os
 import pickle
 import sys
 import time
 
+from SAR_Index_lib import IndexFormatError
+from SAR_Ingest_lib import available_backends
 from SAR_lib import SAR_Indexer
 
 
@@ -27,16 +31,53 @@ if __name__ == "__main__":
     parser.add_argument('-O', '--positional', dest='positional', action='store_true', default=False, 
                     help='compute positional index.')
 
+    parser.add_argument('-W', '--workers', dest='workers', type=int, default=1,
+                    help='number of processes used to index the files.')
+
+    parser.add_argument('-B', '--memory-budget', dest='memory_budget', type=int, default=None,
+                    help='memory budget (MB) for the in-memory index, larger indexes are built in blocks on disk.')
+
+    parser.add_argument('-Z', '--compress-store', dest='compress_store', action='store_true', default=False,
+                    help='compress the document store used to show the results.')
+
+    parser.add_argument('-a', '--append', dest='append', action='store_true', default=False,
+                    help='add the new files of the directory to an existing index as a new segment.')
+
+    parser.add_argument('-J', '--json-backend', dest='json_backend', type=str, default='auto',
+                    choices=['auto', 'orjson', 'ujson', 'json'],
+                    help='JSON library used to read the articles (auto: the fastest one installed).')
+
+    parser.add_argument('--stats-json', dest='stats_json', metavar='file', type=str, default=None,
+                    help='save the build telemetry (throughput, phases, memory, posting lengths) as JSON.')
+
     args = parser.parse_args()
+    if args.json_backend not in ('auto', *available_backends()):
+        parser.error('%s is not installed (pip install %s).' % (args.json_backend, args.json_backend))
 
     indexer = SAR_Indexer()
+    if args.append and os.path.exists(args.index):
+        try:
+            indexer.load_info(args.index, lazy=True)
+        except IndexFormatError as ex:
+            print('ERROR: cannot append to the index %s: %s.' % (args.index, ex), file=sys.stderr)
+            sys.exit(-1)
     t0 = time.time()
     indexer.index_dir(args.dir, **vars(args))
     t1 = time.time()
     indexer.save_info(args.index)
     t2 = time.time()
+    SAR_Indexer().load_info(args.index)
+    t3 = time.time()
     indexer.show_stats()
     print("Time indexing: %2.2fs." % (t1 - t0))
     print("Time saving: %2.2fs." % (t2 - t1))
+    print("Time loading: %2.2fs." % (t3 - t2))
+    print("Index size: %2.2fMB." % (os.path.getsize(args.index) / 2**20))
+    if args.stats_json is not None:
+        report = indexer.build_report()
+        report["times"] = {"indexing": t1 - t0, "saving": t2 - t1, "loading": t3 - t2}
+        report["index_size"] = os.path.getsize(args.index)
+        with open(args.stats_json, 'w') as fh:
+            json.dump(report, fh, indent=2)
     print()
 
@@ -0,0 +1,106 @@
+#! -*- encoding: utf8 -*-
+"""
+Lectura de los ficheros del crawler para indexarlos.
+
+Los ficheros se leen con un buffer grande, línea a línea (un artículo por
+línea), con la posición y la longitud de cada una para poder releer el
+artículo con seek. El JSON se decodifica con el backend más
+rápido instalado (orjson, ujson) o con json de la librería estándar.
+Los backends rápidos son opcionales: pip install orjson (o ujson).
+
+Antes de decodificar un artículo se puede extraer su url de la propia
+línea (peek_url): el crawler escribe la url como primera clave, así los
+artículos ya indexados se descartan sin decodificarlos.
+"""
+
+import json
+import re
+from typing import Callable, Iterator, Optional, Tuple
+
+# tamaño del buffer de lectura
+BUFFER_SIZE = 1 << 22
+# prefijo de las lineas del crawler (json.dumps de un diccionario que empieza por la url)
+URL_PREFIX = b'{"url": "'
+# cadena JSON (con sus escapes) que empieza en la comilla de la url
+URL_STRING = re.compile(rb'"((?:[^"\\]|\\.)*)"')
+
+
+def available_backends() -> dict:
+    """Backends de JSON instalados: nombre --> función loads (acepta bytes)"""
+    backends = {}
+    try:
+        import orjson
+
+        backends["orjson"] = orjson.loads
+    except ImportError:
+        pass
+    try:
+        import ujson
+
+        backends["ujson"] = ujson.loads
+    except ImportError:
+        pass
+    backends["json"] = json.loads
+    return backends
+
+
+def json_loads(backend: Optional[str] = None) -> Callable:
+    """
+    Devuelve la función loads de un backend de JSON
+
+    Args:
+        backend (str): 'orjson', 'ujson', 'json' o None (el más rápido instalado)
+
+    Returns:
+        Callable: función que decodifica una línea (bytes)
+    """
+    backends = available_backends()
+    if backend is None or backend == "auto":
+        return next(iter(backends.values()))
+    if backend not in backends:
+        raise ValueError(f"backend de JSON no disponible: {backend}")
+    return backends[backend]
+
+
+def read_lines(filename: str, buffer_size: int = BUFFER_SIZE) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Recorre las líneas no vacías de un fichero con un buffer de lectura de "buffer_size" bytes
+
+    Args:
+        filename (str): fichero del crawler
+        buffer_size (int): tamaño del buffer de lectura
+
+    Returns:
+        iterador de (posición, longitud, línea), la línea incluye el salto de línea
+    """
+    offset = 0
+    with open(filename, "rb", buffering=buffer_size) as fh:
+        for line in fh:
+            length = len(line)
+            if not line.isspace():
+                yield offset, length, line
+            offset += length
+
+
+def peek_url(line: bytes) -> Optional[str]:
+    """
+    Extrae la url de una línea del crawler sin decodificar el artículo
+
+    Returns:
+        Optional[str]: la url, o None si la línea no empieza por la url
+            (p.e. un fichero generado con otro orden de claves)
+    """
+    if not line.startswith(URL_PREFIX):
+        return None
+    start = len(URL_PREFIX)
+    end = line.find(b'"', start)
+    if end < 0:
+        return None
+    url = line[start:end]
+    if b"\\" not in url:
+        return url.decode("utf-8")
+    # con escapes (\uXXXX, \" ...): se decodifica solo la cadena
+    match = URL_STRING.match(line, start - 1)
+    if match is None:
+        return None
+    return json.loads(match.group(0))
@@ -0,0 +1,255 @@
+#! -*- encoding: utf8 -*-
+"""
+Posting lists híbridas para las operaciones booleanas.
+
+Cada PostingList elige su representación según la densidad del término
+(al estilo de los roaring bitmaps):
+
+    - términos poco frecuentes: array ordenado de artids (4 bytes por artid)
+    - términos frecuentes: mapa de bits sobre todos los artículos, guardado
+      en un entero de Python, de forma que AND/OR/ANDNOT se resuelven con las
+      operaciones de bits del intérprete, palabra a palabra.
+
+Las operaciones aceptan cualquier combinación de representaciones y el
+resultado vuelve a elegir la representación más compacta.
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+from typing import Iterable, List, Union
+
+# a partir de esta proporcion entre longitudes la interseccion se hace con galloping
+GALLOP_RATIO = 32
+
+# tabla: byte --> posiciones de sus bits a 1
+BYTE_BITS = tuple(tuple(b for b in range(8) if byte >> b & 1) for byte in range(256))
+
+
+def is_dense(size: int, universe: int) -> bool:
+    """True si un mapa de bits ocupa menos que el array de artids"""
+    return size * 32 > universe
+
+
+def ids_to_bits(ids: Iterable[int], universe: int) -> int:
+    """Convierte una secuencia de artids en un mapa de bits"""
+    buf = bytearray((universe >> 3) + 1)
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def gallop_intersect(short: array, long: array) -> array:
+    """
+    Interseccion de dos arrays ordenados con busqueda exponencial (galloping)
+
+    Para cada artid de "short" se avanza en "long" con saltos de tamaño
+    creciente desde la ultima posicion encontrada y se termina con una
+    busqueda binaria, el coste es O(|short| · log(|long| / |short|)).
+    """
+    res = array("I")
+    lo = 0
+    n = len(long)
+    for x in short:
+        step = 1
+        hi = lo + 1
+        while hi < n and long[hi] < x:
+            lo = hi
+            step <<= 1
+            hi = lo + step
+        lo = bisect_left(long, x, lo, min(hi + 1, n))
+        if lo == n:
+            break
+        if long[lo] == x:
+            res.append(x)
+            lo += 1
+    return res
+
+
+def phrase_match(lists: List[List[int]]) -> bool:
+    """
+    True si los terminos de una frase aparecen seguidos en un artículo
+
+    Se parte de las posiciones de inicio que da el término menos frecuente y
+    se intersecan (con operaciones de conjuntos, sin recorrerlas en Python)
+    con las de cada término desplazadas a su inicio.
+
+    Args:
+        lists (List[List[int]]): posiciones en el artículo de cada término de la frase, en orden
+
+    Returns:
+        bool: True si hay una posición p tal que lists[i] contiene p + i para todo i
+    """
+    if len(lists) == 2:
+        # se recorre el término más frecuente hasta la primera coincidencia
+        p1, p2 = lists
+        if len(p1) <= len(p2):
+            return not set(map((1).__add__, p1)).isdisjoint(p2)
+        return not set(map((1).__rsub__, p2)).isdisjoint(p1)
+    first = min(range(len(lists)), key=lambda i: len(lists[i]))
+    starts = set(map(first.__rsub__, lists[first]))
+    for offset, positions in enumerate(lists):
+        if offset != first:
+            starts.intersection_update(map(offset.__rsub__, positions))
+            if not starts:
+                return False
+    return bool(starts)
+
+
+def near_match(p1: List[int], p2: List[int], k: int) -> bool:
+    """True si alguna posicion de "p1" esta a "k" posiciones o menos de alguna de "p2" """
+    j = 0
+    n = len(p2)
+    for pos in p1:
+        j = bisect_left(p2, pos - k, j)
+        if j == n:
+            return False
+        if p2[j] <= pos + k:
+            return True
+    return False
+
+
+def bits_to_ids(bits: int) -> array:
+    """Convierte un mapa de bits en el array ordenado de artids"""
+    ids = array("I")
+    buf = bits.to_bytes((bits.bit_length() >> 3) + 1, "little")
+    for base, byte in enumerate(buf):
+        if byte:
+            base <<= 3
+            ids.extend(base + b for b in BYTE_BITS[byte])
+    return ids
+
+
+class PostingList:
+    """
+    Posting list de artids ordenados, con representación array o mapa de bits.
+
+    Se comporta como una lista de solo lectura (len, iteración, indexación)
+    para el resto del código, y soporta &, | y - (ANDNOT) entre posting lists.
+    """
+
+    __slots__ = ("universe", "ids", "bits", "size")
+
+    def __init__(self, universe: int, ids: array = None, bits: int = None):
+        self.universe = universe
+        self.ids = ids
+        self.bits = bits
+        self.size = bits.bit_count() if bits is not None else len(ids)
+
+    @classmethod
+    def from_sorted(cls, ids: Iterable[int], universe: int) -> "PostingList":
+        """Crea una posting list a partir de artids ordenados"""
+        if not isinstance(ids, array) or ids.typecode != "I":
+            ids = array("I", ids)
+        if is_dense(len(ids), universe):
+            return cls(universe, bits=ids_to_bits(ids, universe))
+        return cls(universe, ids=ids)
+
+    @classmethod
+    def from_bits(cls, bits: int, universe: int) -> "PostingList":
+        """Crea una posting list a partir de un mapa de bits"""
+        if is_dense(bits.bit_count(), universe):
+            return cls(universe, bits=bits)
+        return cls(universe, ids=bits_to_ids(bits))
+
+    @classmethod
+    def of(cls, p: Union["PostingList", Iterable[int]], universe: int) -> "PostingList":
+        """Devuelve "p" como PostingList, convirtiéndola si es una lista de artids"""
+        if isinstance(p, PostingList):
+            return p
+        return cls.from_sorted(p, universe)
+
+    @property
+    def is_bitmap(self) -> bool:
+        return self.bits is not None
+
+    def as_bits(self) -> int:
+        """Devuelve la posting list como mapa de bits"""
+        if self.bits is None:
+            return ids_to_bits(self.ids, self.universe)
+        return self.bits
+
+    def as_ids(self) -> array:
+        """Devuelve la posting list como array ordenado de artids"""
+        if self.ids is None:
+            # se guarda para no repetir la conversion al indexar resultados
+            self.ids = bits_to_ids(self.bits)
+        return self.ids
+
+    @classmethod
+    def union(cls, postings: List["PostingList"], universe: int) -> "PostingList":
+        """
+        Union de varias posting lists de una vez
+
+        Si el resultado puede ser denso se hace un OR de mapas de bits, si no
+        una sola mezcla k-way de los arrays, sin listas intermedias.
+        """
+        if any(p.is_bitmap for p in postings) or is_dense(sum(map(len, postings)), universe):
+            bits = 0
+            for p in postings:
+                bits |= p.as_bits()
+            return cls.from_bits(bits, universe)
+        merged = heapq.merge(*(p.ids for p in postings))
+        return cls(universe, ids=array("I", (artid for artid, _ in groupby(merged))))
+
+    def complement(self) -> "PostingList":
+        """Devuelve todos los artids del universo que no están en la posting list"""
+        full = (1 << self.universe) - 1
+        return PostingList.from_bits(full & ~self.as_bits(), self.universe)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        return iter(self.as_ids())
+
+    def __getitem__(self, i):
+        return self.as_ids()[i]
+
+    def __contains__(self, artid: int) -> bool:
+        if self.bits is not None:
+            return artid >= 0 and (self.bits >> artid) & 1 == 1
+        # array ordenado: busqueda binaria
+        i = bisect_left(self.ids, artid)
+        return i < self.size and self.ids[i] == artid
+
+    def __repr__(self) -> str:
+        kind = "bitmap" if self.is_bitmap else "array"
+        return f"PostingList({kind}, {self.size}/{self.universe})"
+
+    def tolist(self) -> list:
+        return self.as_ids().tolist()
+
+    def _filter(self, other: "PostingList", keep: bool) -> "PostingList":
+        """Filtra el array de self por los bits de "other" (keep=True: AND, False: ANDNOT)"""
+        buf = other.bits.to_bytes((max(self.universe, other.universe) >> 3) + 1, "little")
+        res = array("I", (i for i in self.ids if bool(buf[i >> 3] >> (i & 7) & 1) == keep))
+        return PostingList(self.universe, ids=res)
+
+    def __and__(self, other: "PostingList") -> "PostingList":
+        universe = max(self.universe, other.universe)
+        if self.bits is not None and other.bits is not None:
+            return PostingList.from_bits(self.bits & other.bits, universe)
+        if other.bits is not None:
+            return self._filter(other, True)
+        if self.bits is not None:
+            return other._filter(self, True)
+        short, long = sorted((self.ids, other.ids), key=len)
+        if len(short) * GALLOP_RATIO < len(long):
+            return PostingList(universe, ids=gallop_intersect(short, long))
+        return PostingList(universe, ids=array("I", sorted(set(short).intersection(long))))
+
+    def __or__(self, other: "PostingList") -> "PostingList":
+        universe = max(self.universe, other.universe)
+        if self.bits is None and other.bits is None:
+            return PostingList.from_sorted(sorted(set(self.ids).union(other.ids)), universe)
+        return PostingList.from_bits(self.as_bits() | other.as_bits(), universe)
+
+    def __sub__(self, other: "PostingList") -> "PostingList":
+        universe = max(self.universe, other.universe)
+        if self.bits is None and other.bits is not None:
+            return self._filter(other, False)
+        if self.bits is None:
+            return PostingList(universe, ids=array("I", sorted(set(self.ids).difference(other.ids))))
+        return PostingList.from_bits(self.bits & ~other.as_bits(), universe)
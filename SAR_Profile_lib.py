@@ -0,0 +1,167 @@
+#! -*- encoding: utf8 -*-
+"""
+Perfilado de las consultas por etapas.
+
+QueryProfiler sustituye en un SAR_Indexer los métodos de cada etapa de la
+resolución de una consulta (análisis, recuperación de posting lists,
+posicionales, operaciones AND/OR/NOT, lectura de artículos) por versiones
+que miden su tiempo, el número de postings que recorren y el tamaño de su
+resultado. Los métodos solo se sustituyen en la instancia perfilada, sin
+perfilar no hay ningún coste añadido.
+
+El tiempo de cada etapa es exclusivo: no incluye el de las etapas a las que
+llama (p.e. get_stemming llama a get_posting). La llamada más externa
+(solve_query o solve_and_show) delimita cada consulta.
+"""
+
+import math
+import time
+from typing import Callable, Dict, List, Optional
+
+# metodos de SAR_Indexer que inician una consulta
+ROOTS = ("solve_and_show", "solve_query")
+# etapas de la resolucion
+STAGES = (
+    "parse_query",
+    "get_posting",
+    "get_stemming",
+    "get_permuterm",
+    "get_positionals",
+    "get_near",
+    "solve_ranked",
+    "and_posting",
+    "or_posting",
+    "minus_posting",
+    "reverse_posting",
+    "live",
+    "get_article",
+)
+# etapas cuyos argumentos son posting lists: los postings recorridos son los de la entrada;
+# en el resto son los de la posting list que devuelven
+MERGES = ("and_posting", "or_posting", "minus_posting", "reverse_posting", "live")
+# etapas que no devuelven una posting list
+UNSIZED = ("solve_and_show", "parse_query", "get_article")
+
+
+def log2_histogram(values: List[float]) -> Dict[str, int]:
+    """
+    Histograma con intervalos [2^k, 2^(k+1)), la clave es el límite inferior ("0" para los valores < 1)
+    """
+    hist = {}
+    for v in values:
+        key = "0" if v < 1 else str(2 ** int(math.log2(v)))
+        hist[key] = hist.get(key, 0) + 1
+    return dict(sorted(hist.items(), key=lambda item: int(item[0])))
+
+
+def size(obj) -> Optional[int]:
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+class QueryProfiler:
+    """
+    Mide las etapas de las consultas que resuelve un SAR_Indexer.
+
+    Por cada consulta se guarda un registro con su tiempo total y, por
+    etapa, [tiempo (s), llamadas, postings recorridos, tamaño de los resultados].
+    """
+
+    def __init__(self, on_query: Optional[Callable[[Dict], None]] = None):
+        self.on_query = on_query
+        self.records = []
+        # tiempo de las etapas hijas de cada llamada en curso
+        self.stack = []
+        self.current = None
+
+    def attach(self, indexer, stages=STAGES):
+        """Sustituye los métodos de las etapas de "indexer" por versiones perfiladas"""
+        for name in ROOTS + tuple(stages):
+            setattr(indexer, name, self.wrap(name, getattr(indexer, name)))
+
+    def wrap(self, name: str, method: Callable) -> Callable:
+        stack = self.stack
+        clock = time.perf_counter
+        merge = name in MERGES
+        root = name in ROOTS
+        sized = name not in UNSIZED
+
+        def timed(*args, **kwargs):
+            if not stack and root:
+                self.current = {"query": args[0] if args else kwargs.get("query"), "stages": {}}
+            stack.append(0.0)
+            t0 = clock()
+            try:
+                res = method(*args, **kwargs)
+            finally:
+                elapsed = clock() - t0
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+            record = self.current
+            if record is not None:
+                stat = record["stages"].get(name)
+                if stat is None:
+                    stat = record["stages"][name] = [0.0, 0, 0, 0]
+                stat[0] += elapsed - children
+                stat[1] += 1
+                n = size(res) if sized else None
+                if merge:
+                    stat[2] += sum(size(arg) or 0 for arg in args)
+                elif n is not None and not root:
+                    stat[2] += n
+                if n is not None:
+                    stat[3] += n
+                if not stack:
+                    record["total"] = elapsed
+                    self.current = None
+                    self.records.append(record)
+                    if self.on_query is not None:
+                        self.on_query(record)
+            return res
+
+        return timed
+
+    def summary(self) -> Dict:
+        """
+        Agrega los registros de todas las consultas
+
+        Returns:
+            Dict: número de consultas, histograma del tiempo total (µs) y, por
+                etapa, totales e histogramas (por consulta) del tiempo (µs),
+                de los postings recorridos y del tamaño de los resultados
+        """
+        stages = {}
+        for record in self.records:
+            for name, stat in record["stages"].items():
+                stages.setdefault(name, []).append(stat)
+        return {
+            "queries": len(self.records),
+            "total_s": sum(r["total"] for r in self.records),
+            "total_us": log2_histogram([r["total"] * 1e6 for r in self.records]),
+            "stages": {
+                name: {
+                    "queries": len(stats),
+                    "calls": sum(s[1] for s in stats),
+                    "time_s": sum(s[0] for s in stats),
+                    "postings": sum(s[2] for s in stats),
+                    "results": sum(s[3] for s in stats),
+                    "time_us": log2_histogram([s[0] * 1e6 for s in stats]),
+                    "postings_hist": log2_histogram([s[2] for s in stats]),
+                    "results_hist": log2_histogram([s[3] for s in stats]),
+                }
+                for name, stats in sorted(stages.items(), key=lambda item: -sum(s[0] for s in item[1]))
+            },
+        }
+
+
+def format_record(record: Dict) -> str:
+    """Desglose de una consulta en una línea: etapas de mayor a menor tiempo"""
+    parts = [f"{record['query']}\t{record['total'] * 1000:.3f}ms"]
+    for name, (elapsed, calls, postings, results) in sorted(
+        record["stages"].items(), key=lambda item: -item[1][0]
+    ):
+        parts.append(f"{name} {elapsed * 1000:.3f}ms x{calls} ({postings} postings -> {results})")
+    return " | ".join(parts)
@@ -0,0 +1,191 @@
+#! -*- encoding: utf8 -*-
+"""
+Análisis sintáctico de las consultas.
+
+Una consulta se compila una sola vez a un árbol (AST) que después ejecuta
+SAR_Indexer.solve_node. Gramática (AND y OR tienen la misma precedencia y se
+evalúan de izquierda a derecha, como en la versión original):
+
+    expr    := unary (("AND" | "OR") unary)*
+    unary   := "NOT" unary | primary
+    primary := "(" expr ")" | words ("NEAR/k" words)?
+    words   := (campo ":")? (palabra | '"' frase '"')+
+
+Una secuencia de palabras y frases sin operadores entre ellas es una
+consulta posicional (Phrase). "a NEAR/k b" recupera los artículos con los
+términos a y b a una distancia de k posiciones o menos (en cualquier orden).
+Un prefijo "campo:" (title:foo, summary:"a b") restringe la palabra o la
+frase a ese campo, "url:" recupera el artículo con esa url exacta.
+"""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple, Union
+
+OPERATORS = ("AND", "OR", "NOT")
+FIELDS = ("all", "title", "summary", "section-name", "url")
+# campo que no se tokeniza, su valor se busca tal cual
+URL_FIELD = "url"
+FIELD_RE = re.compile(r"(%s):(.*)" % "|".join(map(re.escape, FIELDS)), re.S)
+TOKEN_RE = re.compile(
+    r'\(|\)|(?:%s):"[^"]*"?|"[^"]*"?|[^\s()"]+' % "|".join(map(re.escape, FIELDS))
+)
+NEAR_RE = re.compile(r"NEAR/(\d+)")
+
+
+class QuerySyntaxError(ValueError):
+    """La consulta no es sintácticamente correcta."""
+
+
+class Term(NamedTuple):
+    term: str
+    field: Optional[str] = None
+
+
+class Phrase(NamedTuple):
+    terms: Tuple[str, ...]
+    field: Optional[str] = None
+
+
+class Near(NamedTuple):
+    terms: Tuple[str, str]
+    k: int
+    field: Optional[str] = None
+
+
+class Not(NamedTuple):
+    child: "Node"
+
+
+class And(NamedTuple):
+    children: Tuple["Node", ...]
+
+
+class Or(NamedTuple):
+    children: Tuple["Node", ...]
+
+
+Node = Union[Term, Phrase, Near, Not, And, Or]
+
+
+def normalize_query(query: str) -> str:
+    """Normaliza los espacios de una consulta, es la clave de la caché de consultas compiladas"""
+    return " ".join(query.split())
+
+
+class Parser:
+    """
+    Analizador descendente recursivo de consultas.
+    """
+
+    def __init__(self, query: str):
+        self.tokens = TOKEN_RE.findall(query)
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        self.i += 1
+        return token
+
+    def parse(self) -> Node:
+        node = self.expr()
+        if self.peek() is not None:
+            raise QuerySyntaxError(f"token inesperado: {self.peek()}")
+        return node
+
+    def expr(self) -> Node:
+        node = self.unary()
+        while self.peek() in ("AND", "OR"):
+            op = And if self.next() == "AND" else Or
+            right = self.unary()
+            # se aplanan las cadenas del mismo operador: (a AND b) AND c == AND(a, b, c)
+            children = node.children if isinstance(node, op) else (node,)
+            node = op(children + (right,))
+        return node
+
+    def unary(self) -> Node:
+        if self.peek() == "NOT":
+            self.next()
+            child = self.unary()
+            # NOT NOT a == a
+            return child.child if isinstance(child, Not) else Not(child)
+        return self.primary()
+
+    def primary(self) -> Node:
+        token = self.peek()
+        if token is None:
+            raise QuerySyntaxError("consulta incompleta")
+        if token == "(":
+            self.next()
+            node = self.expr()
+            if self.next() != ")":
+                raise QuerySyntaxError("falta un parentesis de cierre")
+            return node
+        if token == ")":
+            raise QuerySyntaxError("parentesis de cierre sin abrir")
+        if token in OPERATORS or NEAR_RE.fullmatch(token):
+            raise QuerySyntaxError(f"falta un operando antes de {token}")
+        node = self.words()
+        near = NEAR_RE.fullmatch(self.peek() or "")
+        if near:
+            self.next()
+            right = self.words()
+            if not isinstance(node, Term) or not isinstance(right, Term):
+                raise QuerySyntaxError("NEAR solo admite un termino a cada lado")
+            if URL_FIELD in (node.field, right.field):
+                raise QuerySyntaxError("NEAR no admite el campo url")
+            if right.field is not None and right.field != node.field:
+                raise QuerySyntaxError("NEAR con terminos de campos distintos")
+            node = Near((node.term, right.term), int(near.group(1)), node.field)
+        return node
+
+    def is_word(self, token) -> bool:
+        return (
+            token is not None
+            and token not in OPERATORS + ("(", ")")
+            and not NEAR_RE.fullmatch(token)
+        )
+
+    def words(self) -> Node:
+        terms = []
+        field = None
+        while self.is_word(self.peek()):
+            token = self.next()
+            match = FIELD_RE.fullmatch(token)
+            if match:
+                # el campo solo puede indicarse al inicio y se aplica a toda la frase
+                if terms:
+                    raise QuerySyntaxError(f"campo en mitad de una frase: {token}")
+                field, token = match.groups()
+                if not token:
+                    raise QuerySyntaxError(f"falta el termino del campo {field}")
+            if field == URL_FIELD:
+                terms.append(token.strip('"'))
+            elif token.startswith('"'):
+                terms.extend(token.strip('"').lower().split())
+            else:
+                terms.append(token.lower())
+        if not terms:
+            raise QuerySyntaxError("frase vacia")
+        if len(terms) == 1:
+            return Term(terms[0], field)
+        if field == URL_FIELD:
+            raise QuerySyntaxError("el campo url solo admite un termino")
+        return Phrase(tuple(terms), field)
+
+
+@lru_cache(maxsize=4096)
+def compile_query(query: str) -> Node:
+    """
+    Compila una consulta (ya normalizada con normalize_query) a su AST
+
+    Las consultas compiladas se guardan en caché, las consultas repetidas de
+    los modos -L y -T no se vuelven a analizar.
+
+    Raises:
+        QuerySyntaxError: si la consulta no es correcta
+    """
+    return Parser(query).parse()
@@ -0,0 +1,190 @@
+#! -*- encoding: utf8 -*-
+"""
+Ordenación de los resultados por relevancia (BM25).
+
+Los k mejores artículos se obtienen con MaxScore: cada término tiene una
+cota superior de lo que puede aportar a la puntuación de un artículo,
+calculada con su frecuencia máxima y la longitud mínima de sus artículos
+(guardadas en el diccionario del índice). Los términos se ordenan por su
+cota; los que ni sumando sus cotas pueden hacer entrar un artículo entre los
+k mejores (términos "no esenciales") no se recorren, solo se consultan con
+búsqueda binaria para los artículos de los términos esenciales. Cuantos
+más artículos hay en el heap, más alto es el umbral y más términos dejan de
+ser esenciales. Con pocas postings la poda no compensa y best_k puntúa todos
+los artículos (score_all).
+"""
+
+import heapq
+import math
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Container, List, Optional, Sequence, Tuple
+
+# parametros de BM25
+K1 = 1.2
+B = 0.75
+
+# por debajo de este numero de postings (sumando los terminos) puntuar todos
+# los articulos es mas rapido que MaxScore (ver benchmarks/bench_ranking.py)
+EXHAUSTIVE_POSTINGS = 5000
+
+# artid mayor que cualquier otro, marca el final de una posting list en top_k
+END = 1 << 32
+
+
+def bm25_idf(df: int, n: int) -> float:
+    """idf de BM25 (siempre positivo) de un termino que aparece en "df" de "n" articulos"""
+    return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+
+def bm25_tf(tf: int, dl: int, avgdl: float) -> float:
+    """Componente de frecuencia de BM25, normalizada por la longitud del articulo"""
+    return tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avgdl))
+
+
+class TermScorer:
+    """
+    Posting list de un término de la consulta preparada para puntuar:
+    artids, frecuencias, idf y cota superior de su puntuación.
+    """
+
+    __slots__ = ("artids", "tfs", "idf", "upper")
+
+    def __init__(
+        self,
+        artids: Sequence[int],
+        tfs: Sequence[int],
+        idf: float,
+        maxtf: int,
+        mindl: int,
+        avgdl: float,
+    ):
+        self.artids = artids
+        self.tfs = tfs
+        self.idf = idf
+        # la componente de frecuencia crece con tf y decrece con la longitud
+        self.upper = idf * bm25_tf(maxtf, mindl, avgdl)
+
+    def __len__(self) -> int:
+        return len(self.artids)
+
+
+def best_k(
+    terms: List[TermScorer],
+    doclens: Sequence[int],
+    avgdl: float,
+    k: int,
+    accept: Optional[Container[int]] = None,
+) -> List[Tuple[float, int]]:
+    """
+    Devuelve los k artículos con mayor puntuación BM25: con MaxScore (top_k) o,
+    si los términos tienen menos de EXHAUSTIVE_POSTINGS postings o solo hay uno
+    (que siempre es esencial), puntuándolos todos.
+    """
+    if sum(1 for t in terms if len(t)) <= 1 or sum(map(len, terms)) < EXHAUSTIVE_POSTINGS:
+        return score_all(terms, doclens, avgdl, accept)[: max(k, 0)]
+    return top_k(terms, doclens, avgdl, k, accept)
+
+
+def top_k(
+    terms: List[TermScorer],
+    doclens: Sequence[int],
+    avgdl: float,
+    k: int,
+    accept: Optional[Container[int]] = None,
+) -> List[Tuple[float, int]]:
+    """
+    Devuelve los k artículos con mayor puntuación BM25 (MaxScore)
+
+    Args:
+        terms (List[TermScorer]): términos de la consulta
+        doclens (Sequence[int]): longitud de cada artículo, indexada por artid
+        avgdl (float): longitud media de los artículos
+        k (int): número de artículos a devolver
+        accept (Container[int]): si no es None, solo se puntúan los artículos que contiene
+
+    Returns:
+        List[Tuple[float, int]]: (puntuación, artid), de mayor a menor puntuación
+    """
+    terms = sorted((t for t in terms if len(t)), key=lambda t: t.upper)
+    if not terms or k <= 0:
+        return []
+    n = len(terms)
+    ids = [t.artids for t in terms]
+    tfs = [t.tfs for t in terms]
+    idfs = [t.idf for t in terms]
+    sizes = [len(t.artids) for t in terms]
+    # cota de la suma de las puntuaciones de terms[0..i]
+    prefix = list(accumulate(t.upper for t in terms))
+    cursors = [0] * n
+    # artid al que apunta el cursor de cada termino, END si se ha terminado
+    heads = [t.artids[0] for t in terms]
+    # normalizacion por longitud: K1 * (1 - B + B * dl / avgdl)
+    norm0 = K1 * (1 - B)
+    norm1 = K1 * B / avgdl
+    k1 = K1 + 1
+    heap = []
+    threshold = 0.0
+    # terms[first:] son los terminos esenciales
+    first = 0
+    while first < n:
+        doc = min(heads[first:])
+        if doc == END:
+            break
+        norm = norm0 + norm1 * doclens[doc]
+        score = 0.0
+        for i in range(first, n):
+            if heads[i] == doc:
+                j = cursors[i]
+                tf = tfs[i][j]
+                score += idfs[i] * tf * k1 / (tf + norm)
+                j += 1
+                cursors[i] = j
+                heads[i] = ids[i][j] if j < sizes[i] else END
+        if accept is not None and doc not in accept:
+            continue
+        # los no esenciales de mayor a menor cota, mientras el articulo pueda entrar
+        for i in range(first - 1, -1, -1):
+            if score + prefix[i] <= threshold:
+                break
+            j = cursors[i] = bisect_left(ids[i], doc, cursors[i])
+            if j < sizes[i] and ids[i][j] == doc:
+                tf = tfs[i][j]
+                score += idfs[i] * tf * k1 / (tf + norm)
+        if len(heap) < k:
+            # a igual puntuacion se prefiere el menor artid
+            heapq.heappush(heap, (score, -doc))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, -doc))
+        else:
+            continue
+        if len(heap) == k and heap[0][0] > threshold:
+            threshold = heap[0][0]
+            while first < n and prefix[first] <= threshold:
+                first += 1
+    return sorted(((score, -doc) for score, doc in heap), key=lambda r: (-r[0], r[1]))
+
+
+def score_all(
+    terms: List[TermScorer],
+    doclens: Sequence[int],
+    avgdl: float,
+    accept: Optional[Container[int]] = None,
+) -> List[Tuple[float, int]]:
+    """
+    Puntúa todos los artículos de los términos de la consulta (sin poda)
+
+    Returns:
+        List[Tuple[float, int]]: (puntuación, artid), de mayor a menor puntuación
+    """
+    norm0 = K1 * (1 - B)
+    norm1 = K1 * B / avgdl
+    k1 = K1 + 1
+    scores = {}
+    get = scores.get
+    for t in terms:
+        idf = t.idf
+        for artid, tf in zip(t.artids, t.tfs):
+            if accept is None or artid in accept:
+                scores[artid] = get(artid, 0.0) + idf * tf * k1 / (tf + norm0 + norm1 * doclens[artid])
+    return sorted(((score, artid) for artid, score in scores.items()), key=lambda r: (-r[0], r[1]))
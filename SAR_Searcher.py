@@ -2,10 +2,28 @@
 
 
 import argparse
+import json
 import pickle
 import sys
+import time
 
+from SAR_Index_lib import IndexFormatError
 from SAR_lib import SAR_Indexer
+from SAR_Profile_lib import QueryProfiler, format_record
+
+
+def show_throughput(query_list, elapsed):
+    # a stderr, para no mezclarlo con los resultados
+    nqueries = sum(1 for query in query_list if len(query) > 0 and query[0] != '#')
+    print('%d queries in %2.2fs (%2.1f queries/s).' % (nqueries, elapsed, nqueries / max(elapsed, 1e-9)),
+          file=sys.stderr)
+
+
+def save_profile(profiler, filename):
+    if profiler is not None:
+        with open(filename, 'w') as fh:
+            json.dump(profiler.summary(), fh, indent=2)
+        print('Profile saved in %s.' % filename, file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -20,6 +38,22 @@ if __name__ == "__main__":
                     help='use stem index by default.')
 
 
+    parser.add_argument('-m', '--mmap', dest='mmap', action='store_true', default=False,
+                    help='map the index in memory and read the posting lists on demand.')
+
+    parser.add_argument('-R', '--rank', dest='rank', action='store_true', default=False,
+                    help='rank the results by relevance (BM25).')
+
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                    help='number of processes used to solve the queries of -L and -T (ignored with --profile).')
+
+    parser.add_argument('--profile', dest='profile', action='store_true', default=False,
+                    help='print the time of each stage of every query to stderr.')
+
+    parser.add_argument('--profile-json', dest='profile_json', metavar='file', type=str, default='profile.json',
+                    help='file where the histograms of each stage are saved with --profile and -L or -T.')
+
+
     group0 = parser.add_mutually_exclusive_group()
     
     group0.add_argument('-N', '--snippet', dest='snippet', action='store_true', default=False, 
@@ -43,10 +77,24 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     searcher = SAR_Indexer()
-    searcher.load_info(args.index)
+    try:
+        searcher.load_info(args.index, lazy=args.mmap)
+    except IndexFormatError as ex:
+        print('ERROR: cannot open the index %s: %s.' % (args.index, ex), file=sys.stderr)
+        sys.exit(-1)
     searcher.set_stemming(args.stem)
     searcher.set_showall(args.all)
     searcher.set_snippet(args.snippet)
+    searcher.set_ranking(args.rank)
+
+    profiler = None
+    if args.profile:
+        # los procesos de --jobs no se perfilan
+        if args.jobs > 1:
+            print('WARNING: --jobs is ignored with --profile, the queries are solved in one process.', file=sys.stderr)
+        args.jobs = 1
+        profiler = QueryProfiler(lambda record: print('PROFILE ' + format_record(record), file=sys.stderr))
+        profiler.attach(searcher)
 
     # se debe contar o mostrar resultados?
     if args.count is True:
@@ -59,13 +107,20 @@ if __name__ == "__main__":
         # opt: -L, una lista de queries
         with open(args.qlist, encoding='utf-8') as fh:
             query_list = fh.read().strip().split('\n')
-        searcher.solve_and_count(query_list)
+        t0 = time.time()
+        searcher.solve_and_count(query_list, jobs=args.jobs)
+        show_throughput(query_list, time.time() - t0)
+        save_profile(profiler, args.profile_json)
 
     elif args.test is not None:
         # opt: -T, testing
         with open(args.test, encoding='utf-8') as fh:
             query_list = fh.read().split('\n')
-        if searcher.solve_and_test(query_list):
+        t0 = time.time()
+        ok = searcher.solve_and_test(query_list, jobs=args.jobs)
+        show_throughput(query_list, time.time() - t0)
+        save_profile(profiler, args.profile_json)
+        if ok:
             print('\nParece que todo está bien, buen trabajo!')
         else:
             print('\nParece que hay alguna consulta mal :-(')            
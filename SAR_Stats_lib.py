@@ -0,0 +1,198 @@
+#! -*- encoding: utf8 -*-
+"""
+Telemetría de la construcción del índice.
+
+BuildStats acumula el tiempo de cada fase de la indexación (análisis del
+JSON, almacén de documentos, tokenización, inserción de postings, volcado
+de bloques, stemming, permuterm, guardado), los artículos, tokens y bytes
+procesados, y una serie temporal de artículos y tokens indexados con la
+que se calcula el ritmo a lo largo de la construcción.
+
+estimate_size estima la memoria de las estructuras del índice. Las
+colecciones grandes se estiman con una muestra de sus elementos, el coste
+no depende del tamaño del índice.
+"""
+
+import sys
+import time
+from array import array
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, Iterable, List
+
+from SAR_Profile_lib import log2_histogram
+
+try:
+    import resource
+except ImportError:  # no disponible en Windows
+    resource = None
+
+# segundos entre dos muestras de la serie temporal
+SAMPLE_INTERVAL = 1.0
+# elementos de una coleccion que se miden para estimar su tamaño
+SIZE_SAMPLE = 200
+
+
+def peak_rss() -> Dict[str, int]:
+    """Memoria residente máxima (bytes) del proceso y de sus hijos (workers de indexación)"""
+    if resource is None:
+        return {}
+    # ru_maxrss esta en KB en Linux y en bytes en macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    }
+
+
+def estimate_size(obj, depth: int = 4) -> int:
+    """
+    Estima los bytes que ocupa un objeto y lo que contiene
+
+    Las colecciones de más de SIZE_SAMPLE elementos se estiman midiendo
+    SIZE_SAMPLE elementos repartidos por toda la colección. Los objetos con
+    atributos (p.e. TermDictionary) se miden por sus atributos.
+
+    Args:
+        obj: objeto a medir
+        depth (int): niveles de anidamiento que se recorren
+
+    Returns:
+        int: bytes estimados
+    """
+    if type(obj) is int and -5 <= obj <= 256:
+        # enteros pequeños: CPython los comparte
+        return 0
+    size = sys.getsizeof(obj)
+    if depth == 0 or isinstance(obj, (str, bytes, bytearray, int, float, array, memoryview)):
+        return size
+    if isinstance(obj, dict):
+        n = len(obj)
+        if n == 0:
+            return size
+        step = max(1, n // SIZE_SAMPLE)
+        sample = list(islice(obj.items(), 0, None, step))
+        measured = sum(estimate_size(k, depth - 1) + estimate_size(v, depth - 1) for k, v in sample)
+        return size + measured * n // len(sample)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        n = len(obj)
+        if n == 0:
+            return size
+        step = max(1, n // SIZE_SAMPLE)
+        items = obj if isinstance(obj, (list, tuple)) else list(obj)
+        sample = items[::step]
+        return size + sum(estimate_size(v, depth - 1) for v in sample) * n // len(sample)
+    if hasattr(obj, "__dict__"):
+        return size + sum(estimate_size(v, depth - 1) for v in vars(obj).values())
+    return size
+
+
+def distribution(values: Iterable[int]) -> Dict:
+    """Resumen de una distribución de enteros: total, media, percentiles e histograma log2"""
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    n = len(values)
+    return {
+        "count": n,
+        "sum": sum(values),
+        "mean": sum(values) / n,
+        "p50": values[n // 2],
+        "p90": values[min(n - 1, n * 9 // 10)],
+        "p99": values[min(n - 1, n * 99 // 100)],
+        "max": values[-1],
+        "histogram": log2_histogram(values),
+    }
+
+
+class BuildStats:
+    """
+    Contadores y tiempos de la construcción de un índice.
+    """
+
+    PHASES = ("parse", "store", "tokenize", "postings", "spill", "merge", "stemming", "permuterm", "save")
+
+    def __init__(self):
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.articles = 0
+        self.tokens = 0
+        self.bytes = 0
+        self.start = None
+        self.elapsed = 0.0
+        self.last_sample = 0.0
+        # (segundos desde el inicio, articulos, tokens)
+        self.timeline = []
+
+    def begin(self):
+        if self.start is None:
+            self.start = time.perf_counter()
+
+    def article(self, nbytes: int, ntokens: int):
+        """Cuenta un artículo indexado y añade una muestra a la serie temporal si toca"""
+        self.articles += 1
+        self.tokens += ntokens
+        self.bytes += nbytes
+        self.sample()
+
+    def sample(self, force: bool = False):
+        if self.start is None:
+            return
+        self.elapsed = time.perf_counter() - self.start
+        if force or self.elapsed - self.last_sample >= SAMPLE_INTERVAL:
+            self.last_sample = self.elapsed
+            self.timeline.append((self.elapsed, self.articles, self.tokens))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Suma al tiempo de la fase "name" lo que tarda el bloque with"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - t0
+
+    def merge(self, other: "BuildStats"):
+        """
+        Suma los contadores de un índice parcial (indexado en otro proceso)
+
+        Los tiempos de las fases son la suma de los de todos los procesos
+        (tiempo de CPU, no de reloj).
+        """
+        for name, t in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + t
+        self.articles += other.articles
+        self.tokens += other.tokens
+        self.bytes += other.bytes
+        self.sample()
+
+    def throughput(self) -> List[Dict]:
+        """Artículos/s y tokens/s en cada intervalo de la serie temporal"""
+        res = []
+        prev = (0.0, 0, 0)
+        for sample in self.timeline:
+            dt = sample[0] - prev[0]
+            if dt > 0:
+                res.append(
+                    {
+                        "t": round(sample[0], 3),
+                        "articles_per_s": (sample[1] - prev[1]) / dt,
+                        "tokens_per_s": (sample[2] - prev[2]) / dt,
+                    }
+                )
+            prev = sample
+        return res
+
+    def report(self) -> Dict:
+        elapsed = self.elapsed or 1e-9
+        return {
+            "articles": self.articles,
+            "tokens": self.tokens,
+            "bytes": self.bytes,
+            "seconds": self.elapsed,
+            "articles_per_s": self.articles / elapsed,
+            "tokens_per_s": self.tokens / elapsed,
+            "mb_per_s": self.bytes / 2**20 / elapsed,
+            "phases": {name: t for name, t in self.phases.items() if t > 0},
+            "timeline": self.throughput(),
+            "peak_rss": peak_rss(),
+        }
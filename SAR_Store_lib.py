@@ -0,0 +1,159 @@
+#! -*- encoding: utf8 -*-
+"""
+Almacén de documentos para mostrar los resultados.
+
+Guarda, para cada artículo, solo los campos que se muestran al usuario
+('url', 'title' y 'summary'), de forma que el buscador no necesita abrir los
+ficheros originales del crawler. Cada registro es una lista JSON, comprimida
+opcionalmente con zlib. El índice guarda para cada artid la posición y la
+longitud de su registro (ver SAR_Indexer.articles).
+"""
+
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import zlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+MAGIC = b"SARDOC\x00"
+STORE_FIELDS = ("url", "title", "summary")
+
+
+class DocStoreWriter:
+    """
+    Construye el almacén de documentos en un fichero temporal mientras se indexa.
+    """
+
+    def __init__(self, compress: bool = False, base: int = 0):
+        self.compress = compress
+        # con "base" los registros se añaden al final de un almacén existente de ese tamaño
+        self.base = base
+        self.fh = tempfile.TemporaryFile()
+        if not base:
+            self.fh.write(MAGIC + bytes((compress,)))
+        self.size = base + self.fh.tell()
+
+    @classmethod
+    def appending(cls, filename: str) -> "DocStoreWriter":
+        """Crea un almacén cuyos registros se añadirán al final del almacén "filename" """
+        with open(filename, "rb") as fh:
+            header = fh.read(len(MAGIC) + 1)
+        if header[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{filename} no es un almacen de documentos")
+        return cls(bool(header[-1]), os.path.getsize(filename))
+
+    def add(self, article: Dict) -> Tuple[int, int]:
+        """
+        Añade los campos a mostrar de un artículo
+
+        Args:
+            article (Dict): artículo con, al menos, las claves de STORE_FIELDS
+
+        Returns:
+            Tuple[int, int]: posición y longitud del registro en el almacén
+        """
+        data = json.dumps([article[f] for f in STORE_FIELDS]).encode("utf-8")
+        if self.compress:
+            data = zlib.compress(data)
+        offset = self.size
+        self.fh.write(data)
+        self.size += len(data)
+        return offset, len(data)
+
+    def merge(self, other: "DocStoreWriter") -> int:
+        """
+        Añade al final los registros de otro almacén
+
+        Returns:
+            int: desplazamiento a sumar a las posiciones de los registros de "other"
+        """
+        assert self.compress == other.compress
+        delta = self.size - len(MAGIC) - 1
+        other.fh.seek(len(MAGIC) + 1)
+        shutil.copyfileobj(other.fh, self.fh)
+        self.size = self.base + self.fh.tell()
+        return delta
+
+    def save(self, filename: str):
+        """Escribe el almacén en "filename", o lo añade al final si se creó con appending"""
+        self.fh.seek(0)
+        with open(filename, "ab" if self.base else "wb") as out:
+            shutil.copyfileobj(self.fh, out)
+        self.fh.seek(0, 2)
+
+    def __getstate__(self):
+        # para enviar los almacenes parciales entre procesos
+        self.fh.seek(0)
+        data = self.fh.read()
+        self.fh.seek(0, 2)
+        return {"compress": self.compress, "base": self.base, "data": data}
+
+    def __setstate__(self, state):
+        self.compress = state["compress"]
+        self.base = state["base"]
+        self.fh = tempfile.TemporaryFile()
+        self.fh.write(state["data"])
+        self.size = self.base + self.fh.tell()
+
+
+class DocStoreReader:
+    """
+    Lee el almacén de documentos proyectado en memoria, con una pequeña caché
+    LRU de registros ya decodificados.
+    """
+
+    def __init__(self, filename: str, cache_size: int = 256):
+        self.filename = filename
+        with open(filename, "rb") as fh:
+            self.mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{filename} no es un almacen de documentos")
+        self.compress = bool(self.mm[len(MAGIC)])
+        self.get = lru_cache(maxsize=cache_size)(self._get)
+
+    def _get(self, offset: int, length: int) -> Dict[str, str]:
+        """
+        Devuelve el registro de un artículo
+
+        Args:
+            offset (int): posición del registro
+            length (int): longitud del registro
+
+        Returns:
+            Dict[str, str]: claves: 'url', 'title', 'summary'
+        """
+        data = self.mm[offset : offset + length]
+        if self.compress:
+            data = zlib.decompress(data)
+        return dict(zip(STORE_FIELDS, json.loads(data)))
+
+    def dead_bytes(self, records: Iterable[Tuple[int, int]]) -> int:
+        """Bytes del almacén que no son de ninguno de los registros "records" (posición, longitud)"""
+        return len(self.mm) - len(MAGIC) - 1 - sum(length for _, length in records)
+
+    def rewrite(self, filename: str, records: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Escribe en "filename" un almacén con solo algunos registros, copiados sin decodificar
+
+        Args:
+            filename (str): fichero del almacén nuevo
+            records (Iterable[Tuple[int, int]]): posición y longitud de los registros que se copian
+
+        Returns:
+            List[Tuple[int, int]]: posición y longitud de cada registro en el almacén nuevo
+        """
+        placed = []
+        with open(filename, "wb") as out:
+            out.write(self.mm[: len(MAGIC) + 1])
+            for offset, length in records:
+                placed.append((out.tell(), length))
+                out.write(self.mm[offset : offset + length])
+        return placed
+
+    def close(self):
+        """Libera el mmap"""
+        self.get.cache_clear()
+        self.mm.close()
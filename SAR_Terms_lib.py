@@ -0,0 +1,128 @@
+#! -*- encoding: utf8 -*-
+"""
+Estructuras sobre el vocabulario del índice.
+
+Permuterm: índice de rotaciones para las consultas con comodines (* y ?).
+En lugar de un diccionario rotación --> término, se guarda un array ordenado
+de enteros, cada uno codifica (id de término, desplazamiento de la rotación).
+La rotación se reconstruye al comparar, así la memoria no se multiplica por
+la longitud media de los términos. Los términos se guardan en un
+TermDictionary (front coding).
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, Tuple
+
+from SAR_Index_lib import TermDictionary
+
+END = "$"
+# bits reservados en cada entrada para el desplazamiento de la rotación
+SHIFT_BITS = 16
+SHIFT_MASK = (1 << SHIFT_BITS) - 1
+WILDCARDS = ("*", "?")
+
+
+def has_wildcard(term: str) -> bool:
+    """True si el termino contiene algún comodín"""
+    return any(w in term for w in WILDCARDS)
+
+
+def wildcard_regex(pattern: str) -> "re.Pattern":
+    """Expresión regular equivalente a un término con comodines: * --> .*, ? --> ."""
+    return re.compile(
+        "".join(".*" if c == "*" else "." if c == "?" else re.escape(c) for c in pattern)
+    )
+
+
+class Permuterm:
+    """
+    Índice permuterm sobre una lista ordenada de términos.
+
+    Los términos que se añaden después (indexación incremental, ver add) se
+    guardan en permuterms aparte para no reordenar las rotaciones existentes,
+    merged() los une en uno solo al compactar el índice.
+    """
+
+    # permuterms de los términos añadidos con add
+    added: Tuple["Permuterm", ...] = ()
+
+    def __init__(self, terms: Iterable[str]):
+        # durante la construccion los terminos estan en una lista, para ordenar mas rapido
+        self.terms = sorted(terms)
+        # las rotaciones se ordenan por grupos segun su primer caracter, para
+        # no tener a la vez en memoria las cadenas de todas las rotaciones
+        groups = {}
+        for termid, term in enumerate(self.terms):
+            assert len(term) <= SHIFT_MASK, "termino demasiado largo"
+            t = term + END
+            for k in range(len(t)):
+                groups.setdefault(t[k], []).append(termid << SHIFT_BITS | k)
+        self.rotations = array("Q")
+        for first in sorted(groups):
+            self.rotations.extend(sorted(groups.pop(first), key=self.rotation))
+        self.terms = TermDictionary.build(self.terms)
+
+    def __len__(self) -> int:
+        return len(self.rotations) + sum(map(len, self.added))
+
+    def __iter__(self):
+        """Todos los términos, los añadidos con add después del resto"""
+        yield from self.terms
+        for part in self.added:
+            yield from part.terms
+
+    def add(self, terms: Iterable[str]):
+        """
+        Añade términos que no están en el permuterm
+
+        Solo se ordenan las rotaciones de los términos nuevos, que se buscan
+        aparte hasta que se unen con merged().
+        """
+        terms = list(terms)
+        if terms:
+            self.added += (Permuterm(terms),)
+
+    def merged(self) -> "Permuterm":
+        """Permuterm con todos los términos (incluidos los añadidos) en un único array de rotaciones"""
+        return Permuterm(self) if self.added else self
+
+    def rotation(self, entry: int) -> str:
+        """Reconstruye la rotación codificada en una entrada"""
+        t = self.terms[entry >> SHIFT_BITS] + END
+        k = entry & SHIFT_MASK
+        return t[k:] + t[:k]
+
+    def prefix_range(self, prefix: str):
+        """Devuelve el rango [lo, hi) de rotaciones que empiezan por "prefix" """
+        lo = bisect_left(self.rotations, prefix, key=self.rotation)
+        hi = bisect_left(self.rotations, prefix + "\U0010ffff", lo, key=self.rotation)
+        return lo, hi
+
+    def search(self, pattern: str) -> List[str]:
+        """
+        Devuelve los términos que encajan con un patrón con comodines
+
+        Se rota el patrón para dejar los comodines al final
+        (X*Y --> Y$X*), se buscan las rotaciones con ese prefijo y los
+        candidatos se filtran con el patrón completo (necesario para ? y para
+        varios comodines).
+
+        Args:
+            pattern (str): término con comodines (* o ?)
+
+        Returns:
+            List[str]: términos que encajan, en orden
+        """
+        first = min(pattern.find(w) for w in WILDCARDS if w in pattern)
+        last = max(pattern.rfind(w) for w in WILDCARDS)
+        lo, hi = self.prefix_range(pattern[last + 1 :] + END + pattern[:first])
+        termids = sorted({self.rotations[i] >> SHIFT_BITS for i in range(lo, hi)})
+        regex = wildcard_regex(pattern)
+        res = [
+            self.terms[t] for t in termids if regex.fullmatch(self.terms[t])
+        ]
+        if self.added:
+            res = sorted(res + [term for part in self.added for term in part.search(pattern)])
+        return res
@@ -12,15 +12,59 @@
 #   solve_and_show
 
 
+import heapq
 import json
 from nltk.stem.snowball import SnowballStemmer
 import os
 import re
 import sys
 import math
+import tempfile
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import groupby, islice
+from operator import itemgetter
+from multiprocessing import Pool
 from pathlib import Path
 from typing import Optional, List, Union, Dict
-import pickle
+
+from SAR_Ingest_lib import json_loads, peek_url, read_lines
+from SAR_Index_lib import (
+    FIELD_CODES,
+    IndexReader,
+    append_index,
+    compact_segments,
+    encode_spans,
+    field_mask,
+    field_positions,
+    merge_runs,
+    plan_merges,
+    write_index,
+)
+from SAR_Posting_lib import PostingList, near_match, phrase_match
+from SAR_Query_lib import (
+    And,
+    Near,
+    Node,
+    Not,
+    Or,
+    Phrase,
+    QuerySyntaxError,
+    Term,
+    URL_FIELD,
+    compile_query,
+    normalize_query,
+)
+from SAR_Rank_lib import TermScorer, best_k, bm25_idf
+from SAR_Stats_lib import BuildStats, distribution, estimate_size
+from SAR_Store_lib import DocStoreReader, DocStoreWriter
+from SAR_Terms_lib import Permuterm, has_wildcard, wildcard_regex
+
+# numero de terminos que se envian a cada proceso al calcular los stems
+STEM_CHUNK = 20000
+# bloques de queries por proceso en las listas de queries (-L, -T con --jobs)
+QUERY_CHUNKS = 8
 
 
 class SAR_Indexer:
@@ -61,6 +105,10 @@ class SAR_Indexer:
         "stemmer",
         "show_all",
         "use_stemming",
+        "multifield",
+        "spans",
+        "doclens",
+        "deleted",
     ]
 
     def __init__(self):
@@ -72,7 +120,7 @@ class SAR_Indexer:
         Puedes añadir más variables si las necesitas
 
         """
-        self.urls = set()  # hash para las urls procesadas,
+        self.urls = {}  # hash para las urls procesadas --> clave: url, valor: artid
         self.index = (
             {}
         )  # hash para el indice invertido de terminos --> clave: termino, valor: posting list
@@ -84,12 +132,22 @@ class SAR_Indexer:
             {}
         )  # diccionario de terminos --> clave: entero(docid),  valor: ruta del fichero.
         self.weight = {}  # hash de terminos para el pesado, ranking de resultados.
+        self.doclens = array("I")  # numero de tokens de cada articulo, indexado por artid (BM25)
+        self.avgdl = None  # longitud media de los articulos, se calcula al ordenar resultados
+        self.deleted = set()  # artids de los articulos borrados (tombstones), se restan de los resultados
+        self.deleted_posting = None  # self.deleted como posting list, se calcula al resolver consultas
         self.articles = (
             {}
         )  # hash de articulos --> clave entero (artid), valor: la info necesaria para diferencia los artículos dentro de su fichero
+        self.spans = {}  # tramos de campos de cada articulo (multifield) --> clave: artid, valor: bytes (ver SAR_Index_lib.encode_spans)
+        self.store = None  # almacen de documentos para mostrar resultados (SAR_Store_lib)
+        self.compress_store = False  # si es True los registros del almacen se comprimen
+        self.json_backend = None  # backend de JSON para leer los articulos, ver set_json_backend
+        self.loads = json.loads
         self.tokenizer = re.compile(
             "\W+"
         )  # expresion regular para hacer la tokenizacion
+        self.token_re = re.compile(r"\w+")  # palabras que quedan tras la tokenizacion (stream_tokens)
         self.stemmer = SnowballStemmer("spanish")  # stemmer en castellano
         self.show_all = False  # valor por defecto, se cambia con self.set_showall()
         self.show_snippet = False  # valor por defecto, se cambia con self.set_snippet()
@@ -97,6 +155,7 @@ class SAR_Indexer:
             False  # valor por defecto, se cambia con self.set_stemming()
         )
         self.use_ranking = False  # valor por defecto, se cambia con self.set_ranking()
+        self.stem_cache = {}  # stems ya calculados de los terminos de las consultas
 
         ##Utiles para la tokenización de los textos
         self.r1 = re.compile("[.;?!]")
@@ -105,6 +164,20 @@ class SAR_Indexer:
         self.r3 = re.compile("[^a-zA-Z0-9\s]")
         self.info = {}
 
+        ##Indexacion por bloques (SPIMI), se activa con index_dir(..., memory_budget=MB)
+        self.memory_budget = None  # bytes disponibles para el bloque en memoria
+        self.runs = []  # ficheros temporales con los bloques ya volcados a disco
+        self.runs_dir = None
+        self.block_postings = 0  # numero de pares (termino, artid) en el bloque
+        self.block_positions = 0  # numero de posiciones en el bloque
+
+        ##Indexacion incremental (--append), ver start_append
+        self.base = None  # indice ya guardado al que se añade un segmento nuevo
+        self.base_articles = 0  # los artids menores estan en los segmentos ya guardados
+
+        ##Telemetria de la construccion del indice (no se guarda), ver show_stats
+        self.build_stats = BuildStats()
+
     ###############################
     ###                         ###
     ###      CONFIGURACION      ###
@@ -153,6 +226,30 @@ class SAR_Indexer:
         """
         self.use_stemming = v
 
+    def set_json_backend(self, backend: Optional[str]):
+        """
+
+        Cambia el backend de JSON con el que se decodifican los articulos al indexar.
+
+        input: "backend" 'orjson', 'ujson', 'json' o None para usar el mas rapido instalado
+            (ver SAR_Ingest_lib).
+
+        """
+        self.json_backend = backend
+        self.loads = json_loads(backend)
+
+    def set_ranking(self, v: bool):
+        """
+
+        Cambia el modo de mostrar los resultados: ordenados por relevancia (BM25) o por artid.
+
+        input: "v" booleano.
+
+        si self.use_ranking es True solve_and_show muestra los resultados ordenados por su puntuacion.
+
+        """
+        self.use_ranking = v
+
     #############################################
     ###                                       ###
     ###      CARGA Y GUARDADO DEL INDICE      ###
@@ -163,22 +260,148 @@ class SAR_Indexer:
         """
         Guarda la información del índice en un fichero en formato binario
 
+        Las posting lists se guardan comprimidas (ver SAR_Index_lib), el resto
+        de atributos de self.all_atribs se guardan como metadatos.
+
+        """
+        with self.build_stats.phase("save"):
+            meta = self.meta_info()
+            if self.base is not None:
+                # indexacion incremental: los articulos nuevos se añaden en un segmento nuevo,
+                # el almacen se completa antes de que el indice apunte a sus registros
+                if self.index:
+                    self.store.save(filename + ".store")
+                    append_index(filename, self.index, meta, self.mask_function(), self.doclens)
+                self.base.close()
+                self.base = None
+                self.index = IndexReader(filename)
+                return
+            write_index(filename, self.index, meta, self.mask_function(), self.doclens)
+            if isinstance(self.store, DocStoreWriter):
+                self.store.save(filename + ".store")
+
+    def meta_info(self) -> Dict:
+        """Atributos de self.all_atribs que se guardan como metadatos del indice"""
+        return {atr: getattr(self, atr) for atr in self.all_atribs if atr != "index"}
+
+    def compact(self, filename: str, full: bool = False, **policy) -> int:
         """
-        info = [self.all_atribs] + [getattr(self, atr) for atr in self.all_atribs]
-        with open(filename, "wb") as fh:
-            pickle.dump(info, fh)
+        Compacta los segmentos de un indice cargado con load_info
 
-    def load_info(self, filename: str):
+        Los segmentos se fusionan segun la politica por niveles de
+        SAR_Index_lib.plan_merges (argumentos "policy": fanin, factor, purge),
+        o todos en uno si "full" es True. Los articulos borrados de los
+        segmentos fusionados se eliminan y los artids se renumeran de forma
+        consecutiva en articles, urls, spans, doclens y deleted. El indice nuevo
+        sustituye a "filename" de forma atomica.
+
+        Con "full" el almacen de documentos se reescribe con solo los registros
+        de los articulos que quedan (SAR_Store_lib.DocStoreReader.rewrite) y
+        sustituye al anterior justo despues del indice; si no, sus registros no
+        se mueven y los de los articulos eliminados siguen ocupando espacio.
+
+        Aunque no haya segmentos que fusionar, el fichero se reescribe si tiene
+        metadatos sin uso (ver SAR_Index_lib.append_index); el permuterm de los
+        terminos añadidos por la indexacion incremental se reconstruye entero.
+
+        Args:
+            filename (str): fichero del indice
+            full (bool): fusionar todos los segmentos
+            policy: parametros de plan_merges
+
+        Returns:
+            int: numero de grupos de segmentos fusionados
+        """
+        segments = self.index.segments
+        if full:
+            groups = [(0, len(segments))] if len(segments) > 1 or self.deleted else []
+        else:
+            deleted = sorted(self.deleted)
+            fractions = [
+                (bisect_left(deleted, seg.hi) - bisect_left(deleted, seg.lo)) / max(seg.hi - seg.lo, 1)
+                for seg in segments
+            ]
+            groups = plan_merges([seg.postings_size for seg in segments], fractions, **policy)
+        # registros de los articulos borrados o eliminados en compactaciones anteriores
+        stale = (
+            full
+            and isinstance(self.store, DocStoreReader)
+            and self.store.dead_bytes(
+                info[3:] for artid, info in self.articles.items() if artid not in self.deleted
+            )
+            > 0
+        )
+        if not groups and not self.index.unused and not stale:
+            return 0
+        # solo se eliminan los borrados que no estan en ningun segmento que se copia
+        merged = {i for lo, hi in groups for i in range(lo, hi)}
+        kept = [(seg.lo, seg.hi) for i, seg in enumerate(segments) if i not in merged]
+        purged = sorted(
+            artid for artid in self.deleted if not any(lo <= artid < hi for lo, hi in kept)
+        )
+        purged_set = set(purged)
+
+        def remap(artid: int) -> Optional[int]:
+            if artid in purged_set:
+                return None
+            return artid - bisect_right(purged, artid)
+
+        self.articles = {
+            remap(artid): info for artid, info in self.articles.items() if artid not in purged_set
+        }
+        self.urls = {url: remap(artid) for url, artid in self.urls.items()}
+        self.spans = {
+            remap(artid): spans for artid, spans in self.spans.items() if artid not in purged_set
+        }
+        self.doclens = array(
+            "I", (n for artid, n in enumerate(self.doclens) if artid not in purged_set)
+        )
+        self.deleted = {remap(artid) for artid in self.deleted if artid not in purged_set}
+        self.avgdl = self.deleted_posting = None
+        if isinstance(self.ptindex, Permuterm):
+            self.ptindex = self.ptindex.merged()
+        if stale:
+            # el almacen nuevo se escribe antes que el indice que apunta a sus registros
+            artids = sorted(self.articles)
+            placed = self.store.rewrite(
+                filename + ".store.tmp", (self.articles[artid][3:] for artid in artids)
+            )
+            for artid, record in zip(artids, placed):
+                self.articles[artid] = (*self.articles[artid][:3], *record)
+        compact_segments(
+            self.index,
+            filename,
+            groups,
+            remap,
+            self.meta_info(),
+            self.mask_function(),
+            self.doclens,
+        )
+        self.index.close()
+        self.index = IndexReader(filename)
+        if stale:
+            self.store.close()
+            os.replace(filename + ".store.tmp", filename + ".store")
+            self.store = DocStoreReader(filename + ".store")
+        return len(groups)
+
+    def load_info(self, filename: str, lazy: bool = False):
         """
         Carga la información del índice desde un fichero en formato binario
 
+        Las posting lists se decodifican bajo demanda a partir del diccionario de
+        terminos (TermDictionary). Si "lazy" es True el fichero se proyecta en
+        memoria (mmap) en lugar de leerse completo.
+
         """
-        # info = [self.all_atribs] + [getattr(self, atr) for atr in self.all_atribs]
-        with open(filename, "rb") as fh:
-            info = pickle.load(fh)
-        atrs = info[0]
-        for name, val in zip(atrs, info[1:]):
-            setattr(self, name, val)
+        self.index = IndexReader(filename, lazy)
+        meta = self.index.meta
+        for name in self.all_atribs:
+            if name in meta:
+                setattr(self, name, meta[name])
+        self.avgdl = self.deleted_posting = None
+        if os.path.exists(filename + ".store"):
+            self.store = DocStoreReader(filename + ".store")
 
     ###############################
     ###                         ###
@@ -192,10 +415,22 @@ class SAR_Indexer:
         Args:
             article (Dict): diccionario con la información de un artículo
 
+        Al añadir un lote a un índice guardado (--append), un artículo cuya url
+        está en un segmento anterior se ha vuelto a descargar: el antiguo se
+        marca como borrado y el nuevo se indexa.
+
         Returns:
             bool: True si el artículo ya está indexado, False en caso contrario
         """
-        return article["url"] in self.urls
+        artid = self.urls.get(article["url"])
+        if artid is None:
+            return False
+        if artid < self.base_articles:
+            self.deleted.add(artid)
+            self.deleted_posting = None
+            del self.urls[article["url"]]
+            return False
+        return True
 
     def index_dir(self, root: str, **args):
         """
@@ -211,6 +446,15 @@ class SAR_Indexer:
         self.positional = args["positional"]
         self.stemming = args["stem"]
         self.permuterm = args["permuterm"]
+        workers = args.get("workers") or 1
+        self.set_json_backend(args.get("json_backend"))
+        self.build_stats.begin()
+        self.compress_store = args.get("compress_store", False)
+        if args.get("memory_budget"):
+            self.memory_budget = args["memory_budget"] * 2**20
+        if isinstance(self.index, IndexReader):
+            # se ha cargado un indice con load_info: se añade un segmento nuevo
+            self.start_append()
 
         # id de cada documento:
         id = 0
@@ -219,34 +463,203 @@ class SAR_Indexer:
 
         if file_or_dir.is_file():
             # is a file
-            self.index_file(root)
+            filenames = [root]
         elif file_or_dir.is_dir():
             # is a directory
+            filenames = []
             for d, _, files in os.walk(root):
                 for filename in files:
                     if filename.endswith(".json"):
-                        fullname = os.path.join(d, filename)
-                        self.index_file(fullname)
+                        filenames.append(os.path.join(d, filename))
         else:
             print(f"ERROR:{root} is not a file nor directory!", file=sys.stderr)
             sys.exit(-1)
+        # los ficheros ya indexados no se vuelven a procesar
+        indexed = {os.path.abspath(filename) for filename in self.docs.values()}
+        filenames = [f for f in filenames if os.path.abspath(f) not in indexed]
+
+        if workers > 1 and len(filenames) > 1:
+            # Cada proceso indexa un fichero con artids locales, los indices
+            # parciales se fusionan en el orden de los ficheros
+            options = {
+                "multifield": self.multifield,
+                "positional": self.positional,
+                "stem": self.stemming,
+                "permuterm": self.permuterm,
+                "compress_store": self.compress_store,
+                "json_backend": self.json_backend,
+            }
+            with Pool(workers) as pool:
+                tasks = [(filename, options) for filename in filenames]
+                for partial in pool.imap(index_partial, tasks):
+                    with self.build_stats.phase("postings"):
+                        self.merge_partial(partial)
+                    self.build_stats.merge(partial.build_stats)
+                    self.check_block()
+        else:
+            for filename in filenames:
+                self.index_file(filename)
+
+        if self.runs:
+            with self.build_stats.phase("merge"):
+                self.merge_blocks()
+
+        if self.stemming:
+            with self.build_stats.phase("stemming"):
+                self.make_stemming(workers)
+        if self.permuterm:
+            with self.build_stats.phase("permuterm"):
+                self.make_permuterm()
+        self.build_stats.sample(force=True)
+
+    def start_append(self):
+        """
+
+        Prepara la indexacion incremental sobre un indice cargado con load_info.
+
+        El indice cargado (self.base) no se modifica: los articulos nuevos
+        reciben artids a continuacion de los existentes y se indexan en un
+        indice en memoria que save_info añade al fichero como un segmento
+        nuevo. Las opciones de indexacion son las del indice existente.
+
+        """
+        self.base = self.index
+        self.index = {}
+        self.base_articles = len(self.articles)
+        self.multifield = self.base.meta.get("multifield", False)
+        self.stemming = bool(self.sindex)
+        self.permuterm = isinstance(self.ptindex, Permuterm)
+        if isinstance(self.store, DocStoreReader):
+            filename = self.store.filename
+            self.store.close()
+            self.store = DocStoreWriter.appending(filename)
+
+    def merge_partial(self, partial: "SAR_Indexer"):
+        """
+
+        Fusiona en el indice un indice parcial construido por otro proceso.
+
+        Los artids y docids del indice parcial son locales: se renumeran a
+        continuacion de los ya indexados. Los articulos cuya url ya estaba
+        indexada se descartan, igual que en index_file.
+
+        Args:
+            partial (SAR_Indexer): indice parcial (ver index_partial)
+        """
+        docbase = len(self.docs)
+        for docid, filename in partial.docs.items():
+            self.docs[docbase + docid] = filename
+        if self.store is None:
+            self.store = DocStoreWriter(self.compress_store)
+        storebase = self.store.merge(partial.store)
+        # artid local --> artid global
+        remap = {}
+        for url, artid in partial.urls.items():
+            if self.already_in_index({"url": url}):
+                continue
+            remap[artid] = len(self.articles)
+            self.urls[url] = remap[artid]
+            if artid in partial.spans:
+                self.spans[remap[artid]] = partial.spans[artid]
+            self.doclens.append(partial.doclens[artid])
+            docid, offset, length, store_offset, store_length = partial.articles[artid]
+            self.articles[remap[artid]] = (
+                docbase + docid,
+                offset,
+                length,
+                storebase + store_offset,
+                store_length,
+            )
+        for term, postings in partial.index.items():
+            merged = {remap[a]: pos for a, pos in postings.items() if a in remap}
+            if not merged:
+                continue
+            self.block_postings += len(merged)
+            self.block_positions += sum(map(len, merged.values()))
+            if term not in self.index:
+                self.index[term] = merged
+            else:
+                self.index[term].update(merged)
 
-        ##########################################
-        ## COMPLETAR PARA FUNCIONALIDADES EXTRA ##
-        ##########################################
+    def block_size(self) -> int:
+        """
+        Estima los bytes que ocupa el bloque del indice que hay en memoria.
 
-    def parse_article(self, raw_line: str) -> Dict[str, str]:
+        Se usa el coste aproximado en CPython de cada termino (clave str + dict
+        de postings), de cada posting (entrada del dict + lista) y de cada
+        posicion (entero + hueco en la lista).
+        """
+        return (
+            200 * len(self.index)
+            + 150 * self.block_postings
+            + 40 * self.block_positions
+        )
+
+    def check_block(self):
+        """
+        Vuelca el bloque en memoria a disco si supera self.memory_budget
+        """
+        if self.memory_budget is not None and self.block_size() > self.memory_budget:
+            with self.build_stats.phase("spill"):
+                self.flush_block()
+
+    def flush_block(self):
+        """
+        Vuelca el bloque del indice en memoria a un fichero temporal ordenado por terminos
+        (SPIMI) y vacia el bloque.
+        """
+        if self.runs_dir is None:
+            self.runs_dir = tempfile.mkdtemp(prefix="sar_spimi_")
+        run = os.path.join(self.runs_dir, f"run_{len(self.runs):05d}.idx")
+        write_index(run, self.index, {}, self.mask_function(), self.doclens)
+        self.runs.append(run)
+        self.index = {}
+        self.block_postings = self.block_positions = 0
+
+    def merge_blocks(self):
+        """
+        Vuelca el ultimo bloque y fusiona todos los bloques (k-way merge) en un
+        unico indice en disco, que pasa a ser self.index proyectado en memoria.
+        """
+        if self.index:
+            self.flush_block()
+        merged = os.path.join(self.runs_dir, "merged.idx")
+        merge_runs(self.runs, merged, self.mask_function(), self.doclens)
+        for run in self.runs:
+            os.remove(run)
+        self.runs = []
+        self.index = IndexReader(merged)
+        # el fichero sigue accesible a traves del mmap hasta que se cierre
+        os.remove(merged)
+        os.rmdir(self.runs_dir)
+        self.runs_dir = None
+
+    def parse_article(self, raw_line: Union[str, bytes], full: bool = True) -> Dict[str, str]:
         """
         Crea un diccionario a partir de una linea que representa un artículo del crawler
 
         Args:
-            raw_line: una linea del fichero generado por el crawler
+            raw_line: una linea (str o bytes) del fichero generado por el crawler
+            full (bool): si es False no se construyen 'all' ni 'section-name', basta con
+                'parts' para recorrer los tokens con stream_tokens
 
         Returns:
-            Dict[str, str]: claves: 'url', 'title', 'summary', 'all', 'section-name'
+            Dict[str, str]: claves: 'url', 'title', 'summary', 'all', 'section-name' y
+                'parts': lista de (campo, texto) en el orden en que forman 'all'
         """
 
-        article = json.loads(raw_line)
+        article = self.loads(raw_line)
+        parts = [("title", article["title"]), ("summary", article["summary"])]
+        for sec in article["sections"]:
+            parts.append(("section-name", sec["name"]))
+            parts.append(("all", sec["text"]))
+            for subsec in sec["subsections"]:
+                parts.append(("section-name", subsec["name"]))
+                parts.append(("all", subsec["text"]))
+        article["parts"] = parts
+        if not full:
+            article.pop("sections")
+            return article
         sec_names = []
         txt_secs = ""
         for sec in article["sections"]:
@@ -268,6 +681,28 @@ class SAR_Indexer:
 
         return article
 
+    def stream_tokens(self, parts: List):
+        """
+        Recorre los tokens de los campos de un articulo sin construir el texto de 'all'
+
+        Cada campo se pasa a minusculas y se extraen sus palabras (\\w+, los
+        mismos tokens que tokenize) en el orden en que forman 'all', asi las
+        posiciones coinciden con las de tokenize(article['all']). Solo se copia
+        el texto de un campo cada vez.
+
+        Args:
+            parts (List): lista de (campo, texto) de parse_article
+
+        Returns:
+            iterador de (campo, posicion del primer token, tokens del campo)
+        """
+        findall = self.token_re.findall
+        pos = 0
+        for field, text in parts:
+            tokens = findall(text.lower())
+            yield field, pos, tokens
+            pos += len(tokens)
+
     def index_file(self, filename: str):
         """
 
@@ -280,26 +715,75 @@ class SAR_Indexer:
 
         dependiendo del valor de self.multifield y self.positional se debe ampliar el indexado
 
+        Todos los campos comparten el indice de 'all': con self.multifield se
+        guardan en self.spans los tramos de 'all' que corresponden a cada campo,
+        con los que se calcula la mascara de campos de cada posting al guardar
+        el indice. La url se busca en self.urls.
+
+        El fichero se lee con un buffer grande (SAR_Ingest_lib.read_lines); los articulos
+        cuya url ya se ha indexado en este lote se descartan sin decodificarlos.
 
         """
         print(f"Indexing {filename}...")
         self.docs[len(self.docs)] = filename
-        for i, line in enumerate(open(filename)):
-            j = self.parse_article(line)
+        if self.store is None:
+            self.store = DocStoreWriter(self.compress_store)
+        # se guarda la posicion en bytes de cada articulo para acceder a el con seek
+        stats = self.build_stats
+        phases = stats.phases
+        clock = time.perf_counter
+        for start, length, line in read_lines(filename):
+            url = peek_url(line)
+            if url is not None and self.urls.get(url, -1) >= self.base_articles:
+                # ya indexado en este lote (ver already_in_index): no se decodifica
+                continue
+            t0 = clock()
+            j = self.parse_article(line, full=False)
+            t1 = clock()
+            phases["parse"] += t1 - t0
             if self.already_in_index(j):
                 continue
-            if j["url"] not in self.urls:
-                self.urls.add(j["url"])
             artid = len(self.articles)
-            self.articles[artid] = (len(self.docs) - 1, i + 1)
-            pos = 0
-            for token in self.tokenize(j["all"]):
-                if token not in self.index:
-                    self.index[token] = {}
-                if artid not in self.index[token]:
-                    self.index[token][artid] = []
-                self.index[token][artid].append(pos)
-                pos += 1
+            self.urls[j["url"]] = artid
+            self.articles[artid] = (
+                len(self.docs) - 1,
+                start,
+                length,
+                *self.store.add(j),
+            )
+            t2 = clock()
+            # tramos de cada campo (multifield): (codigo, numero de tokens)
+            runs = []
+            index = self.index
+            # tiempo de la tokenizacion: lo que tarda stream_tokens en dar cada campo
+            tokenize = 0.0
+            prev = t2
+            for field, first, tokens in self.stream_tokens(j["parts"]):
+                now = clock()
+                tokenize += now - prev
+                runs.append((FIELD_CODES[field], len(tokens)))
+                for pos, token in enumerate(tokens, first):
+                    postings = index.get(token)
+                    if postings is None:
+                        postings = index[token] = {}
+                    positions = postings.get(artid)
+                    if positions is None:
+                        postings[artid] = [pos]
+                        self.block_postings += 1
+                    else:
+                        positions.append(pos)
+                prev = clock()
+            doclen = sum(n for _, n in runs)
+            if self.multifield:
+                self.spans[artid] = encode_spans(runs)
+            self.doclens.append(doclen)
+            self.block_positions += doclen
+            t3 = clock()
+            phases["store"] += t2 - t1
+            phases["tokenize"] += tokenize
+            phases["postings"] += t3 - t2 - tokenize
+            stats.article(length, doclen)
+            self.check_block()
         # En la version basica solo se debe indexar el contenido "article"
         #
 
@@ -331,7 +815,7 @@ class SAR_Indexer:
         """
         return self.tokenizer.sub(" ", text.lower()).split()
 
-    def make_stemming(self):
+    def make_stemming(self, workers: int = 1):
         """
 
         Crea el indice de stemming (self.sindex) para los terminos de todos los indices.
@@ -340,13 +824,28 @@ class SAR_Indexer:
 
         "self.stemmer.stem(token) devuelve el stem del token"
 
+        El stem se calcula una sola vez por termino del vocabulario. Con
+        vocabularios grandes y "workers" > 1 el calculo se reparte en bloques
+        entre varios procesos.
 
         """
-
-        pass
-        ####################################################
-        ## COMPLETAR PARA FUNCIONALIDAD EXTRA DE STEMMING ##
-        ####################################################
+        terms = list(self.index)
+        if self.base is not None:
+            # indexacion incremental: solo los terminos nuevos
+            terms = [term for term in terms if term not in self.base]
+        else:
+            self.sindex = {}
+        if workers > 1 and len(terms) > STEM_CHUNK:
+            chunks = [terms[i : i + STEM_CHUNK] for i in range(0, len(terms), STEM_CHUNK)]
+            with Pool(workers) as pool:
+                stems = [stem for part in pool.map(stem_terms, chunks) for stem in part]
+        else:
+            stems = map(self.stemmer.stem, terms)
+        for term, stem in zip(terms, stems):
+            if stem in self.sindex:
+                self.sindex[stem].append(term)
+            else:
+                self.sindex[stem] = [term]
 
     def make_permuterm(self):
         """
@@ -355,12 +854,16 @@ class SAR_Indexer:
 
         NECESARIO PARA LA AMPLIACION DE PERMUTERM
 
+        Las rotaciones se guardan en un array ordenado que apunta a los terminos
+        (ver SAR_Terms_lib.Permuterm).
 
         """
-        pass
-        ####################################################
-        ## COMPLETAR PARA FUNCIONALIDAD EXTRA DE STEMMING ##
-        ####################################################
+        if self.base is not None:
+            # indexacion incremental: solo se añaden los terminos nuevos, el
+            # permuterm se reconstruye entero al compactar el indice
+            self.ptindex.add(term for term in self.index if term not in self.base)
+        else:
+            self.ptindex = Permuterm(self.index)
 
     def show_stats(self):
         """
@@ -378,13 +881,88 @@ class SAR_Indexer:
         print("---------------------------------------------------")
         print(f"Number of indexed articles: {len(self.urls)}")
         print("---------------------------------------------------")
+        if isinstance(self.index, IndexReader):
+            print(f"Number of segments: {len(self.index.segments)}")
+            print(f"Number of deleted articles: {len(self.deleted)}")
+            print("---------------------------------------------------")
         print(f"TOKENS: \n       # of tokens in 'all': {len(self.index)}")
         print("===================================================")
+        if self.stemming:
+            print(f"STEMS: \n       # of stems in 'all': {len(self.sindex)}")
+            print("===================================================")
+        if self.permuterm:
+            print(f"PERMUTERMS: \n       # of permuterms in 'all': {len(self.ptindex)}")
+            print("===================================================")
+        if self.multifield:
+            print("Multifield queries are allowed.")
+        else:
+            print("Multifield queries are NOT allowed.")
         if self.positional:
             print("Positional queries are allowed.")
         else:
             print("Positional queries are NOT allowed.")
         print("========================================")
+        report = self.build_report()
+        build = report["build"]
+        if build["articles"]:
+            print(
+                f"BUILD: \n       {build['articles_per_s']:.1f} articles/s, "
+                f"{build['tokens_per_s']:.1f} tokens/s, {build['mb_per_s']:.2f} MB/s"
+            )
+            for name, t in build["phases"].items():
+                print(f"       time {name}: {t:.2f}s")
+            for name, rss in build["peak_rss"].items():
+                print(f"       peak RSS ({name}): {rss / 2**20:.1f}MB")
+            print("---------------------------------------------------")
+        print("MEMORY (estimated):")
+        for name, size in report["memory"].items():
+            print(f"       {name}: {size / 2**20:.2f}MB")
+        print("---------------------------------------------------")
+        lengths = report["postings"]
+        if lengths["count"]:
+            print(
+                f"POSTING LISTS: \n       mean {lengths['mean']:.1f}, p50 {lengths['p50']}, "
+                f"p90 {lengths['p90']}, p99 {lengths['p99']}, max {lengths['max']}"
+            )
+            for low, n in lengths["histogram"].items():
+                print(f"       df >= {low}: {n}")
+        print("========================================")
+
+    def build_report(self) -> Dict:
+        """
+        Telemetria de la construccion del indice, para show_stats o para guardar en JSON
+
+        return: diccionario con:
+                "build": ritmo (articulos, tokens y MB por segundo, tambien a lo largo
+                    del tiempo), tiempo de cada fase y memoria residente maxima (ver SAR_Stats_lib)
+                "memory": bytes estimados de cada estructura; un indice en disco
+                    cuenta el tamaño del fichero proyectado
+                "postings": distribucion de la longitud (df) de las posting lists
+        """
+        memory = {}
+        for name in ("index", "urls", "articles", "spans", "doclens", "sindex", "ptindex", "deleted"):
+            obj = getattr(self, name)
+            if isinstance(obj, IndexReader):
+                memory[name + " (mapped)"] = obj.buf.nbytes
+            else:
+                memory[name] = estimate_size(obj)
+        return {
+            "build": self.build_stats.report(),
+            "memory": memory,
+            "postings": distribution(self.posting_lengths()),
+        }
+
+    def posting_lengths(self) -> List[int]:
+        """
+        Longitud (df) de la posting list de cada termino
+        """
+        if not isinstance(self.index, IndexReader):
+            return [len(postings) for postings in self.index.values()]
+        segments = self.index.segments
+        if len(segments) == 1:
+            return list(segments[0].dfs)
+        merged = heapq.merge(*(segment.entries() for segment in segments))
+        return [sum(entry[1] for entry in entries) for _, entries in groupby(merged, key=itemgetter(0))]
 
     #################################
     ###                           ###
@@ -403,7 +981,8 @@ class SAR_Indexer:
         NECESARIO PARA TODAS LAS VERSIONES
 
         Resuelve una query.
-        Debe realizar el parsing de consulta que sera mas o menos complicado en funcion de la ampliacion que se implementen
+        La consulta se compila a un arbol (SAR_Query_lib, con parentesis) que se guarda
+        en cache y se ejecuta con solve_node.
 
 
         param:  "query": cadena con la query
@@ -414,71 +993,119 @@ class SAR_Indexer:
 
         """
         if query is None or len(query) == 0:
-            return []
+            return self.as_posting([])
 
-        terms = query.replace('"', " ")
-        terms = terms.split()
-        i = 0
-        res = []
-        # Consultas posiconales:
-        while i < len(terms):
-            term = terms[i]
-            aux = 0
-            posicionales = []
-            if term == "AND":
-                res += ["AND"]
-                i += 1
-            elif term == "OR":
-                res += ["OR"]
-                i += 1
-            elif term == "NOT":
-                res += ["NOT"]
-                i += 1
-            else:
-                while (
-                    (i + aux) < len(terms)
-                    and terms[i + aux] != "AND"
-                    and terms[i + aux] != "OR"
-                    and terms[i + aux] != "NOT"
-                ):
-                    posicionales.append(terms[i + aux])
-                    aux += 1
-                if len(posicionales) == 1:
-                    res.append(self.get_posting(term))
-                    i += 1
-                else:
-                    res.append(self.get_positionals(posicionales, False))
-                    i += aux
+        node = self.parse_query(query)
+        if node is None:
+            return self.as_posting([])
+        return self.live(self.solve_node(node))
 
-        # Consulta normal
-        solve = []
-        # print(res)
-        i = 0
-        while i < len(res):
-            r = res[i]
-            if res[i] == "NOT":
-                solve = self.reverse_posting(res[i + 1])
-                i += 2
-            elif res[i] == "AND":
-                if res[i + 1] == "NOT":
-                    sig = self.reverse_posting(res[i + 2])
-                    i += 3
-                else:
-                    sig = res[i + 1]
-                    i += 2
-                solve = self.and_posting(solve, sig)
-            elif res[i] == "OR":
-                if res[i + 1] == "NOT":
-                    sig = self.reverse_posting(res[i + 2])
-                    i += 3
+    def parse_query(self, query: str) -> Optional[Node]:
+        """
+        Compila una query a su arbol (SAR_Query_lib)
+
+        param:  "query": cadena con la query
+
+        return: raiz del arbol, o None si la query no es valida (el error se muestra en stderr)
+        """
+        try:
+            return compile_query(normalize_query(query))
+        except QuerySyntaxError as ex:
+            print(f"ERROR: {query} - {ex}", file=sys.stderr)
+            return None
+
+    def live(self, p):
+        """
+        Quita de una posting list los articulos borrados (self.deleted)
+
+        param:  "p": posting list
+
+        return: posting list sin los articulos borrados
+        """
+        if not self.deleted:
+            return p
+        if self.deleted_posting is None:
+            self.deleted_posting = self.as_posting(sorted(self.deleted))
+        return self.minus_posting(p, self.deleted_posting)
+
+    def solve_node(self, node: Node):
+        """
+
+        Ejecuta una consulta compilada (ver SAR_Query_lib).
+
+        Los AND se resuelven con solve_and, que ordena los operandos y resta
+        los negados sin construir su complementario. En los OR, un operando
+        negado se combina con la union del resto: a OR NOT b == NOT (b AND NOT a).
+
+        param:  "node": nodo del arbol de la consulta
+
+        return: posting list con el resultado
+
+        """
+        if isinstance(node, Term):
+            if self.use_stemming and not has_wildcard(node.term) and node.field != URL_FIELD:
+                return self.get_stemming(node.term, node.field)
+            return self.get_posting(node.term, node.field)
+        if isinstance(node, Phrase):
+            return self.get_positionals(list(node.terms), node.field)
+        if isinstance(node, Near):
+            return self.get_near(list(node.terms), node.k, node.field)
+        if isinstance(node, Not):
+            return self.solve_and([], [self.solve_node(node.child)])
+        if isinstance(node, And):
+            positives, negatives = [], []
+            for child in node.children:
+                if isinstance(child, Not):
+                    negatives.append(self.solve_node(child.child))
                 else:
-                    sig = res[i + 1]
-                    i += 2
-                solve = self.or_posting(solve, sig)
+                    positives.append(self.solve_node(child))
+            return self.solve_and(positives, negatives)
+        # Or
+        solve = self.as_posting([])
+        negatives = []
+        for child in node.children:
+            if isinstance(child, Not):
+                negatives.append(self.solve_node(child.child))
             else:
-                solve = r
-                i += 1
+                solve = self.or_posting(solve, self.solve_node(child))
+        for p in negatives:
+            solve = self.reverse_posting(self.minus_posting(p, solve))
         return solve
+
+    def solve_and(self, positives: List, negatives: List):
+        """
+
+        Resuelve la conjuncion de varias posting lists y de las negaciones de otras.
+
+        Los operandos positivos se intersecan de menor a mayor longitud y a
+        continuacion se restan los negativos con minus_posting, sin construir
+        su complementario. Solo si no hay ningun operando positivo se calcula
+        un complementario (el de la union de los negativos).
+
+        param:  "positives": posting lists que deben contener los resultados
+                "negatives": posting lists que no deben contener los resultados
+
+        return: posting list con el resultado
+
+        """
+        if not positives:
+            if not negatives:
+                return self.as_posting([])
+            union = negatives[0]
+            for p in negatives[1:]:
+                union = self.or_posting(union, p)
+            return self.reverse_posting(union)
+        positives = sorted(positives, key=len)
+        solve = positives[0]
+        for p in positives[1:]:
+            if len(solve) == 0:
+                break
+            solve = self.and_posting(solve, p)
+        for p in sorted(negatives, key=len, reverse=True):
+            if len(solve) == 0:
+                break
+            solve = self.minus_posting(solve, p)
+        return self.as_posting(solve)
         ########################################
         ## COMPLETAR PARA TODAS LAS VERSIONES ##
         ########################################
@@ -501,12 +1128,52 @@ class SAR_Indexer:
         NECESARIO PARA TODAS LAS VERSIONES
 
         """
+        if field == URL_FIELD:
+            artid = self.urls.get(term)
+            return self.as_posting([] if artid is None else [artid])
+        if has_wildcard(term):
+            return self.get_permuterm(term, field)
+        code = self.field_code(field)
+        if isinstance(self.index, IndexReader):
+            return self.as_posting(self.index.docids(term, code))
         if term in self.index:
-            return list(self.index[term].keys())
+            if code is None:
+                return self.as_posting(self.index[term].keys())
+            return self.as_posting(
+                sorted(
+                    artid
+                    for artid, positions in self.index[term].items()
+                    if self.posting_mask(artid, positions) >> code & 1
+                )
+            )
         else:
-            return []
+            return self.as_posting([])
+
+    def field_code(self, field: Optional[str]) -> Optional[int]:
+        """
+        Devuelve el codigo con el que se marcan en las posiciones los terminos de un campo
+        (SAR_Index_lib.FIELD_CODES), o None si no hay que filtrar por campo: campo 'all'
+        o indice construido sin multifield.
+        """
+        if field is None or field == self.def_field or not self.multifield:
+            return None
+        return FIELD_CODES[field]
+
+    def mask_function(self):
+        """
+        Funcion con la que se calcula la mascara de campos de cada posting al guardarla,
+        None si el indice no es multifield (todas las postings son de 'all')
+        """
+        return self.posting_mask if self.multifield else None
+
+    def posting_mask(self, artid: int, positions: List[int]) -> int:
+        """
+        Mascara de los campos en los que aparecen las posiciones de un termino en un articulo
+        (se guarda con cada posting, ver SAR_Index_lib.encode_postings)
+        """
+        return field_mask(positions, self.spans.get(artid))
 
-    def get_positionals(self, terms: str, index):
+    def get_positionals(self, terms: str, field: Optional[str] = None):
         """
 
         Devuelve la posting list asociada a una secuencia de terminos consecutivos.
@@ -518,36 +1185,78 @@ class SAR_Indexer:
         return: posting list
 
         """
-        res = []
-        if terms[0] in self.index:
-            for tupla in self.index[terms[0]].items():
-                artid, listpos = tupla
-                # Para cada posicion en cada artículo compruebo si hay un termino en la pos + 1 en el mismo artículo
-                for pos in listpos:
-                    sigo = True
-                    for term in (term for term in terms[1:] if sigo):
-                        if term in self.index:
-                            if artid in self.index[term]:
-                                if (pos + 1) in self.index[term][artid]:
-                                    pos += 1
-                                else:
-                                    sigo = False
-                            else:
-                                sigo = False
-                        else:
-                            sigo = False
-                    # En caso de que sigo sea true significa que lo ha encontrado, y si no esta repetido el artid lo guarda y pasa al siguiente artid
-                    if sigo and artid not in res:
-                        res += [artid]
-                        break
-            return res
+        code = self.field_code(field)
+        candidates, postings = self.candidate_positions(terms, code)
+        if code is None:
+            res = [artid for artid in candidates if phrase_match([p[artid] for p in postings])]
         else:
-            return []
+            res = [
+                artid
+                for artid in candidates
+                if phrase_match(
+                    [field_positions(p[artid], self.spans.get(artid), code) for p in postings]
+                )
+            ]
+        return self.as_posting(res)
 
         ########################################################
         ## COMPLETAR PARA FUNCIONALIDAD EXTRA DE POSICIONALES ##
         ########################################################
 
+    def candidate_positions(self, terms: List[str], code: Optional[int]):
+        """
+
+        Articulos que contienen todos los terminos y posiciones de cada termino en ellos.
+
+        Primero se intersecan los artids (sin decodificar posiciones, con la mascara
+        de campos si "code" no es None) y solo se decodifican las posiciones de los
+        articulos candidatos.
+
+        param:  "terms": terminos de la frase o del operador NEAR
+                "code": codigo del campo (ver field_code) o None
+
+        return: posting list de candidatos y, por termino, diccionario artid --> posiciones
+
+        """
+        if isinstance(self.index, IndexReader):
+            candidates = self.solve_and(
+                [self.as_posting(self.index.docids(term, code)) for term in terms], []
+            )
+            if len(candidates) == 0:
+                return candidates, [{} for _ in terms]
+            wanted = set(candidates)
+            return candidates, [self.index.positions(term, wanted) for term in terms]
+        postings = [self.index.get(term, {}) for term in terms]
+        candidates = self.solve_and([self.as_posting(p.keys()) for p in postings], [])
+        return candidates, postings
+
+    def get_near(self, terms: List[str], k: int, field: Optional[str] = None):
+        """
+
+        Devuelve la posting list de los articulos en los que los dos terminos aparecen
+        a una distancia de "k" posiciones o menos, en cualquier orden (operador NEAR/k).
+
+        param:  "terms": los dos terminos
+                "k": distancia maxima
+                "field": campo en el que deben aparecer los dos terminos
+
+        return: posting list
+
+        """
+        code = self.field_code(field)
+        candidates, (p1, p2) = self.candidate_positions(terms, code)
+        return self.as_posting(
+            [
+                artid
+                for artid in candidates
+                if near_match(
+                    field_positions(p1[artid], self.spans.get(artid), code),
+                    field_positions(p2[artid], self.spans.get(artid), code),
+                    k,
+                )
+            ]
+        )
+
     def get_stemming(self, term: str, field: Optional[str] = None):
         """
 
@@ -561,11 +1270,23 @@ class SAR_Indexer:
 
         """
 
-        stem = self.stemmer.stem(term)
+        res = self.as_posting([])
+        for t in self.expand_stem(term):
+            res = self.or_posting(res, self.get_posting(t, field))
+        return res
 
-        ####################################################
-        ## COMPLETAR PARA FUNCIONALIDAD EXTRA DE STEMMING ##
-        ####################################################
+    def expand_stem(self, term: str) -> List[str]:
+        """
+        Devuelve los terminos del indice con el mismo stem que "term"
+        (solo "term" si el indice se construyo sin stemming)
+        """
+        stem = self.stem_cache.get(term)
+        if stem is None:
+            stem = self.stem_cache[term] = self.stemmer.stem(term)
+        if not self.sindex:
+            # indice construido sin stemming
+            return [term]
+        return self.sindex.get(stem, [])
 
     def get_permuterm(self, term: str, field: Optional[str] = None):
         """
@@ -580,10 +1301,125 @@ class SAR_Indexer:
 
         """
 
-        ##################################################
-        ## COMPLETAR PARA FUNCIONALIDAD EXTRA PERMUTERM ##
-        ##################################################
-        pass
+        return PostingList.union(
+            [self.get_posting(t, field) for t in self.expand_wildcard(term)],
+            len(self.articles),
+        )
+
+    def expand_wildcard(self, term: str) -> List[str]:
+        """
+        Devuelve los terminos del indice que encajan con un termino con comodines
+        """
+        if isinstance(self.ptindex, Permuterm):
+            return self.ptindex.search(term)
+        # indice construido sin permuterm: se recorre el vocabulario
+        regex = wildcard_regex(term)
+        return [t for t in self.index if regex.fullmatch(t)]
+
+    ###################################
+    ###                             ###
+    ###   RANKING DE RESULTADOS     ###
+    ###                             ###
+    ###################################
+
+    def ranking_terms(self, node: Node) -> List[str]:
+        """
+        Devuelve los terminos del indice con los que se puntua una consulta compilada:
+        los de los operandos no negados, expandidos por stemming y comodines.
+        """
+        if isinstance(node, Term):
+            if node.field == URL_FIELD:
+                return []
+            if has_wildcard(node.term):
+                return self.expand_wildcard(node.term)
+            if self.use_stemming:
+                return self.expand_stem(node.term)
+            return [node.term]
+        if isinstance(node, (Phrase, Near)):
+            return list(node.terms)
+        if isinstance(node, Not):
+            return []
+        return [t for child in node.children for t in self.ranking_terms(child)]
+
+    def term_scorer(self, term: str) -> TermScorer:
+        """
+        Prepara la posting list de un termino para puntuar con BM25: artids,
+        frecuencias y cota superior (frecuencia maxima y longitud minima de sus articulos).
+        """
+        if isinstance(self.index, IndexReader):
+            artids, tfs = self.index.frequencies(term)
+            maxtf, mindl = self.index.bounds(term)
+        else:
+            postings = self.index.get(term, {})
+            artids = sorted(postings)
+            tfs = [len(postings[artid]) for artid in artids]
+            maxtf = max(tfs, default=0)
+            mindl = min((self.doclens[artid] for artid in artids), default=0)
+        if self.avgdl is None:
+            self.avgdl = sum(self.doclens) / max(len(self.doclens), 1) or 1.0
+        # los articulos borrados cuentan hasta la siguiente compactacion, igual que en los df
+        idf = bm25_idf(len(artids), len(self.articles))
+        return TermScorer(artids, tfs, idf, maxtf, mindl, self.avgdl)
+
+    def solve_ranked(self, query: str, k: int, results: Optional[PostingList] = None):
+        """
+        Resuelve una consulta y devuelve sus k mejores resultados segun BM25
+
+        Los articulos se puntuan con los terminos de la consulta (ranking_terms)
+        y los k mejores se obtienen con MaxScore (SAR_Rank_lib.best_k), sin puntuar
+        todos los articulos. Si la consulta no es una union de terminos (is_term_union)
+        solo se aceptan los articulos de su resultado booleano.
+
+        param:  "query": cadena con la query
+                "k": numero de resultados a devolver
+                "results": resultado booleano de la consulta, si ya se ha calculado
+
+        return: lista de (puntuacion, artid) de mayor a menor puntuacion
+
+        """
+        try:
+            node = compile_query(normalize_query(query))
+        except QuerySyntaxError:
+            return []
+        terms = list(dict.fromkeys(self.ranking_terms(node)))
+        accept = None
+        if not self.is_term_union(node):
+            if results is None:
+                results = self.live(self.solve_node(node))
+            accept = set(results)
+        scorers = [self.term_scorer(term) for term in terms]
+        return best_k(scorers, self.doclens, self.avgdl or 1.0, k, accept)
+
+    def is_term_union(self, node: Node) -> bool:
+        """
+        True si el resultado booleano de una consulta compilada son todos los articulos
+        de sus terminos de puntuacion: una disyuncion de terminos del campo por defecto
+        y sin articulos borrados. Sus k mejores resultados salen directamente de las
+        posting lists, sin calcular el resultado booleano.
+        """
+        disjunction = isinstance(node, Term) or (
+            isinstance(node, Or) and all(isinstance(child, Term) for child in node.children)
+        )
+        return (
+            disjunction
+            and not self.deleted
+            and all(n.field in (None, self.def_field) for n in self.leaves(node))
+        )
+
+    def leaves(self, node: Node) -> List[Node]:
+        """Devuelve los terminos, frases y NEAR de una consulta compilada"""
+        if isinstance(node, (Term, Phrase, Near)):
+            return [node]
+        if isinstance(node, Not):
+            return self.leaves(node.child)
+        return [leaf for child in node.children for leaf in self.leaves(child)]
+
+    def as_posting(self, p) -> PostingList:
+        """
+        Convierte una lista ordenada de artids en una PostingList (array o mapa de bits
+        segun su densidad), si no lo es ya.
+        """
+        return PostingList.of(p, len(self.articles))
 
     def reverse_posting(self, p: list):
         """
@@ -599,7 +1435,7 @@ class SAR_Indexer:
         return: posting list con todos los artid exceptos los contenidos en p
 
         """
-        return [i for i in range(len(self.articles)) if i not in p]
+        return self.as_posting(p).complement()
 
     def and_posting(self, p1: list, p2: list):
         """
@@ -613,22 +1449,8 @@ class SAR_Indexer:
         return: posting list con los artid incluidos en p1 y p2
 
         """
-        res = []
-        i = 0
-        j = 0
-
-        # Meto lo artículos que coincidan en p1 y p2 de manera ordenada
-        while i < len(p1) and j < len(p2):
-            if p1[i] == p2[j]:
-                res.append(p1[i])
-                i += 1
-                j += 1
-            elif p1[i] <= p2[j]:
-                i += 1
-            elif p1[i] >= p2[j]:
-                j += 1
-
-        return res
+        # La interseccion depende de la representacion de cada posting list (ver SAR_Posting_lib)
+        return self.as_posting(p1) & self.as_posting(p2)
 
     def or_posting(self, p1: list, p2: list):
         """
@@ -642,30 +1464,8 @@ class SAR_Indexer:
         return: posting list con los artid incluidos de p1 o p2
 
         """
-        res = []
-        i = 0
-        j = 0
-
-        # Meto todo artículo que haya en p1 y p2 en res de manera ordenada
-        while i < len(p1) and j < len(p2):
-            if p1[i] == p2[j]:
-                res.append(p1[i])
-                i += 1
-                j += 1
-            elif p1[i] <= p2[j]:
-                res.append(p1[i])
-                i += 1
-            elif p1[i] >= p2[j]:
-                res.append(p2[j])
-                j += 1
-        # Termino de recorrer las listas en caso de que una se mas larga que la otra
-        for pos in range(i, len(p1)):
-            res.append(p1[pos])
-
-        for pos in range(j, len(p2)):
-            res.append(p2[pos])
-
-        return res
+        # La union depende de la representacion de cada posting list (ver SAR_Posting_lib)
+        return self.as_posting(p1) | self.as_posting(p2)
 
     def minus_posting(self, p1, p2):
         """
@@ -680,11 +1480,8 @@ class SAR_Indexer:
         return: posting list con los artid incluidos de p1 y no en p2
 
         """
-
-        pass
-        ########################################################
-        ## COMPLETAR PARA TODAS LAS VERSIONES SI ES NECESARIO ##
-        ########################################################
+        # La diferencia depende de la representacion de cada posting list (ver SAR_Posting_lib)
+        return self.as_posting(p1) - self.as_posting(p2)
 
     #####################################
     ###                               ###
@@ -692,27 +1489,53 @@ class SAR_Indexer:
     ###                               ###
     #####################################
 
-    def solve_and_count(self, ql: List[str], verbose: bool = True) -> List:
+    def count_queries(self, ql: List[str], jobs: int = 1) -> List[Optional[int]]:
+        """
+        Calcula el numero de resultados de cada query de una lista
+
+        Con "jobs" > 1 las queries se reparten en bloques entre varios procesos;
+        cada uno abre el indice guardado proyectado en memoria (mmap, de solo
+        lectura), asi las paginas del fichero se comparten entre procesos. Los
+        resultados se devuelven en el orden de la lista. Un indice que no se ha
+        cargado de un fichero se resuelve en un solo proceso (con un aviso en stderr).
+
+        param:  "ql": lista de queries, las lineas vacias o que empiezan por # no se resuelven
+                "jobs": numero de procesos
+
+        return: numero de resultados de cada query, None para las lineas que no se resuelven
+
+        """
+        queries = [query if len(query) > 0 and query[0] != "#" else None for query in ql]
+        if jobs > 1 and len(queries) > 1:
+            if isinstance(self.index, IndexReader):
+                chunksize = max(1, len(queries) // (jobs * QUERY_CHUNKS))
+                with Pool(jobs, init_searcher, (self.index.filename, self.use_stemming)) as pool:
+                    return pool.map(count_query, queries, chunksize)
+            # los procesos abren el indice desde su fichero
+            print(f"WARNING: {jobs} jobs ignored, the index is not loaded from a file", file=sys.stderr)
+        return [count_query(query, self) for query in queries]
+
+    def solve_and_count(self, ql: List[str], verbose: bool = True, jobs: int = 1) -> List:
         results = []
-        for query in ql:
-            if len(query) > 0 and query[0] != "#":
-                r = self.solve_query(query)
-                results.append(len(r))
+        for query, count in zip(ql, self.count_queries(ql, jobs)):
+            if count is not None:
+                results.append(count)
                 if verbose:
-                    print(f"{query}\t{len(r)}")
+                    print(f"{query}\t{count}")
             else:
                 results.append(0)
                 if verbose:
                     print(query)
         return results
 
-    def solve_and_test(self, ql: List[str]) -> bool:
+    def solve_and_test(self, ql: List[str], jobs: int = 1) -> bool:
         errors = False
-        for line in ql:
-            if len(line) > 0 and line[0] != "#":
-                query, ref = line.split("\t")
+        lines = [line.split("\t") if len(line) > 0 and line[0] != "#" else None for line in ql]
+        counts = self.count_queries([line[0] if line else "" for line in lines], jobs)
+        for line, parts, result in zip(ql, lines, counts):
+            if parts is not None:
+                query, ref = parts
                 reference = int(ref)
-                result = len(self.solve_query(query))
                 if reference == result:
                     print(f"{query}\t{result}")
                 else:
@@ -730,28 +1553,125 @@ class SAR_Indexer:
 
         param:  "query": query que se debe resolver.
 
-        return: el numero de artículo recuperadas, para la opcion -T
+        return: el numero de artículo recuperadas, para la opcion -T (con ranking de una
+                union de terminos, el de los mostrados: no se calcula el resultado booleano)
 
         """
-        results = self.solve_query(query)
+        union = False
+        if self.use_ranking and not self.show_all:
+            try:
+                union = self.is_term_union(compile_query(normalize_query(query)))
+            except QuerySyntaxError:
+                # el error lo muestra solve_query
+                pass
+        if union:
+            # los SHOW_MAX mejores salen de las posting lists; si hay menos, son todos
+            ranked = self.solve_ranked(query, self.SHOW_MAX)
+            results = [artid for _, artid in ranked]
+            stop = len(ranked)
+        else:
+            results = self.solve_query(query)
+            stop = (
+                len(results)
+                if self.show_all
+                else min(len(results), self.SHOW_MAX)
+            )
+            if self.use_ranking:
+                ranked = self.solve_ranked(query, stop, results)
+                if len(ranked) < stop:
+                    # articulos sin ningun termino con el que puntuar (p.e. NOT a)
+                    seen = {artid for _, artid in ranked}
+                    rest = (artid for artid in results if artid not in seen)
+                    ranked += [(0.0, artid) for artid in islice(rest, stop - len(ranked))]
+            else:
+                ranked = [(None, artid) for artid in results[:stop]]
         i = 0
-        stop = (
-            len(results)
-            if self.show_all
-            else (10 if len(results) > 10 else len(results))
-        )
         while i < stop:
-            articleFile = self.docs[self.articles[results[i]][0]]
-            fp = open(articleFile)
-            for j, line in enumerate(fp):
-                if j == self.articles[results[i]][1]:
-                    url = json.loads(line)["url"]
-                    title = json.loads(line)["title"]
-            print(f"{i+1}. ID Articulo - {results[i]} URL: {url}")
-            print(f"Titulo: {title}")
+            score, artid = ranked[i]
+            article = self.get_article(artid)
+            if score is None:
+                print(f"{i+1}. ID Articulo - {artid} URL: {article['url']}")
+            else:
+                print(f"{i+1}. ({score:.4f}) ID Articulo - {artid} URL: {article['url']}")
+            print(f"Titulo: {article['title']}")
             if self.show_snippet:
                 print("Snippet:")
-                print(json.loads(line)["summary"])
+                print(article["summary"])
             i += 1
 
         return len(results)
+
+    def get_article(self, artid: int) -> Dict:
+        """
+        Recupera los campos a mostrar de un articulo
+
+        Se leen del almacen de documentos si existe, si no, del fichero del
+        crawler accediendo directamente a su posicion (seek).
+
+        Args:
+            artid (int): identificador del articulo
+
+        Returns:
+            Dict: claves: 'url', 'title', 'summary'
+        """
+        docid, offset, length, store_offset, store_length = self.articles[artid]
+        if isinstance(self.store, DocStoreReader):
+            return self.store.get(store_offset, store_length)
+        with open(self.docs[docid], "rb") as fh:
+            fh.seek(offset)
+            return json.loads(fh.read(length))
+
+
+def index_partial(task) -> SAR_Indexer:
+    """
+    Indexa un fichero en un SAR_Indexer nuevo, para ejecutarse en un proceso del pool de index_dir
+
+    Args:
+        task: tupla (nombre del fichero, argumentos de index_dir)
+
+    Returns:
+        SAR_Indexer: indice parcial con artids y docids locales
+    """
+    filename, options = task
+    partial = SAR_Indexer()
+    partial.multifield = options["multifield"]
+    partial.positional = options["positional"]
+    partial.stemming = options["stem"]
+    partial.permuterm = options["permuterm"]
+    partial.compress_store = options["compress_store"]
+    partial.set_json_backend(options["json_backend"])
+    partial.index_file(filename)
+    return partial
+
+
+# indice de cada proceso del pool de count_queries
+_searcher = None
+
+
+def init_searcher(filename: str, stemming: bool):
+    """
+    Abre el indice en un proceso del pool de count_queries (mmap de solo lectura)
+    """
+    global _searcher
+    _searcher = SAR_Indexer()
+    _searcher.load_info(filename, lazy=True)
+    _searcher.set_stemming(stemming)
+
+
+def count_query(query: Optional[str], searcher: Optional[SAR_Indexer] = None) -> Optional[int]:
+    """
+    Numero de resultados de una query, None si no hay query (linea vacia o comentario)
+    """
+    if query is None:
+        return None
+    if searcher is None:
+        searcher = _searcher
+    return len(searcher.solve_query(query))
+
+
+def stem_terms(terms: List[str]) -> List[str]:
+    """
+    Calcula los stems de un bloque de terminos, para ejecutarse en un proceso del pool de make_stemming
+    """
+    stemmer = SnowballStemmer("spanish")
+    return [stemmer.stem(term) for term in terms]
@@ -0,0 +1,74 @@
+#! -*- encoding: utf8 -*-
+"""
+Benchmark de la interseccion de posting lists (and_posting) para distintas
+proporciones entre la longitud de la lista corta y la larga.
+
+Compara el recorrido lineal con dos punteros (el and_posting original), la
+interseccion con conjuntos y la busqueda exponencial (galloping) que usa
+PostingList cuando las longitudes son muy distintas.
+
+Uso: python benchmarks/bench_and_posting.py [--long N] [--repeat R]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from SAR_Posting_lib import gallop_intersect  # noqa: E402
+
+
+def linear_intersect(p1, p2):
+    """and_posting original: recorrido lineal con dos punteros"""
+    res = []
+    i = j = 0
+    while i < len(p1) and j < len(p2):
+        if p1[i] == p2[j]:
+            res.append(p1[i])
+            i += 1
+            j += 1
+        elif p1[i] < p2[j]:
+            i += 1
+        else:
+            j += 1
+    return res
+
+
+def set_intersect(p1, p2):
+    return sorted(set(p1).intersection(p2))
+
+
+def best_time(fnc, repeat, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fnc(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de and_posting.")
+    parser.add_argument("--long", type=int, default=200000, help="longitud de la lista larga.")
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones de cada medida.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    universe = args.long * 40
+    long = array("I", sorted(random.sample(range(universe), args.long)))
+
+    print(f"{'ratio':>8} {'|short|':>8} {'linear':>10} {'set':>10} {'gallop':>10}")
+    for ratio in (1, 4, 16, 64, 256, 1024, 4096):
+        size = max(1, args.long // ratio)
+        short = array("I", sorted(random.sample(range(universe), size)))
+        assert gallop_intersect(short, long).tolist() == set_intersect(short, long)
+        times = [
+            best_time(fnc, args.repeat, short, long)
+            for fnc in (linear_intersect, set_intersect, gallop_intersect)
+        ]
+        print(f"{ratio:>8} {size:>8} " + " ".join(f"{t * 1000:>8.2f}ms" for t in times))
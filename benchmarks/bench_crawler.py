@@ -0,0 +1,152 @@
+#! -*- encoding: utf8 -*-
+"""
+Benchmark de la captura concurrente del crawler.
+
+Levanta un servidor HTTP local (espejo) que sirve paginas sinteticas con el
+formato de los articulos de la Wikipedia, con una latencia fija por peticion,
+y captura el sitio con distinto numero de peticiones simultaneas (--workers).
+Comprueba que todas las capturas devuelven los mismos documentos, que los
+documentos salen en orden de profundidad, que se respeta el limite de
+documentos y cuenta las conexiones abiertas (se reutilizan con keep-alive).
+
+Uso: python benchmarks/bench_crawler.py [--pages N] [--latency MS] [--workers W ...]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from SAR_Crawler_lib import SAR_Wiki_Crawler  # noqa: E402
+
+WIKI = "https://es.wikipedia.org"
+WORDS = "historia origen ciudad valencia rio musica arte guerra siglo lengua ciencia reino".split()
+
+
+def page_url(i: int) -> str:
+    return f"{WIKI}/wiki/Pagina_{i}"
+
+
+def make_site(pages: int, links: int, seed: int):
+    """Grafo de enlaces y html de cada pagina: {ruta: bytes}, {pagina: [enlaces]}"""
+    rnd = random.Random(seed)
+    graph = {i: sorted(rnd.sample(range(pages), links)) for i in range(pages)}
+    site = {}
+    for i, out in graph.items():
+        def para():
+            return " ".join(rnd.choice(WORDS) for _ in range(30))
+
+        anchors = " ".join(f'<a href="/wiki/Pagina_{j}">Pagina {j}</a>' for j in out)
+        html = (
+            f'<html><body><h1 class="firstHeading">Pagina {i}</h1>'
+            '<div id="bodyContent"><div id="mw-content-text">'
+            f"<p>{para()}</p><p>{anchors}</p>"
+            f"<h2>Historia</h2><p>{para()}</p>"
+            f"<h3>Origen</h3><p>{para()}</p>"
+            f"<h2>Cultura</h2><p>{para()}</p>"
+            "</div></div></body></html>"
+        )
+        site[f"/wiki/Pagina_{i}"] = html.encode("utf-8")
+    return site, graph
+
+
+def bfs_depths(graph, start: int):
+    depths = {start: 0}
+    queue = deque([start])
+    while queue:
+        i = queue.popleft()
+        for j in graph[i]:
+            if j not in depths:
+                depths[j] = depths[i] + 1
+                queue.append(j)
+    return {page_url(i): d for i, d in depths.items()}
+
+
+def start_server(site, latency: float):
+    connections = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            connections.add(self.client_address)
+            time.sleep(latency)
+            body = site.get(self.path)
+            self.send_response(200 if body is not None else 404)
+            body = body or b""
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, connections
+
+
+def crawl(mirror, workers, limit, depth, filename):
+    """Captura desde Pagina_0: (segundos, urls capturadas en orden)"""
+    crawler = SAR_Wiki_Crawler(workers=workers, mirror=mirror)
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        crawler.wikipedia_crawling_from_url(page_url(0), limit, filename, None, depth)
+    elapsed = time.perf_counter() - t0
+    crawler.session.close()
+    with open(filename, encoding="utf-8") as fh:
+        return elapsed, [json.loads(line)["url"] for line in fh]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la captura concurrente.")
+    parser.add_argument("--pages", type=int, default=200, help="paginas del sitio sintetico.")
+    parser.add_argument("--links", type=int, default=4, help="enlaces de cada pagina.")
+    parser.add_argument("--latency", type=float, default=20, help="latencia de cada peticion (ms).")
+    parser.add_argument("--depth", type=int, default=10, help="profundidad maxima de captura.")
+    parser.add_argument("--limit", type=int, default=None, help="limite de documentos (todo el sitio por defecto).")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    site, graph = make_site(args.pages, args.links, args.seed)
+    depths = bfs_depths(graph, 0)
+    server, connections = start_server(site, args.latency / 1000)
+    mirror = f"http://127.0.0.1:{server.server_address[1]}"
+    limit = args.limit or args.pages
+
+    print(f"{args.pages} pages, {len(depths)} reachable, latency {args.latency:.0f}ms, limit {limit}")
+    print(f"{'workers':>8} {'docs':>6} {'time':>10} {'docs/s':>8} {'conns':>6}")
+    reference = None
+    with tempfile.TemporaryDirectory(prefix="sarbench") as workdir:
+        for workers in args.workers:
+            connections.clear()
+            filename = os.path.join(workdir, f"crawl_{workers}.json")
+            elapsed, urls = crawl(mirror, workers, limit, args.depth, filename)
+            # sin repetidos, sin pasar del limite y en orden de profundidad
+            assert len(urls) == len(set(urls)) and len(urls) <= limit
+            assert all(depths[a] <= depths[b] for a, b in zip(urls, urls[1:]))
+            if reference is None:
+                reference = urls
+            if limit >= len(depths):
+                assert set(urls) == set(reference)
+            else:
+                assert len(urls) == len(reference)
+            print(
+                f"{workers:>8} {len(urls):>6} {elapsed * 1000:>8.0f}ms"
+                f" {len(urls) / elapsed:>8.1f} {len(connections):>6}"
+            )
+    server.shutdown()
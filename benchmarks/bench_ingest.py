@@ -0,0 +1,100 @@
+#! -*- encoding: utf8 -*-
+"""
+Benchmark de la lectura de los ficheros del crawler al indexar.
+
+Compara la lectura original (iterar las lineas del fichero y decodificar
+cada una con json.loads) con SAR_Ingest_lib.read_lines (buffer grande) y
+cada backend de JSON instalado. Mide tambien la lectura de articulos ya
+indexados (urls conocidas): decodificandolos para comprobar la url o
+descartandolos con peek_url sin decodificarlos.
+
+Uso: python benchmarks/bench_ingest.py [--corpus DIR | --articles N] [--repeat R]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_suite import corpus_files  # noqa: E402
+from gen_corpus import CorpusGenerator  # noqa: E402
+from SAR_Ingest_lib import available_backends, peek_url, read_lines  # noqa: E402
+
+
+def line_iteration(filenames, loads, known):
+    """Lectura original: for line in fh + json.loads"""
+    n = 0
+    for filename in filenames:
+        with open(filename, "rb") as fh:
+            for line in fh:
+                if loads(line)["url"] not in known:
+                    n += 1
+    return n
+
+
+def buffered(filenames, loads, known):
+    n = 0
+    for filename in filenames:
+        for _, _, line in read_lines(filename):
+            if loads(line)["url"] not in known:
+                n += 1
+    return n
+
+
+def buffered_peek(filenames, loads, known):
+    n = 0
+    for filename in filenames:
+        for _, _, line in read_lines(filename):
+            url = peek_url(line)
+            if url is not None and url in known:
+                continue
+            loads(line)
+            n += 1
+    return n
+
+
+def best_time(fnc, repeat, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fnc(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la lectura de articulos.")
+    parser.add_argument("--corpus", type=str, default=None, help="directorio con un corpus del crawler.")
+    parser.add_argument("--articles", type=int, default=5000, help="articulos del corpus sintetico.")
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones de cada medida.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="sarbench") as workdir:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = os.path.join(workdir, "corpus")
+            CorpusGenerator(seed=args.seed).write(corpus, args.articles, 4)
+        filenames = corpus_files(corpus)
+        mb = sum(os.path.getsize(f) for f in filenames) / 2**20
+        urls = {json.loads(line)["url"] for f in filenames for line in open(f, "rb")}
+
+        print(f"{mb:.1f}MB, {len(urls)} articles")
+        print(f"{'reader':>14} {'backend':>8} {'new':>10} {'MB/s':>8} {'indexed':>10} {'MB/s':>8}")
+        rows = [("lines", line_iteration, "json")]
+        rows += [("buffered", buffered, backend) for backend in available_backends()]
+        rows += [("buffered+peek", buffered_peek, backend) for backend in available_backends()]
+        for name, fnc, backend in rows:
+            loads = available_backends()[backend]
+            # todos los articulos son nuevos / todos estan ya indexados
+            t_new, n = best_time(fnc, args.repeat, filenames, loads, set())
+            t_old, m = best_time(fnc, args.repeat, filenames, loads, urls)
+            assert n == len(urls) and m == 0
+            print(
+                f"{name:>14} {backend:>8} {t_new * 1000:>8.0f}ms {mb / t_new:>8.1f}"
+                f" {t_old * 1000:>8.0f}ms {mb / t_old:>8.1f}"
+            )
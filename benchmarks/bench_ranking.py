@@ -0,0 +1,80 @@
+#! -*- encoding: utf8 -*-
+"""
+Benchmark de la consulta ordenada (BM25) top-k sobre consultas OR amplias.
+
+Genera posting lists sinteticas con frecuencias de documento de tipo Zipf
+y compara MaxScore (SAR_Rank_lib.top_k) con la puntuacion exhaustiva de
+todos los articulos (score_all), comprobando que los k primeros coinciden,
+y con best_k, que elige entre ambos (con pocos articulos, p.e. --articles 3000,
+MaxScore no compensa).
+
+Uso: python benchmarks/bench_ranking.py [--articles N] [--terms T] [--k K]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from SAR_Rank_lib import TermScorer, best_k, bm25_idf, score_all, top_k  # noqa: E402
+
+
+def make_term(rank: int, articles: int, doclens: array, avgdl: float) -> TermScorer:
+    """Posting list sintetica del termino "rank" (df ~ articles / rank)"""
+    df = max(1, articles // (rank + 1))
+    artids = array("I", sorted(random.sample(range(articles), df)))
+    tfs = [1 + int(random.expovariate(0.7)) for _ in artids]
+    return TermScorer(
+        artids,
+        tfs,
+        bm25_idf(df, articles),
+        max(tfs),
+        min(doclens[a] for a in artids),
+        avgdl,
+    )
+
+
+def best_time(fnc, repeat, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fnc(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, res
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la consulta ordenada top-k.")
+    parser.add_argument("--articles", type=int, default=200000, help="numero de articulos.")
+    parser.add_argument("--terms", type=int, default=2000, help="vocabulario sintetico.")
+    parser.add_argument("--k", type=int, default=10, help="numero de resultados.")
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones de cada medida.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    doclens = array("I", (random.randint(50, 3000) for _ in range(args.articles)))
+    avgdl = sum(doclens) / len(doclens)
+
+    print(
+        f"{'terms':>6} {'postings':>10} {'exhaustive':>12} {'maxscore':>12} {'speedup':>8}"
+        f" {'best_k':>12}"
+    )
+    for nterms in (2, 4, 8, 16):
+        # una consulta OR con terminos frecuentes y poco frecuentes
+        ranks = random.sample(range(1, args.terms), nterms - 1) + [0]
+        terms = [make_term(rank, args.articles, doclens, avgdl) for rank in ranks]
+        t_all, ref = best_time(score_all, args.repeat, terms, doclens, avgdl)
+        t_top, res = best_time(top_k, args.repeat, terms, doclens, avgdl, args.k)
+        t_best, best = best_time(best_k, args.repeat, terms, doclens, avgdl, args.k)
+        assert [artid for _, artid in res] == [artid for _, artid in ref[: args.k]]
+        assert [artid for _, artid in best] == [artid for _, artid in ref[: args.k]]
+        postings = sum(map(len, terms))
+        print(
+            f"{nterms:>6} {postings:>10} {t_all * 1000:>10.1f}ms {t_top * 1000:>10.1f}ms"
+            f" {t_all / t_top:>7.1f}x {t_best * 1000:>10.1f}ms"
+        )
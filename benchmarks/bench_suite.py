@@ -0,0 +1,229 @@
+#! -*- encoding: utf8 -*-
+"""
+Benchmark completo del indexador y del buscador a traves de SAR_Indexer.
+
+Genera (o usa) un corpus con el formato del crawler, lo indexa, guarda y
+carga el indice, y mide la latencia de las consultas de cada tipo (termino,
+AND, OR, NOT y frase). Los terminos de las consultas se toman de posiciones
+al azar del propio corpus, asi su frecuencia sigue la del corpus y todas
+las frases tienen algun resultado. El resultado se escribe en JSON para
+poder comparar ejecuciones.
+
+Uso: python benchmarks/bench_suite.py [--corpus DIR | --articles N] [-M] [-O] [--output FICHERO]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gen_corpus import CorpusGenerator  # noqa: E402
+from SAR_lib import SAR_Indexer  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # no disponible en Windows
+    resource = None
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Memoria residente maxima (MB) del proceso y de sus hijos (workers de indexacion)"""
+    if resource is None:
+        return {}
+    # ru_maxrss esta en KB en Linux y en bytes en macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 2**20,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 2**20,
+    }
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Percentil "p" (0-100) de una lista ordenada, por el rango mas cercano"""
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def corpus_files(root: str) -> List[str]:
+    return sorted(
+        os.path.join(d, f) for d, _, files in os.walk(root) for f in files if f.endswith(".json")
+    )
+
+
+def sample_queries(
+    indexer: SAR_Indexer, filenames: List[str], n: int, positional: bool, rnd: random.Random
+) -> Dict[str, List[str]]:
+    """
+    Consultas de cada tipo con terminos tomados de posiciones al azar del corpus
+    """
+    texts = []
+    for filename in filenames:
+        with open(filename, encoding="utf-8") as fh:
+            for line in fh:
+                texts.append(indexer.tokenize(indexer.parse_article(line)["all"]))
+    texts = [tokens for tokens in texts if len(tokens) > 1]
+
+    def term():
+        return rnd.choice(rnd.choice(texts))
+
+    def phrase():
+        tokens = rnd.choice(texts)
+        i = rnd.randrange(len(tokens) - 1)
+        return '"%s %s"' % (tokens[i], tokens[i + 1])
+
+    queries = {
+        "term": [term() for _ in range(n)],
+        "and": ["%s AND %s" % (term(), term()) for _ in range(n)],
+        "or": ["%s OR %s" % (term(), term()) for _ in range(n)],
+        "not": ["%s AND NOT %s" % (term(), term()) for _ in range(n)],
+    }
+    if positional:
+        queries["phrase"] = [phrase() for _ in range(n)]
+    return queries
+
+
+def query_latencies(searcher: SAR_Indexer, queries: List[str]) -> Dict[str, float]:
+    times = []
+    results = 0
+    for query in queries:
+        t0 = time.perf_counter()
+        results += len(searcher.solve_query(query))
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return {
+        "queries": len(times),
+        "mean_results": results / len(times),
+        "mean_ms": 1000 * sum(times) / len(times),
+        "p50_ms": 1000 * percentile(times, 50),
+        "p90_ms": 1000 * percentile(times, 90),
+        "p99_ms": 1000 * percentile(times, 99),
+        "max_ms": 1000 * times[-1],
+        "queries_per_s": len(times) / sum(times),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args, workdir: str) -> Dict:
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": vars(args),
+    }
+
+    corpus = args.corpus
+    if corpus is None:
+        corpus = os.path.join(workdir, "corpus")
+        t0 = time.perf_counter()
+        CorpusGenerator(args.vocab, args.zipf, args.seed).write(corpus, args.articles, args.files)
+        report["generation_s"] = time.perf_counter() - t0
+    filenames = corpus_files(corpus)
+    corpus_bytes = sum(os.path.getsize(f) for f in filenames)
+    report["corpus"] = {"files": len(filenames), "mb": corpus_bytes / 2**20}
+
+    # indexacion
+    indexfile = os.path.join(workdir, "bench.idx")
+    indexer = SAR_Indexer()
+    t0 = time.perf_counter()
+    indexer.index_dir(
+        corpus,
+        multifield=args.multifield,
+        positional=args.positional,
+        stem=args.stem,
+        permuterm=args.permuterm,
+        workers=args.workers,
+        memory_budget=args.memory_budget,
+        compress_store=args.compress_store,
+    )
+    t1 = time.perf_counter()
+    indexer.save_info(indexfile)
+    t2 = time.perf_counter()
+    narticles = len(indexer.articles)
+    report["corpus"]["articles"] = narticles
+    report["indexing"] = {
+        "index_s": t1 - t0,
+        "save_s": t2 - t1,
+        "articles_per_s": narticles / (t1 - t0),
+        "mb_per_s": corpus_bytes / 2**20 / (t1 - t0),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    del indexer
+
+    sizes = {"index_mb": os.path.getsize(indexfile) / 2**20}
+    if os.path.exists(indexfile + ".store"):
+        sizes["store_mb"] = os.path.getsize(indexfile + ".store") / 2**20
+    report["index"] = sizes
+
+    # carga
+    load = {}
+    for lazy in (False, True):
+        t0 = time.perf_counter()
+        searcher = SAR_Indexer()
+        searcher.load_info(indexfile, lazy=lazy)
+        load["mmap_s" if lazy else "read_s"] = time.perf_counter() - t0
+    report["index"]["terms"] = len(searcher.index)
+    report["load"] = load
+
+    # consultas, sobre el indice proyectado en memoria
+    searcher.set_stemming(args.stem)
+    queries = sample_queries(searcher, filenames, args.queries, args.positional, random.Random(args.seed))
+    for qlist in queries.values():
+        # calentamiento: la primera lectura de cada pagina del fichero no se mide
+        for query in qlist[: len(qlist) // 10]:
+            searcher.solve_query(query)
+    report["queries"] = {op: query_latencies(searcher, qlist) for op, qlist in queries.items()}
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de indexacion y consultas.")
+    parser.add_argument("--corpus", type=str, default=None,
+                        help="directorio con un corpus del crawler; si no se da, se genera uno sintetico.")
+    parser.add_argument("--articles", type=int, default=5000, help="articulos del corpus sintetico.")
+    parser.add_argument("--files", type=int, default=4, help="ficheros del corpus sintetico.")
+    parser.add_argument("--vocab", type=int, default=50000, help="vocabulario del corpus sintetico.")
+    parser.add_argument("--zipf", type=float, default=1.0, help="exponente de Zipf del corpus sintetico.")
+    parser.add_argument("--queries", type=int, default=500, help="consultas de cada tipo.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-M", "--multifield", action="store_true", default=False)
+    parser.add_argument("-O", "--positional", action="store_true", default=False)
+    parser.add_argument("-S", "--stem", action="store_true", default=False)
+    parser.add_argument("-P", "--permuterm", action="store_true", default=False)
+    parser.add_argument("-W", "--workers", type=int, default=1)
+    parser.add_argument("-B", "--memory-budget", dest="memory_budget", type=int, default=None)
+    parser.add_argument("-Z", "--compress-store", dest="compress_store", action="store_true", default=False)
+    parser.add_argument("--output", type=str, default=None,
+                        help="fichero JSON de resultados; si no se da, se escribe en la salida estandar.")
+    args = parser.parse_args()
+
+    # los mensajes del indexador van a stderr, para no mezclarlos con el JSON
+    with tempfile.TemporaryDirectory(prefix="sarbench") as workdir, contextlib.redirect_stdout(sys.stderr):
+        report = run(args, workdir)
+
+    data = json.dumps(report, indent=2)
+    if args.output is None:
+        print(data)
+    else:
+        with open(args.output, "w") as fh:
+            print(data, file=fh)
@@ -0,0 +1,86 @@
+#! -*- encoding: utf8 -*-
+"""
+Benchmark de la tokenizacion de los articulos al indexar.
+
+Compara el camino anterior (parse_article construye 'all' concatenando los
+campos y tokenize lo pasa a minusculas, sustituye los simbolos y lo divide)
+con parse_article(full=False) + stream_tokens, que recorre los tokens de
+cada campo sin construir el texto completo. Mide el tiempo y, con
+tracemalloc, la memoria maxima reservada al procesar un articulo (las
+copias intermedias del texto). Comprueba que los tokens coinciden.
+
+Uso: python benchmarks/bench_tokenize.py [--corpus DIR | --articles N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gen_corpus import CorpusGenerator  # noqa: E402
+from bench_suite import corpus_files  # noqa: E402
+from SAR_lib import SAR_Indexer  # noqa: E402
+
+
+def concat_tokens(indexer, line):
+    return indexer.tokenize(indexer.parse_article(line)["all"])
+
+
+def stream_tokens(indexer, line):
+    return [tokens for _, _, tokens in indexer.stream_tokens(indexer.parse_article(line, full=False)["parts"])]
+
+
+def timed(fnc, indexer, lines, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for line in lines:
+            fnc(indexer, line)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def peak_memory(fnc, indexer, lines):
+    """Media de la memoria maxima reservada (bytes) al procesar cada articulo"""
+    total = 0
+    tracemalloc.start()
+    for line in lines:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fnc(indexer, line)
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return total / len(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la tokenizacion de articulos.")
+    parser.add_argument("--corpus", type=str, default=None, help="directorio con un corpus del crawler.")
+    parser.add_argument("--articles", type=int, default=2000, help="articulos del corpus sintetico.")
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones de cada medida.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="sarbench") as workdir:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = os.path.join(workdir, "corpus")
+            CorpusGenerator(seed=args.seed).write(corpus, args.articles, 1)
+        lines = []
+        for filename in corpus_files(corpus):
+            with open(filename, "rb") as fh:
+                lines.extend(fh)
+
+    indexer = SAR_Indexer()
+    for line in lines:
+        assert concat_tokens(indexer, line) == [token for part in stream_tokens(indexer, line) for token in part]
+
+    print(f"{'':>8} {'time':>10} {'peak/article':>14}")
+    for name, fnc in (("concat", concat_tokens), ("stream", stream_tokens)):
+        t = timed(fnc, indexer, lines, args.repeat)
+        mem = peak_memory(fnc, indexer, lines)
+        print(f"{name:>8} {t * 1000:>8.1f}ms {mem / 1024:>12.1f}KB")
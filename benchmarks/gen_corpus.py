@@ -0,0 +1,126 @@
+#! -*- encoding: utf8 -*-
+"""
+Generador de corpus sinteticos con el formato del crawler (SAR_Crawler_lib).
+
+Cada linea es un articulo en JSON con 'url', 'title', 'summary' y
+'sections' (con 'name', 'text' y 'subsections'). El vocabulario se forma
+combinando silabas del castellano y las palabras se eligen con una
+distribucion de Zipf, con las palabras funcionales mas frecuentes al
+principio del ranking. Con la misma semilla se genera el mismo corpus.
+
+Uso: python benchmarks/gen_corpus.py dir [--articles N] [--files F] [--vocab V] [--seed S]
+"""
+
+import argparse
+import json
+import os
+import random
+from itertools import accumulate
+from typing import Dict, List
+
+# palabras mas frecuentes del castellano, ocupan las primeras posiciones del ranking
+STOPWORDS = [
+    "de", "la", "que", "el", "en", "y", "a", "los", "del", "se", "las", "por",
+    "un", "para", "con", "no", "una", "su", "al", "es", "lo", "como", "más",
+    "pero", "sus", "le", "ya", "o", "fue", "este", "ha", "sí", "porque", "esta",
+]
+ONSETS = ["", "b", "c", "d", "f", "g", "l", "m", "n", "p", "r", "s", "t", "v",
+          "ch", "ll", "br", "cr", "pl", "tr", "qu", "ñ", "z", "j"]
+NUCLEI = ["a", "e", "i", "o", "u", "ia", "ie", "ue", "á", "é", "í", "ó"]
+CODAS = ["", "", "", "n", "s", "r", "l", "d", "z"]
+
+
+def make_vocabulary(size: int, rnd: random.Random) -> List[str]:
+    """Vocabulario de "size" palabras distintas con silabas del castellano"""
+    words = list(STOPWORDS[:size])
+    seen = set(words)
+    while len(words) < size:
+        nsyl = rnd.choice((1, 2, 2, 3, 3, 3, 4, 5))
+        word = "".join(
+            rnd.choice(ONSETS) + rnd.choice(NUCLEI) + rnd.choice(CODAS) for _ in range(nsyl)
+        )
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+class CorpusGenerator:
+    """
+    Genera articulos sinteticos con el esquema del crawler.
+    """
+
+    def __init__(self, vocab: int = 50000, zipf: float = 1.0, seed: int = 0):
+        self.rnd = random.Random(seed)
+        self.words = make_vocabulary(vocab, self.rnd)
+        # pesos acumulados de Zipf: la palabra de rango r tiene peso 1 / r^zipf
+        self.cum_weights = list(accumulate(1.0 / (r + 1) ** zipf for r in range(vocab)))
+
+    def text(self, n: int) -> str:
+        """Texto de "n" palabras, con frases de entre 5 y 25 palabras"""
+        words = self.rnd.choices(self.words, cum_weights=self.cum_weights, k=n)
+        sentences = []
+        i = 0
+        while i < len(words):
+            j = i + self.rnd.randint(5, 25)
+            sentences.append(" ".join(words[i:j]).capitalize() + ".")
+            i = j
+        return " ".join(sentences)
+
+    def article(self, artid: int) -> Dict:
+        rnd = self.rnd
+        title = self.text(rnd.randint(1, 5)).rstrip(".")
+        sections = []
+        for _ in range(rnd.randint(0, 6)):
+            sections.append(
+                {
+                    "name": self.text(rnd.randint(1, 4)).rstrip("."),
+                    "text": self.text(int(rnd.expovariate(1 / 150)) + 10),
+                    "subsections": [
+                        {
+                            "name": self.text(rnd.randint(1, 4)).rstrip("."),
+                            "text": self.text(int(rnd.expovariate(1 / 80)) + 5),
+                        }
+                        for _ in range(rnd.choice((0, 0, 0, 1, 2, 3)))
+                    ],
+                }
+            )
+        return {
+            "url": "https://es.wikipedia.org/wiki/%s_%d" % (title.replace(" ", "_"), artid),
+            "title": title,
+            "summary": self.text(int(rnd.expovariate(1 / 60)) + 10),
+            "sections": sections,
+        }
+
+    def write(self, dirname: str, articles: int, files: int = 1) -> List[str]:
+        """
+        Escribe "articles" articulos repartidos en "files" ficheros .json
+
+        Returns:
+            List[str]: nombres de los ficheros generados
+        """
+        os.makedirs(dirname, exist_ok=True)
+        filenames = []
+        per_file = -(-articles // files)
+        for f in range(files):
+            filename = os.path.join(dirname, "synthetic_%d_%d.json" % (f + 1, files))
+            with open(filename, "w", encoding="utf-8", newline="\n") as ofile:
+                for artid in range(f * per_file, min(articles, (f + 1) * per_file)):
+                    print(json.dumps(self.article(artid), ensure_ascii=True), file=ofile)
+            filenames.append(filename)
+        return filenames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un corpus sintetico con el formato del crawler.")
+    parser.add_argument("dir", type=str, help="directorio de salida.")
+    parser.add_argument("--articles", type=int, default=10000, help="numero de articulos.")
+    parser.add_argument("--files", type=int, default=4, help="numero de ficheros.")
+    parser.add_argument("--vocab", type=int, default=50000, help="tamaño del vocabulario.")
+    parser.add_argument("--zipf", type=float, default=1.0, help="exponente de la distribucion de Zipf.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(args.vocab, args.zipf, args.seed)
+    for filename in generator.write(args.dir, args.articles, args.files):
+        print(filename)
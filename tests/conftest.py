@@ -0,0 +1,71 @@
+#! -*- encoding: utf8 -*-
+"""
+Utilidades comunes de las pruebas: corpus pequeños con el formato del
+crawler y construcción de índices sobre ellos.
+"""
+
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+
+# los modulos del proyecto estan en la raiz del repositorio
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from SAR_lib import SAR_Indexer  # noqa: E402
+
+WORDS = (
+    "de la el en y que los casa perro gato ciudad río rey reina madrid valencia "
+    "historia guerra música arte siglo iglesia castillo puerto mar libro"
+).split() + [f"w{i}" for i in range(60)]
+# pesos de tipo Zipf: las primeras palabras son las más frecuentes
+WEIGHTS = [1 / (r + 1) for r in range(len(WORDS))]
+
+
+def make_articles(n: int, seed: int = 0, start: int = 0):
+    """Artículos sintéticos con el esquema del crawler, urls Art_<start>..."""
+    rnd = random.Random(seed)
+
+    def text(k):
+        return " ".join(rnd.choices(WORDS, WEIGHTS, k=k)).capitalize() + "."
+
+    return [
+        {
+            "url": f"https://es.wikipedia.org/wiki/Art_{start + i}",
+            "title": text(3),
+            "summary": text(25),
+            "sections": [
+                {
+                    "name": text(2),
+                    "text": text(40),
+                    "subsections": [{"name": text(2), "text": text(15)} for _ in range(rnd.randint(0, 2))],
+                }
+                for _ in range(rnd.randint(0, 3))
+            ],
+        }
+        for i in range(n)
+    ]
+
+
+def write_corpus(filename, articles):
+    with open(filename, "w", encoding="utf-8") as fh:
+        for article in articles:
+            print(json.dumps(article, ensure_ascii=False), file=fh)
+
+
+def build_index(root, indexer: SAR_Indexer = None, **options) -> SAR_Indexer:
+    """Indexa "root" (fichero o directorio), por defecto sin ninguna ampliación"""
+    args = dict(multifield=False, positional=False, stem=False, permuterm=False)
+    args.update(options)
+    indexer = indexer or SAR_Indexer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        indexer.index_dir(str(root), **args)
+    return indexer
+
+
+def load_index(filename, lazy: bool = True) -> SAR_Indexer:
+    indexer = SAR_Indexer()
+    indexer.load_info(str(filename), lazy)
+    return indexer
@@ -0,0 +1,99 @@
+#! -*- encoding: utf8 -*-
+"""
+Pruebas de la indexación incremental y la compactación: añadir un lote que
+vuelve a descargar artículos (que quedan borrados) y compactar, comparando
+con un índice construido de una vez con los mismos artículos.
+"""
+
+import pytest
+
+from conftest import build_index, load_index, make_articles, write_corpus
+
+QUERIES = [
+    "de",
+    "casa OR perro",
+    "rey AND reina",
+    "castillo AND NOT de",
+    "NOT la",
+    "title:historia",
+    '"de la"',
+    "música NEAR/3 arte",
+    "w5 OR w17 OR w40",
+]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """
+    Índice de 60 artículos al que se añade un lote con 20 de ellos descargados de
+    nuevo y 10 nuevos, y el índice de referencia con los 70 artículos vivos.
+    """
+    first = make_articles(60, seed=1)
+    batch = make_articles(30, seed=2, start=40)
+    (tmp_path / "d").mkdir()
+    write_corpus(tmp_path / "d" / "a.json", first)
+    index = str(tmp_path / "i.idx")
+    build_index(tmp_path / "d", positional=True).save_info(index)
+    write_corpus(tmp_path / "d" / "b.json", batch)
+    build_index(tmp_path / "d", load_index(index)).save_info(index)
+    # los articulos vivos, en el orden de sus artids tras compactar
+    write_corpus(tmp_path / "ref.json", first[:40] + batch)
+    reference = str(tmp_path / "ref.idx")
+    build_index(tmp_path / "ref.json", positional=True).save_info(reference)
+    return index, reference
+
+
+def urls(indexer, results):
+    return sorted(indexer.get_article(artid)["url"] for artid in results)
+
+
+def check_same(indexer, reference):
+    for query in QUERIES:
+        assert urls(indexer, indexer.solve_query(query)) == urls(reference, reference.solve_query(query))
+    live = set(range(len(indexer.articles))) - indexer.deleted
+    assert sorted(indexer.get_article(artid)["url"] for artid in live) == sorted(reference.urls)
+    for url, artid in reference.urls.items():
+        assert indexer.get_article(indexer.urls[url]) == reference.get_article(artid)
+
+
+def test_append_tombstones(corpus):
+    index, reference = corpus
+    indexer = load_index(index)
+    assert len(indexer.index.segments) == 2
+    assert len(indexer.deleted) == 20
+    check_same(indexer, load_index(reference))
+
+
+def test_full_compaction_reclaims_store(corpus, tmp_path):
+    index, reference = corpus
+    store_before = (tmp_path / "i.idx.store").stat().st_size
+    indexer = load_index(index)
+    assert indexer.compact(index, full=True) == 1
+    assert len(indexer.index.segments) == 1 and not indexer.deleted
+    ref = load_index(reference)
+    check_same(indexer, ref)
+    # el almacen solo tiene los registros de los articulos vivos, como el de referencia
+    store = (tmp_path / "i.idx.store").read_bytes()
+    assert len(store) < store_before
+    assert store == (tmp_path / "ref.idx.store").read_bytes()
+    assert not (tmp_path / "i.idx.store.tmp").exists()
+    check_same(load_index(index), ref)
+    # una segunda compactacion completa no tiene nada que hacer
+    assert indexer.compact(index, full=True) == 0
+
+
+def test_partial_compaction_keeps_store(corpus, tmp_path):
+    index, reference = corpus
+    store_before = (tmp_path / "i.idx.store").read_bytes()
+    indexer = load_index(index)
+    # se fusionan los dos segmentos, los registros del almacen no se mueven
+    assert indexer.compact(index, fanin=2, purge=0.0) == 1
+    assert not indexer.deleted
+    assert (tmp_path / "i.idx.store").read_bytes() == store_before
+    ref = load_index(reference)
+    check_same(indexer, ref)
+    check_same(load_index(index), ref)
+    # la compactacion completa despues elimina los registros que quedaron sin uso
+    assert indexer.compact(index, full=True) == 0
+    assert (tmp_path / "i.idx.store").read_bytes() == (tmp_path / "ref.idx.store").read_bytes()
+    check_same(load_index(index), ref)
@@ -0,0 +1,142 @@
+#! -*- encoding: utf8 -*-
+"""
+Pruebas del formato binario del índice (SAR_Index_lib): codificación de las
+posting lists y escritura/lectura de un índice completo.
+"""
+
+import random
+
+import pytest
+
+from SAR_Index_lib import (
+    ALL_MASK,
+    IndexFormatError,
+    MASK_BITS,
+    IndexReader,
+    LazyFrequencies,
+    decode_docids,
+    decode_frequencies,
+    decode_postings,
+    decode_tfs,
+    encode_postings,
+    vbyte_decode,
+    vbyte_encode,
+    write_index,
+)
+
+
+def widths_of(data: bytes, df: int) -> bytes:
+    """Bytes de anchura de las posiciones de una posting list codificada"""
+    _, pos = vbyte_decode(data, 0, 1 + 2 * df)
+    return data[pos : pos + df]
+
+
+@pytest.mark.parametrize(
+    "positions, width",
+    [
+        ([255], 1),
+        ([256], 2),
+        ([0, 255], 1),
+        ([0, 256], 2),
+        ([65535], 2),
+        ([65536], 4),
+        ([1, 65536], 2),
+        ([1, 65537], 4),
+        ([10, 10 + 65535, 10 + 65535 + 255], 2),
+        ([2**32 - 1], 4),
+    ],
+)
+def test_position_width_boundaries(positions, width):
+    data = bytes(encode_postings({7: positions}))
+    assert widths_of(data, 1) == bytes([width])
+    assert decode_postings(data, 0) == {7: positions}
+
+
+def test_postings_round_trip_mixed_widths():
+    rnd = random.Random(1)
+    for _ in range(200):
+        postings = {}
+        for artid in rnd.sample(range(10000), rnd.randint(1, 40)):
+            top = rnd.choice([256, 65536, 1 << 20])
+            postings[artid] = sorted(rnd.sample(range(top), rnd.randint(1, 10)))
+        data = bytes(encode_postings(postings))
+        assert decode_postings(data, 0) == postings
+        assert decode_docids(data, 0).tolist() == sorted(postings)
+        artids, tfs = decode_frequencies(data, 0, shift=5)
+        assert artids.tolist() == [artid + 5 for artid in sorted(postings)]
+        assert list(tfs) == [len(postings[artid]) for artid in sorted(postings)]
+        # solo las posiciones de algunos artículos
+        only = set(rnd.sample(sorted(postings), len(postings) // 2))
+        assert decode_postings(data, 0, only=only) == {a: postings[a] for a in only}
+
+
+def test_field_masks():
+    postings = {1: [3], 4: [0, 9], 9: [5]}
+    masks = {1: 0b0010, 4: 0b0011, 9: ALL_MASK}
+    data = bytes(encode_postings(postings, lambda artid, positions: masks[artid]))
+    assert decode_docids(data, 0, code=1).tolist() == [1, 4]
+    assert decode_docids(data, 0, code=0).tolist() == [4, 9]
+    assert decode_postings(data, 0) == postings
+
+
+def test_vbyte_round_trip():
+    numbers = [0, 1, 127, 128, 255, 16383, 16384, 2**21, 2**32 - 1]
+    out = bytearray()
+    vbyte_encode(numbers, out)
+    vbyte_encode([5, 6], out)
+    assert vbyte_decode(out, 0, len(numbers) + 2)[0].tolist() == numbers + [5, 6]
+
+
+@pytest.mark.parametrize("multibyte", [0.0, 0.05, 0.5, 1.0])
+def test_frequencies_random_access(multibyte):
+    """Frecuencias con códigos de uno y varios bytes, consultadas en cualquier orden"""
+    rnd = random.Random(3)
+    for _ in range(50):
+        count = rnd.randint(1, 300)
+        tfs = [
+            rnd.randint(8, 1 << rnd.choice((8, 20))) if rnd.random() < multibyte else rnd.randint(1, 7)
+            for _ in range(count)
+        ]
+        out = bytearray(b"\x05\x80")
+        vbyte_encode([tf << MASK_BITS | rnd.randint(0, 15) for tf in tfs], out)
+        out += bytes([1, 200, 3])
+        for decoded in (decode_tfs(bytes(out), 2, count), LazyFrequencies(memoryview(bytes(out)), 2, count)):
+            order = rnd.sample(range(count), count)
+            assert [decoded[j] for j in order] == [tfs[j] for j in order]
+            assert list(decoded) == tfs
+            assert len(decoded) == count and decoded[-1] == tfs[-1]
+
+
+@pytest.mark.parametrize("lazy", [True, False])
+def test_index_write_read(tmp_path, lazy):
+    rnd = random.Random(2)
+    vocab = ["casa", "perro", "año", "ñu", "zz", "a" * 300] + [f"t{i}" for i in range(200)]
+    index = {}
+    for artid in range(150):
+        for pos in range(rnd.randint(1, 400)):
+            index.setdefault(rnd.choice(vocab), {}).setdefault(artid, []).append(pos)
+    filename = str(tmp_path / "i.idx")
+    write_index(filename, index, {"urls": {"u": 0}}, doclens=[500] * 150)
+    reader = IndexReader(filename, lazy)
+    try:
+        assert reader.meta["urls"] == {"u": 0}
+        assert sorted(reader) == sorted(index)
+        assert len(reader) == len(index)
+        assert "nada" not in reader
+        for term, postings in index.items():
+            assert reader[term] == postings
+            assert reader.docids(term).tolist() == sorted(postings)
+            artids, tfs = reader.frequencies(term)
+            assert artids.tolist() == sorted(postings)
+            assert list(tfs) == [len(postings[artid]) for artid in sorted(postings)]
+            some = set(sorted(postings)[::3])
+            assert reader.positions(term, some) == {a: postings[a] for a in some}
+    finally:
+        reader.close()
+
+
+def test_bad_index_file(tmp_path):
+    filename = tmp_path / "bad.idx"
+    filename.write_bytes(b"no es un indice" * 4)
+    with pytest.raises(IndexFormatError):
+        IndexReader(str(filename))
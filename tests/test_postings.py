@@ -0,0 +1,76 @@
+#! -*- encoding: utf8 -*-
+"""
+Pruebas de las posting lists híbridas (SAR_Posting_lib) contra operaciones
+sobre conjuntos de Python.
+"""
+
+import random
+from array import array
+
+import pytest
+
+from SAR_Posting_lib import PostingList, gallop_intersect, near_match, phrase_match
+
+UNIVERSE = 2000
+
+
+def random_ids(rnd: random.Random, universe: int = UNIVERSE) -> list:
+    # listas dispersas (array) y densas (mapa de bits)
+    size = rnd.choice([0, 1, 5, 40, 300, 1500])
+    return sorted(rnd.sample(range(universe), min(size, universe)))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_and_or_not_against_sets(seed):
+    rnd = random.Random(seed)
+    for _ in range(100):
+        a, b = random_ids(rnd), random_ids(rnd)
+        pa, pb = PostingList.from_sorted(a, UNIVERSE), PostingList.from_sorted(b, UNIVERSE)
+        sa, sb = set(a), set(b)
+        assert (pa & pb).tolist() == sorted(sa & sb)
+        assert (pa | pb).tolist() == sorted(sa | sb)
+        assert (pa - pb).tolist() == sorted(sa - sb)
+        assert pa.complement().tolist() == sorted(set(range(UNIVERSE)) - sa)
+        assert len(pa & pb) == len(sa & sb)
+        others = [PostingList.from_sorted(random_ids(rnd), UNIVERSE) for _ in range(3)]
+        union = PostingList.union([pa, pb] + others, UNIVERSE)
+        assert union.tolist() == sorted(sa.union(sb, *(set(p) for p in others)))
+
+
+def test_representation_by_density():
+    sparse = PostingList.from_sorted(range(0, UNIVERSE, 100), UNIVERSE)
+    dense = PostingList.from_sorted(range(0, UNIVERSE, 2), UNIVERSE)
+    assert not sparse.is_bitmap and dense.is_bitmap
+    assert sparse[3] == 300 and dense[3] == 6
+    assert list(dense) == list(range(0, UNIVERSE, 2))
+
+
+@pytest.mark.parametrize("dense", [False, True])
+def test_contains(dense):
+    ids = list(range(1, UNIVERSE, 2 if dense else 97))
+    p = PostingList.from_sorted(ids, UNIVERSE)
+    assert p.is_bitmap == dense
+    members = set(ids)
+    for artid in [-1, 0, 1, 2, 97, 98, UNIVERSE - 1, UNIVERSE, UNIVERSE + 50]:
+        assert (artid in p) == (artid in members)
+
+
+def test_gallop_intersect():
+    rnd = random.Random(3)
+    for _ in range(300):
+        long = array("I", sorted(rnd.sample(range(100000), rnd.randint(0, 5000))))
+        short = array("I", sorted(rnd.sample(range(100000), rnd.randint(0, 60))))
+        if long and rnd.random() < 0.5:
+            # artids que sí estan, incluidos el primero y el ultimo
+            short = array("I", sorted(set(short) | {long[0], long[-1]}))
+        assert gallop_intersect(short, long).tolist() == sorted(set(short) & set(long))
+    assert gallop_intersect(array("I"), array("I", [1, 2])).tolist() == []
+    assert gallop_intersect(array("I", [5]), array("I")).tolist() == []
+
+
+def test_phrase_and_near_match():
+    assert phrase_match([[1, 7], [2], [3, 9]])
+    assert not phrase_match([[1, 7], [8], [3]])
+    assert phrase_match([[4], [5]]) and not phrase_match([[5], [4]])
+    assert near_match([10], [13], 3) and near_match([13], [10], 3)
+    assert not near_match([10], [14], 3)
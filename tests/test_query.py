@@ -0,0 +1,135 @@
+#! -*- encoding: utf8 -*-
+"""
+Pruebas del análisis de consultas (SAR_Query_lib) y de las consultas
+posicionales, NEAR y por campos contra una búsqueda por fuerza bruta.
+"""
+
+import random
+
+import pytest
+
+from SAR_Query_lib import (
+    And,
+    Near,
+    Not,
+    Or,
+    Phrase,
+    QuerySyntaxError,
+    Term,
+    compile_query,
+    normalize_query,
+)
+
+from conftest import build_index, load_index, make_articles, write_corpus
+
+
+def test_parse_tree():
+    assert compile_query("casa") == Term("casa")
+    assert compile_query("Casa AND perro AND gato") == And((Term("casa"), Term("perro"), Term("gato")))
+    assert compile_query("casa OR perro AND gato") == And((Or((Term("casa"), Term("perro"))), Term("gato")))
+    assert compile_query("NOT NOT casa") == Term("casa")
+    assert compile_query("NOT (casa OR perro)") == Not(Or((Term("casa"), Term("perro"))))
+    assert compile_query('"la casa" el') == Phrase(("la", "casa", "el"))
+    assert compile_query('title:"la casa"') == Phrase(("la", "casa"), "title")
+    assert compile_query("casa NEAR/3 perro") == Near(("casa", "perro"), 3)
+    assert compile_query("title:casa NEAR/2 perro") == Near(("casa", "perro"), 2, "title")
+    assert compile_query("url:https://es.wikipedia.org/wiki/Casa") == Term(
+        "https://es.wikipedia.org/wiki/Casa", "url"
+    )
+    assert normalize_query("  casa   AND\tperro ") == "casa AND perro"
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "",
+        "casa AND",
+        "AND casa",
+        "casa AND OR perro",
+        "(casa OR perro",
+        "casa)",
+        "()",
+        "NEAR/2 perro",
+        "casa NEAR/2",
+        '"la casa" NEAR/2 perro',
+        "casa NEAR/2 \"el perro\"",
+        "url:https://x NEAR/1 casa",
+        "title:casa NEAR/2 summary:perro",
+        "casa title:perro",
+        "title:",
+        '""',
+        "url:https://x casa",
+    ],
+)
+def test_syntax_errors(query):
+    with pytest.raises(QuerySyntaxError):
+        compile_query(normalize_query(query))
+
+
+@pytest.fixture(scope="module", params=["memory", "file"])
+def indexer(request, tmp_path_factory):
+    """Índice en memoria recién construido o guardado y cargado (IndexReader)"""
+    tmp = tmp_path_factory.mktemp("corpus")
+    write_corpus(tmp / "c.json", make_articles(120, seed=1))
+    indexer = build_index(tmp / "c.json", multifield=True, positional=True)
+    if request.param == "file":
+        indexer.save_info(str(tmp / "i.idx"))
+        indexer = load_index(tmp / "i.idx")
+    return indexer
+
+
+def brute_force(indexer, field, match):
+    """Artids de los artículos cuyo campo (tokenizado) cumple "match" """
+    res = []
+    for filename in indexer.docs.values():
+        with open(filename, encoding="utf-8") as fh:
+            for line in fh:
+                article = indexer.parse_article(line)
+                if match(indexer.tokenize(article[field])):
+                    res.append(indexer.urls[article["url"]])
+    return sorted(res)
+
+
+def has_phrase(words):
+    n = len(words)
+    return lambda tokens: any(tokens[i : i + n] == words for i in range(len(tokens)))
+
+
+def has_near(a, b, k):
+    def match(tokens):
+        pa = [i for i, t in enumerate(tokens) if t == a]
+        pb = [i for i, t in enumerate(tokens) if t == b]
+        return any(abs(i - j) <= k for i in pa for j in pb)
+
+    return match
+
+
+@pytest.mark.parametrize("field", ["all", "title", "summary"])
+def test_phrase_and_near_against_brute_force(indexer, field):
+    rnd = random.Random(field)
+    prefix = "" if field == "all" else field + ":"
+    common = ["de", "la", "el", "en", "casa", "perro", "w1"]
+    for _ in range(25):
+        words = [rnd.choice(common) for _ in range(rnd.randint(2, 3))]
+        query = prefix + '"' + " ".join(words) + '"'
+        assert indexer.solve_query(query).tolist() == brute_force(indexer, field, has_phrase(words)), query
+        a, b, k = rnd.choice(common), rnd.choice(common), rnd.randint(0, 6)
+        query = f"{prefix}{a} NEAR/{k} {b}"
+        assert indexer.solve_query(query).tolist() == brute_force(indexer, field, has_near(a, b, k)), query
+
+
+def test_boolean_against_sets(indexer):
+    def ids(word):
+        return set(brute_force(indexer, "all", lambda tokens: word in tokens))
+
+    everything = set(indexer.urls.values())
+    casa, perro, rey = ids("casa"), ids("perro"), ids("rey")
+    cases = {
+        "casa AND perro": casa & perro,
+        "casa OR rey": casa | rey,
+        "casa AND NOT perro": casa - perro,
+        "NOT casa": everything - casa,
+        "(casa OR rey) AND NOT (perro AND rey)": (casa | rey) - (perro & rey),
+    }
+    for query, expected in cases.items():
+        assert indexer.solve_query(query).tolist() == sorted(expected), query
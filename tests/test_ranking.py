@@ -0,0 +1,134 @@
+#! -*- encoding: utf8 -*-
+"""
+Pruebas de la ordenación por BM25: MaxScore (top_k, best_k) contra la
+puntuación exhaustiva y solve_ranked contra BM25 calculado a mano.
+"""
+
+import contextlib
+import io
+import random
+from array import array
+
+import pytest
+
+from SAR_Rank_lib import TermScorer, best_k, bm25_idf, bm25_tf, score_all, top_k
+
+from conftest import build_index, load_index, make_articles, write_corpus
+
+
+def make_terms(rnd, articles, nterms, doclens, avgdl):
+    """Términos sintéticos con df de muy distintos tamaños"""
+    terms = []
+    for _ in range(nterms):
+        df = rnd.randint(1, articles // rnd.choice((1, 3, 20, 200)) or 1)
+        artids = array("I", sorted(rnd.sample(range(articles), df)))
+        tfs = [1 + int(rnd.expovariate(0.5)) for _ in artids]
+        terms.append(
+            TermScorer(artids, tfs, bm25_idf(df, articles), max(tfs), min(doclens[a] for a in artids), avgdl)
+        )
+    return terms
+
+
+def check_top(res, ref, k):
+    """"res" son k de los mejores de "ref" (a igual puntuación cualquier artid vale)"""
+    scores = {artid: score for score, artid in ref}
+    assert len(res) == min(k, len(ref))
+    assert [score for score, _ in res] == pytest.approx([score for score, _ in ref[:k]])
+    for score, artid in res:
+        assert scores[artid] == pytest.approx(score)
+    assert len({artid for _, artid in res}) == len(res)
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("k", [1, 5, 10, 50])
+def test_top_k_matches_exhaustive(seed, k):
+    rnd = random.Random(seed)
+    articles = rnd.choice((300, 3000, 20000))
+    doclens = [rnd.randint(5, 500) for _ in range(articles)]
+    avgdl = sum(doclens) / articles
+    terms = make_terms(rnd, articles, rnd.randint(1, 8), doclens, avgdl)
+    ref = score_all(terms, doclens, avgdl)
+    check_top(top_k(terms, doclens, avgdl, k), ref, k)
+    check_top(best_k(terms, doclens, avgdl, k), ref, k)
+    # solo los artículos aceptados (resultado booleano de la consulta)
+    accept = set(rnd.sample(range(articles), articles // 3))
+    ref = score_all(terms, doclens, avgdl, accept)
+    check_top(top_k(terms, doclens, avgdl, k, accept), ref, k)
+    check_top(best_k(terms, doclens, avgdl, k, accept), ref, k)
+
+
+def test_top_k_empty():
+    doclens = [10] * 5
+    empty = TermScorer(array("I"), [], 1.0, 0, 0, 10.0)
+    assert top_k([], doclens, 10.0, 10) == []
+    assert top_k([empty], doclens, 10.0, 10) == []
+    assert best_k([empty], doclens, 10.0, 10) == []
+    one = TermScorer(array("I", [3]), [2], 1.0, 2, 10, 10.0)
+    assert top_k([one, empty], doclens, 10.0, 0) == []
+    assert [artid for _, artid in best_k([one, empty], doclens, 10.0, 10)] == [3]
+
+
+@pytest.fixture(scope="module", params=["memory", "file"])
+def indexer(request, tmp_path_factory):
+    """Índice en memoria recién construido o guardado y cargado (IndexReader)"""
+    tmp = tmp_path_factory.mktemp("corpus")
+    write_corpus(tmp / "c.json", make_articles(400, seed=3))
+    indexer = build_index(tmp / "c.json", multifield=True)
+    if request.param == "file":
+        indexer.save_info(str(tmp / "i.idx"))
+        indexer = load_index(tmp / "i.idx")
+    return indexer
+
+
+def naive_scores(indexer, terms, results):
+    """BM25 de cada artículo de "results" recorriendo las posting lists completas"""
+    n = len(indexer.articles)
+    avgdl = sum(indexer.doclens) / n
+    scores = {}
+    for term in terms:
+        postings = indexer.index.get(term, {})
+        idf = bm25_idf(len(postings), n)
+        for artid, positions in postings.items():
+            if artid in results:
+                tf = len(positions)
+                scores[artid] = scores.get(artid, 0.0) + idf * bm25_tf(tf, indexer.doclens[artid], avgdl)
+    return sorted(((score, artid) for artid, score in scores.items()), key=lambda r: (-r[0], r[1]))
+
+
+@pytest.mark.parametrize(
+    "query, terms",
+    [
+        ("de", ["de"]),
+        ("casa OR perro", ["casa", "perro"]),
+        ("de OR la OR castillo OR w7", ["de", "la", "castillo", "w7"]),
+        ("casa AND de", ["casa", "de"]),
+        ("castillo OR NOT de", ["castillo"]),
+        ("title:rey OR reina", ["rey", "reina"]),
+    ],
+)
+@pytest.mark.parametrize("k", [1, 10, 1000])
+def test_solve_ranked(indexer, query, terms, k):
+    results = set(indexer.solve_query(query))
+    ref = naive_scores(indexer, terms, results)
+    check_top(indexer.solve_ranked(query, k), ref, k)
+
+
+def test_show_ranked_union(indexer):
+    """Una disyunción de términos se muestra igual sin calcular el resultado booleano"""
+    def show(query, show_all):
+        indexer.set_ranking(True)
+        indexer.set_showall(show_all)
+        out = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                indexer.solve_and_show(query)
+        finally:
+            indexer.set_ranking(False)
+            indexer.set_showall(False)
+        return out.getvalue().splitlines()
+
+    for query in ("de OR castillo", "w30 OR w31", "zzz OR w59"):
+        shown = show(query, False)
+        full = show(query, True)
+        assert shown == full[: len(shown)]
+        assert len(shown) == 2 * min(indexer.SHOW_MAX, len(indexer.solve_query(query)))